@@ -1,11 +1,82 @@
 # mcp/app.py
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from mcp.routes.llm_routes import get_llm_service
+from fastapi.middleware.gzip import GZipMiddleware
+from mcp.services.llm_service import close_llm_service
 from mcp.routes import llm_routes 
 from mcp.routes.reviews import router as reviews_router
+from mcp.routes.admin import router as admin_router
+from mcp.routes.metrics import router as metrics_router
+from mcp.core.metrics import PrometheusMiddleware
+from mcp.core.rate_limit import RateLimitMiddleware
+from mcp.core.tracing import configure_tracing, shutdown_tracing
+from mcp.core.logging_config import configure_logging, shutdown_logging
+from mcp.core.auth import get_token_verifier
+from mcp.services.retry_scheduler import get_retry_scheduler
+from mcp.services.review_queue import get_review_queue
+from mcp.services.backlog import get_backlog_feeder
+from mcp.services.failure_artifacts import get_failure_artifact_store
+from mcp.services.heartbeat import get_process_heartbeat
+from mcp.services.lifecycle import prepare_startup, drain_and_checkpoint
+import mcp.config as config
 
-app = FastAPI(title="HTTP Server for Review Processing")
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup: check the schema and warm the DB pool and LLM SDK (prepare_startup), start
+    the LLM work queue and the failure-artifact writer, start the process heartbeat (which
+    re-defers reviews orphaned by dead processes), then start the loops that feed deferred
+    reviews and failed-job retries into the queue.
+    With REVIEW_EXECUTION_MODE="worker" the sweep and those loops run in mcp.worker
+    processes instead and the queue here only serves interactive calls.
+    Shutdown (uvicorn runs it on SIGTERM after in-flight requests finish): stop feeding,
+    drain running LLM jobs up to SHUTDOWN_DRAIN_TIMEOUT, checkpoint the rest and drop the
+    heartbeat.
+    """
+    runs_background_jobs = config.REVIEW_EXECUTION_MODE != "worker"
+    configure_logging("mcp-api")
+    configure_tracing("mcp-api")
+    await prepare_startup()
+    get_review_queue().start()
+    get_failure_artifact_store().start()
+    if config.AUTH_MODE == "dev":
+        logger.warning("AUTH_MODE=dev: any \"dev\"/\"dummy*\" bearer token is accepted")
+    else:
+        get_token_verifier().start()
+    await get_process_heartbeat().start(sweep=runs_background_jobs)
+    if runs_background_jobs:
+        get_backlog_feeder().start()
+        get_retry_scheduler().start()
+    try:
+        yield
+    finally:
+        if runs_background_jobs:
+            await get_retry_scheduler().stop()
+            await get_backlog_feeder().stop()
+        await drain_and_checkpoint()
+        await get_process_heartbeat().stop()
+        await get_failure_artifact_store().stop()
+        await close_llm_service()
+        await get_token_verifier().stop()
+        shutdown_tracing()
+        shutdown_logging()
+
+
+app = FastAPI(title="HTTP Server for Review Processing", lifespan=lifespan)
+
+# per-client rate limits/quotas; innermost so 429s still get CORS headers and metrics
+app.add_middleware(RateLimitMiddleware)
+
+# compress large responses (stored evaluations) for clients that accept gzip
+if config.RESPONSE_GZIP_MIN_BYTES > 0:
+    app.add_middleware(
+        GZipMiddleware, minimum_size=config.RESPONSE_GZIP_MIN_BYTES, compresslevel=config.RESPONSE_GZIP_LEVEL
+    )
 
 # CORS setup
 origins = [
@@ -20,13 +91,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(PrometheusMiddleware)
 
 app.include_router(llm_routes.router, prefix="/api/review")
 app.include_router(reviews_router, prefix="/api/v1")
+app.include_router(admin_router, prefix="/api/v1")
+app.include_router(metrics_router)
 
-
-
-@app.on_event("shutdown")
-async def close_llm_service():
-    svc = get_llm_service()
-    await svc.close()
\ No newline at end of file
@@ -1,4 +1,5 @@
 # config.py
+import json
 import os
 from dotenv import load_dotenv
 
@@ -7,6 +8,9 @@ load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL_NAME = "gemini-2.5-flash"
+# Override the Gemini API host, e.g. http://127.0.0.1:8090 for mcp/test/fake_llm_server.py.
+# When set, the SDK uses its REST transport against this endpoint.
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
 
 
 OPENAI_API_KEY = "your_openai_api_key_here"
@@ -18,3 +22,217 @@ LLM_PROVIDER = "gemini"
 LLM_TEMPERATURE = 0.0
 LLM_TIMEOUT = 15  # seconds
 LLM_MAX_RETRIES = 3
+
+# Record/replay of raw LLM responses (mcp/services/llm_recording.py).
+# "off" (default), "record" (append every provider call to LLM_RECORD_PATH) or
+# "replay" (serve responses from LLM_RECORD_PATH, no network and no API key needed).
+LLM_RECORD_MODE = os.getenv("LLM_RECORD_MODE", "off").lower()
+LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH", "llm_responses.jsonl.gz")
+LLM_REPLAY_LATENCY_SCALE = float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "1.0"))  # 0 replays instantly
+LLM_REPLAY_MATCH = os.getenv("LLM_REPLAY_MATCH", "exact").lower()  # "exact" prompt hash or "any"
+
+# Failed background jobs (failed_jobs table) are retried with exponential delay:
+# base * 2**(attempts - 1) seconds, capped at max delay. After max attempts the
+# job is dead-lettered and only re-runs when an admin requeues it.
+FAILED_JOB_MAX_ATTEMPTS = int(os.getenv("FAILED_JOB_MAX_ATTEMPTS", "5"))
+FAILED_JOB_RETRY_BASE_DELAY = float(os.getenv("FAILED_JOB_RETRY_BASE_DELAY", "30"))  # seconds
+FAILED_JOB_RETRY_MAX_DELAY = float(os.getenv("FAILED_JOB_RETRY_MAX_DELAY", "3600"))  # seconds
+FAILED_JOB_POLL_INTERVAL = float(os.getenv("FAILED_JOB_POLL_INTERVAL", "15"))  # seconds
+FAILED_JOB_BATCH_SIZE = int(os.getenv("FAILED_JOB_BATCH_SIZE", "20"))
+# a claimed retry is re-eligible after this long if the process died mid-run
+FAILED_JOB_LEASE_SECONDS = float(os.getenv("FAILED_JOB_LEASE_SECONDS", "600"))
+
+# In-process LLM work queue (mcp/services/review_queue.py).
+# At most LLM_WORKER_CONCURRENCY LLM jobs run at once; LLM_INTERACTIVE_RESERVED of
+# those slots are kept free for the synchronous /api/review/llmreview endpoint.
+LLM_WORKER_CONCURRENCY = int(os.getenv("LLM_WORKER_CONCURRENCY", "8"))
+LLM_INTERACTIVE_RESERVED = int(os.getenv("LLM_INTERACTIVE_RESERVED", "2"))
+# Fair-queuing weights per "course/assignment" key, e.g. '{"CSC517/Program 2": 2}'.
+# Tenants not listed get weight 1.
+QUEUE_TENANT_WEIGHTS = json.loads(os.getenv("QUEUE_TENANT_WEIGHTS", "{}"))
+# Admission control: background jobs beyond LLM_QUEUE_MAX_DEPTH are persisted as
+# deferred rows and fed back in as the queue drains; interactive calls beyond
+# LLM_INTERACTIVE_MAX_QUEUED get 429 with Retry-After.
+LLM_QUEUE_MAX_DEPTH = int(os.getenv("LLM_QUEUE_MAX_DEPTH", "200"))
+LLM_INTERACTIVE_MAX_QUEUED = int(os.getenv("LLM_INTERACTIVE_MAX_QUEUED", "20"))
+LLM_BACKLOG_POLL_INTERVAL = float(os.getenv("LLM_BACKLOG_POLL_INTERVAL", "5"))  # seconds
+
+# Graceful shutdown: in-flight LLM jobs get SHUTDOWN_DRAIN_TIMEOUT seconds to finish;
+# anything left is put back in the deferred backlog. After a crash, the reviews a process
+# held are found by owner (services/heartbeat.py): every API/worker process records a
+# heartbeat each PROCESS_HEARTBEAT_INTERVAL seconds and stamps the reviews it queues or
+# runs, and pending/processing rows whose owner has not beaten for PROCESS_HEARTBEAT_TIMEOUT
+# are re-deferred. Rows with no owner are re-deferred once untouched for ORPHAN_SWEEP_GRACE_SECONDS.
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "25"))
+ORPHAN_SWEEP_GRACE_SECONDS = float(os.getenv("ORPHAN_SWEEP_GRACE_SECONDS", "900"))
+PROCESS_HEARTBEAT_INTERVAL = float(os.getenv("PROCESS_HEARTBEAT_INTERVAL", "15"))
+PROCESS_HEARTBEAT_TIMEOUT = float(os.getenv("PROCESS_HEARTBEAT_TIMEOUT", "60"))
+
+# Where background review jobs run. "inline": in the API process (default).
+# "worker": the API only persists/defers reviews and dedicated worker processes
+# (python -m mcp.worker) claim them from the database. Interactive /llmreview calls
+# always run in the API process.
+REVIEW_EXECUTION_MODE = os.getenv("REVIEW_EXECUTION_MODE", "inline")
+# Worker process defaults (overridable on the python -m mcp.worker command line)
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", str(LLM_WORKER_CONCURRENCY)))
+WORKER_PREFETCH = int(os.getenv("WORKER_PREFETCH", "8"))  # claimed reviews waiting per process
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))  # seconds; NOTIFY wakes workers sooner
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))  # 0 disables the worker /metrics server
+
+# OpenTelemetry tracing (mcp/core/tracing.py): "none", "console" or "file".
+# "file" appends one JSON span per line to TRACE_FILE for offline inspection.
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+
+# Failed LLM outputs (mcp/services/failure_artifacts.py) are queued without blocking and
+# written to llm_failure_artifacts in the background. A full queue drops artifacts rather
+# than slowing LLM work. Artifacts older than the retention period, or beyond the newest
+# FAILURE_ARTIFACT_MAX_PER_REVIEW for a review, are pruned.
+FAILURE_ARTIFACT_SAMPLE_RATE = float(os.getenv("FAILURE_ARTIFACT_SAMPLE_RATE", "1.0"))
+FAILURE_ARTIFACT_QUEUE_SIZE = int(os.getenv("FAILURE_ARTIFACT_QUEUE_SIZE", "1000"))
+FAILURE_ARTIFACT_MAX_CHARS = int(os.getenv("FAILURE_ARTIFACT_MAX_CHARS", "100000"))
+FAILURE_ARTIFACT_RETENTION_DAYS = float(os.getenv("FAILURE_ARTIFACT_RETENTION_DAYS", "14"))
+FAILURE_ARTIFACT_MAX_PER_REVIEW = int(os.getenv("FAILURE_ARTIFACT_MAX_PER_REVIEW", "20"))
+
+# Logging (mcp/core/logging_config.py). Records go through a queue to a writer thread;
+# LOG_FORMAT "json" (default) writes one JSON object per line, "text" is human-readable.
+# Review text and prompts are redacted unless LOG_REDACT_REVIEW_TEXT is false (local debugging).
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records; a full queue drops
+LOG_REDACT_REVIEW_TEXT = os.getenv("LOG_REDACT_REVIEW_TEXT", "true").lower() not in ("0", "false", "no")
+# Identical warnings/errors: LOG_RATE_LIMIT_BURST per window pass, then 1 in LOG_RATE_LIMIT_SAMPLE_EVERY.
+LOG_RATE_LIMIT_WINDOW = float(os.getenv("LOG_RATE_LIMIT_WINDOW", "60"))  # seconds
+LOG_RATE_LIMIT_BURST = int(os.getenv("LOG_RATE_LIMIT_BURST", "10"))  # 0 disables rate limiting
+LOG_RATE_LIMIT_SAMPLE_EVERY = int(os.getenv("LOG_RATE_LIMIT_SAMPLE_EVERY", "100"))
+
+# Authentication (mcp/core/auth.py). AUTH_MODE "jwt" (the default) verifies SSO-issued JWTs
+# against the keys published at AUTH_JWKS_URL (or SECRET_KEY for HS* algorithms). Opaque
+# tokens, and JWTs signed by a key that is not in the JWKS, go to AUTH_INTROSPECTION_URL
+# (RFC 7662) when it is set. "dev" is the local stub that accepts "dev"/"dummy*" tokens on
+# every route; it has to be set explicitly and must never reach a deployed environment.
+AUTH_MODE = os.getenv("AUTH_MODE", "jwt").lower()
+AUTH_JWKS_URL = os.getenv("AUTH_JWKS_URL")
+AUTH_ALGORITHMS = [a.strip() for a in os.getenv("AUTH_ALGORITHMS", "RS256").split(",") if a.strip()]
+AUTH_ISSUER = os.getenv("AUTH_ISSUER")
+AUTH_AUDIENCE = os.getenv("AUTH_AUDIENCE")
+AUTH_LEEWAY = float(os.getenv("AUTH_LEEWAY", "30"))  # seconds of clock skew allowed on exp/nbf
+AUTH_JWKS_REFRESH_INTERVAL = float(os.getenv("AUTH_JWKS_REFRESH_INTERVAL", "600"))  # background refresh, seconds
+AUTH_JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("AUTH_JWKS_MIN_REFRESH_INTERVAL", "30"))  # on unknown kid
+AUTH_INTROSPECTION_URL = os.getenv("AUTH_INTROSPECTION_URL")
+AUTH_INTROSPECTION_CLIENT_ID = os.getenv("AUTH_INTROSPECTION_CLIENT_ID")
+AUTH_INTROSPECTION_CLIENT_SECRET = os.getenv("AUTH_INTROSPECTION_CLIENT_SECRET")
+AUTH_HTTP_TIMEOUT = float(os.getenv("AUTH_HTTP_TIMEOUT", "5"))  # JWKS and introspection calls, seconds
+# The /api/v1/admin routes need a token whose "role"/"roles" claim includes one of
+# AUTH_ADMIN_ROLES or whose "scope"/"scp" includes AUTH_ADMIN_SCOPE (dev mode: the "dev-admin" token).
+AUTH_ADMIN_ROLES = [r.strip() for r in os.getenv("AUTH_ADMIN_ROLES", "admin").split(",") if r.strip()]
+AUTH_ADMIN_SCOPE = os.getenv("AUTH_ADMIN_SCOPE", "mcp:admin")
+# Verified tokens are cached until their exp, but never longer than AUTH_TOKEN_CACHE_MAX_TTL.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_TOKEN_CACHE_MAX_TTL = float(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL", "300"))  # seconds
+
+# Per-client rate limits and daily LLM-call quotas (mcp/core/rate_limit.py), keyed by the
+# token's sub and chosen by its role. RATE_LIMITS maps role -> {"rate": requests/second,
+# "burst": bucket size, "daily_llm_calls": provider calls per UTC day (0 = no quota)};
+# "default" applies to other roles and a role mapped to null is not limited. Callers without
+# a valid token are limited on the LLM routes only, by client address, with "anonymous"
+# (or "default" when it is not set).
+# RATE_LIMIT_BACKEND "memory" limits per process; "postgres" shares state across replicas
+# at the cost of one small query per request.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() not in ("0", "false", "no")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMITS = json.loads(os.getenv(
+    "RATE_LIMITS",
+    '{"default": {"rate": 10, "burst": 50, "daily_llm_calls": 5000},'
+    ' "anonymous": {"rate": 1, "burst": 10, "daily_llm_calls": 500}}'
+))
+# Upper bound on the max_attempts a /api/review/llmreview caller may ask for.
+LLM_MAX_ATTEMPTS_PER_REQUEST = int(os.getenv("LLM_MAX_ATTEMPTS_PER_REQUEST", "10"))
+
+# Time budget for the synchronous /api/review/llmreview endpoint (mcp/core/deadline.py).
+# Clients may ask for less or more with X-Request-Timeout / ?timeout= (seconds), up to the cap.
+LLM_REQUEST_DEFAULT_TIMEOUT = float(os.getenv("LLM_REQUEST_DEFAULT_TIMEOUT", "60"))
+LLM_REQUEST_MAX_TIMEOUT = float(os.getenv("LLM_REQUEST_MAX_TIMEOUT", "120"))
+
+# How reviews are rendered into the LLM prompt (services/utils.py build_review_text):
+# "json" (minified JSON matching the input schema the prompt documents, deterministic) or
+# "prose" (the older labelled text). Both are about the same size (mcp/test/token_report.py);
+# "json" is the default for its fidelity to the documented schema, not for fewer tokens.
+REVIEW_INPUT_FORMAT = os.getenv("REVIEW_INPUT_FORMAT", "json").lower()
+
+# Estimated-token budget for one review's LLM input (mcp/services/token_budget.py). Oversized
+# reviews are cut to fit (previous round first, then repeated text, then long comments) and
+# the cuts are recorded in reviews_table.input_truncation. 0 disables the budget.
+REVIEW_INPUT_TOKEN_BUDGET = int(os.getenv("REVIEW_INPUT_TOKEN_BUDGET", "8000"))
+
+# Evaluate round N > 1 reviews against the stored evaluation of the same reviewer/reviewee's
+# round N-1 (a digest plus what changed) instead of re-reading both rounds (services/incremental.py).
+INCREMENTAL_ROUNDS_ENABLED = os.getenv("INCREMENTAL_ROUNDS_ENABLED", "true").lower() not in ("0", "false", "no")
+
+# Near-duplicate reviews (mcp/services/dedup.py): "flag" (the default) records a match with an
+# already evaluated review of the same assignment and round whose SimHash similarity is at
+# least the threshold, "reuse" also copies that review's evaluation instead of calling the
+# LLM (opt in per deployment), "off" skips the check. Thresholds below 57/64 (~0.89) may
+# miss some matches.
+DEDUP_MODE = os.getenv("DEDUP_MODE", "flag").lower()
+DEDUP_SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_SIMILARITY_THRESHOLD", "0.9"))
+
+# How the rubric is evaluated (mcp/services/llm_service.py): "monolithic" asks one call for all
+# dimensions and the feedback; "parallel" evaluates each RUBRIC_GROUPS group concurrently with
+# a smaller prompt and then runs a feedback pass over the merged scores (more calls and input
+# tokens, shorter wall-clock time for long outputs; see mcp/test/rubric_split_benchmark.py).
+LLM_EVALUATION_MODE = os.getenv("LLM_EVALUATION_MODE", "monolithic").lower()
+RUBRIC_GROUPS = json.loads(os.getenv("RUBRIC_GROUPS", json.dumps([
+    ["Praise", "Problems & Solutions", "Tone"],
+    ["Localization", "Helpfulness", "Explanation", "Acted On"],
+    ["Relevance", "Consistency", "Actionability"],
+    ["Factuality", "Accessibility", "Comprehensiveness"],
+])))
+
+# Two-phase evaluation of stored reviews (mcp/services/orchestrator.py). "off" evaluates in one
+# pass (LLM_EVALUATION_MODE). Otherwise a first, short-output call stores only the rubric scores
+# with one-sentence justifications (status "scored"); the reasoning and feedback follow in a
+# second call, queued behind new reviews ("background") or run when GET /reviews/{id}?details=true
+# asks for them ("lazy", which that request also does for a "scored" row in background mode).
+LLM_TWO_PHASE_MODE = os.getenv("LLM_TWO_PHASE_MODE", "off").lower()
+
+# Responses of at least this many bytes are gzip-compressed for clients that send
+# Accept-Encoding: gzip (stored evaluations are several KB of JSON); 0 disables compression.
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1000"))
+# 1 (fastest) to 9 (smallest); beyond ~6 output barely shrinks but compression gets slower
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+
+# Startup (mcp/app.py lifespan, mcp/worker.py). The schema is checked against the fingerprint
+# recorded in schema_version and only (re)applied when it differs; wait up to
+# DB_STARTUP_TIMEOUT seconds for the database to accept connections first.
+DB_STARTUP_TIMEOUT = float(os.getenv("DB_STARTUP_TIMEOUT", "30"))
+# Pool connections opened before the first request (capped at the pool size); 0 disables.
+DB_POOL_WARM_CONNECTIONS = int(os.getenv("DB_POOL_WARM_CONNECTIONS", "5"))
+# Load the LLM provider SDK (~1s of imports) ahead of the first LLM call: "background" imports
+# it in a thread once startup is done, so the first request is not held back; "startup" also
+# configures the shared LLMService before the first request is served; "off" waits for the
+# first LLM call. No provider request is made either way.
+LLM_WARMUP = os.getenv("LLM_WARMUP", "background").lower()
+
+# SQLAlchemy pool of each engine (mcp/db/session.py; the replica gets its own pool of the same size).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))  # extra connections beyond the pool under bursts
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+# Reconnect connections older than this many seconds (-1: never), e.g. below a proxy's idle timeout.
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Test each connection with a round trip on checkout; only needed when connections are dropped behind our back.
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+# Prepared statements kept per connection (SQLAlchemy's and asyncpg's caches). Set 0 behind a
+# transaction-pooling PgBouncer, which cannot keep prepared statements across transactions.
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "100"))
+# Run the hot crud statements (mcp/db/prepared.py) directly on asyncpg instead of through
+# SQLAlchemy's execution layers, in the same session transaction.
+DB_PREPARED_FAST_PATH = os.getenv("DB_PREPARED_FAST_PATH", "true").lower() not in ("0", "false", "no")
+
+# Read-only endpoints (GET review, admin listings, reviews_by_status) read from the
+# DATABASE_REPLICA_URL replica, when set, while its replay lag is at most DB_REPLICA_MAX_LAG
+# seconds; the lag is checked at most every DB_REPLICA_LAG_CHECK_INTERVAL seconds, and a
+# replica that lags or cannot be reached sends reads to the primary until the next check.
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "2"))
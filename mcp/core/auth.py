@@ -1,50 +1,342 @@
+# mcp/core/auth.py
+"""
+Bearer-token verification for the API (the verify_jwt dependency).
 
-from typing import Optional
-from fastapi import HTTPException, status, Depends
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import jwt, JWTError
-from dotenv import load_dotenv
+AUTH_MODE="jwt" (the default) verifies SSO-issued tokens:
+  - JWTs are checked locally against keys from AUTH_JWKS_URL (refreshed in the
+    background, and on demand, rate limited, when a token names an unknown kid),
+    or SECRET_KEY for HS* algorithms;
+  - opaque tokens, and JWTs whose key cannot be found, fall back to the
+    AUTH_INTROSPECTION_URL endpoint when one is configured;
+  - verified claims are kept in a TLRU cache keyed by the token, each entry expiring at
+    the token's exp (capped at AUTH_TOKEN_CACHE_MAX_TTL), so repeat requests skip the
+    signature check and the introspection call.
+AUTH_MODE="dev" is the explicit opt-in to the local stub that accepts "dev"/"dummy*" tokens.
+mcp/test/fake_sso_server.py is a local stand-in for the JWKS and introspection endpoints;
+mcp/test/auth_benchmark.py measures the per-request cost of each path.
+"""
+import asyncio
+import logging
 import os
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+from cachetools import TLRUCache
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status, Depends
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import jwk, jwt, JWTError
+
+from mcp.core.metrics import AUTH_VERIFICATIONS
+import mcp.config as config
+
+logger = logging.getLogger(__name__)
 
 bearer = HTTPBearer(auto_error=False)
 
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
-# async def verify_jwt(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> dict:
-#     if not credentials or not credentials.credentials:
-#         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing Authorization")
-#     token = credentials.credentials
 
-#     try:
-#         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-#         return payload
-#     except JWTError:
-#         raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+_CACHE_HIT = AUTH_VERIFICATIONS.labels("cache_hit")
+_VERIFIED = AUTH_VERIFICATIONS.labels("verified")
+_INTROSPECTED = AUTH_VERIFICATIONS.labels("introspected")
+_REJECTED = AUTH_VERIFICATIONS.labels("rejected")
+
+
+class InvalidToken(Exception):
+    """The token is malformed, expired, badly signed or inactive."""
+
+
+class _UnknownKey(InvalidToken):
+    """The JWT names a signing key we do not have (yet)."""
+
+
+class TokenVerifier:
+    def __init__(
+        self,
+        jwks_url: Optional[str] = config.AUTH_JWKS_URL,
+        algorithms: Optional[List[str]] = None,
+        issuer: Optional[str] = config.AUTH_ISSUER,
+        audience: Optional[str] = config.AUTH_AUDIENCE,
+        leeway: float = config.AUTH_LEEWAY,
+        secret_key: Optional[str] = SECRET_KEY,
+        introspection_url: Optional[str] = config.AUTH_INTROSPECTION_URL,
+        introspection_auth: Optional[tuple] = None,
+        cache_size: int = config.AUTH_TOKEN_CACHE_SIZE,
+        cache_max_ttl: float = config.AUTH_TOKEN_CACHE_MAX_TTL,
+        refresh_interval: float = config.AUTH_JWKS_REFRESH_INTERVAL,
+        min_refresh_interval: float = config.AUTH_JWKS_MIN_REFRESH_INTERVAL,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.jwks_url = jwks_url
+        self.algorithms = algorithms or list(config.AUTH_ALGORITHMS)
+        if secret_key and ALGORITHM and ALGORITHM not in self.algorithms:
+            self.algorithms.append(ALGORITHM)
+        self.issuer = issuer
+        self.audience = audience
+        self.secret_key = secret_key
+        self.introspection_url = introspection_url
+        if introspection_auth is None and config.AUTH_INTROSPECTION_CLIENT_ID:
+            introspection_auth = (config.AUTH_INTROSPECTION_CLIENT_ID, config.AUTH_INTROSPECTION_CLIENT_SECRET or "")
+        self.introspection_auth = introspection_auth
+        self.cache_max_ttl = cache_max_ttl
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        # wall-clock timer because entries expire at the token's exp (a unix timestamp)
+        self._cache: TLRUCache = TLRUCache(maxsize=cache_size, ttu=self._expires_at, timer=time.time)
+        self._keys: Dict[str, Any] = {}
+        self._keys_fetched_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._introspecting: Dict[str, asyncio.Future] = {}
+        self._client = client
+        self._owns_client = client is None
+        self._task: Optional[asyncio.Task] = None
+        self._options = {"leeway": leeway, "verify_aud": audience is not None, "verify_at_hash": False}
+
+    def _expires_at(self, token: str, claims: Dict[str, Any], now: float) -> float:
+        exp = claims.get("exp")
+        limit = now + self.cache_max_ttl
+        return min(float(exp), limit) if isinstance(exp, (int, float)) else limit
+
+    # --- keys -------------------------------------------------------------------------------
+
+    def set_keys(self, jwks: Dict[str, Any]) -> None:
+        """Replace the signing keys with those in a JWKS document ({"keys": [...]})."""
+        keys = {}
+        for entry in jwks.get("keys", []):
+            if entry.get("use", "sig") != "sig" or "kid" not in entry:
+                continue
+            try:
+                keys[entry["kid"]] = jwk.construct(entry, entry.get("alg") or self.algorithms[0])
+            except Exception:
+                logger.warning("Skipping unusable JWKS key %s", entry.get("kid"), exc_info=True)
+        self._keys = keys
+        self._keys_fetched_at = time.monotonic()
+
+    async def refresh_keys(self, force: bool = True) -> bool:
+        """
+        Fetch the JWKS. Without `force` this is skipped if the keys were fetched less than
+        min_refresh_interval ago, so tokens with made-up kids cannot hammer the IdP.
+        Returns True if the keys were refreshed. On error the old keys are kept.
+        """
+        if not self.jwks_url:
+            return False
+        async with self._refresh_lock:
+            if not force and time.monotonic() - self._keys_fetched_at < self.min_refresh_interval:
+                return False
+            try:
+                resp = await self._http().get(self.jwks_url)
+                resp.raise_for_status()
+                self.set_keys(resp.json())
+            except Exception as e:
+                self._keys_fetched_at = time.monotonic()  # back off before trying again
+                logger.warning("JWKS refresh from %s failed: %s", self.jwks_url, e)
+                return False
+        logger.info("Loaded %d signing keys from %s", len(self._keys), self.jwks_url)
+        return True
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=config.AUTH_HTTP_TIMEOUT)
+        return self._client
+
+    # --- verification -----------------------------------------------------------------------
+
+    def verify_local(self, token: str) -> Dict[str, Any]:
+        """
+        Return the claims of a cached or locally verifiable JWT. Pure CPU, no awaits.
+        Raises _UnknownKey if the signing key is missing, InvalidToken otherwise.
+        """
+        claims = self._cache.get(token)
+        if claims is not None:
+            _CACHE_HIT.inc()
+            return claims
+        if token.count(".") != 2:
+            raise _UnknownKey("not a JWT")
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError as e:
+            raise InvalidToken(str(e)) from e
+        alg = header.get("alg")
+        if alg not in self.algorithms:
+            raise InvalidToken(f"algorithm {alg!r} not allowed")
+        if alg.startswith("HS"):
+            key = self.secret_key
+        else:
+            key = self._keys.get(header.get("kid"))
+        if key is None:
+            raise _UnknownKey(f"no key for kid {header.get('kid')!r}")
+        try:
+            claims = jwt.decode(
+                token, key, algorithms=[alg], audience=self.audience, issuer=self.issuer, options=self._options
+            )
+        except JWTError as e:
+            raise InvalidToken(str(e)) from e
+        self._cache[token] = claims
+        _VERIFIED.inc()
+        return claims
+
+    async def authenticate(self, token: str) -> Dict[str, Any]:
+        """Verify a bearer token and return its claims; raises InvalidToken."""
+        try:
+            try:
+                return self.verify_local(token)
+            except _UnknownKey:
+                # a key rotation we have not seen yet: refresh (rate limited) and try once more
+                if token.count(".") == 2 and await self.refresh_keys(force=False):
+                    try:
+                        return self.verify_local(token)
+                    except _UnknownKey:
+                        pass
+                if not self.introspection_url:
+                    raise
+            return await self._introspect(token)
+        except InvalidToken:
+            _REJECTED.inc()
+            raise
+
+    async def _introspect(self, token: str) -> Dict[str, Any]:
+        # concurrent requests with the same token share one introspection call
+        pending = self._introspecting.get(token)
+        if pending is None:
+            pending = asyncio.ensure_future(self._call_introspection(token))
+            self._introspecting[token] = pending
+            pending.add_done_callback(lambda _: self._introspecting.pop(token, None))
+        return await asyncio.shield(pending)
 
-# from typing import Optional
-# from fastapi import Depends, HTTPException, status
-# from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+    async def _call_introspection(self, token: str) -> Dict[str, Any]:
+        try:
+            resp = await self._http().post(
+                self.introspection_url,
+                data={"token": token, "token_type_hint": "access_token"},
+                auth=self.introspection_auth,
+            )
+            resp.raise_for_status()
+            claims = resp.json()
+        except Exception as e:
+            logger.warning("Token introspection failed: %s", e)
+            raise InvalidToken("introspection unavailable") from e
+        if not claims.get("active"):
+            raise InvalidToken("token is not active")
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)) and exp + self._options["leeway"] < time.time():
+            raise InvalidToken("token has expired")
+        self._cache[token] = claims
+        _INTROSPECTED.inc()
+        return claims
 
-# bearer = HTTPBearer(auto_error=False)
+    # --- background refresh -----------------------------------------------------------------
 
-# Dummy verification for development and SSO placeholder
-async def verify_jwt(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> dict:
+    def start(self) -> None:
+        """Start the JWKS refresh loop on the running event loop (no-op if already running)."""
+        if self.jwks_url and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancel the refresh loop and close the HTTP client."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.refresh_keys()
+            await asyncio.sleep(self.refresh_interval)
+
+
+_token_verifier_instance: Optional[TokenVerifier] = None
+
+
+def get_token_verifier() -> TokenVerifier:
+    """Return the single shared TokenVerifier instance."""
+    global _token_verifier_instance
+    if _token_verifier_instance is None:
+        _token_verifier_instance = TokenVerifier()
+    return _token_verifier_instance
+
+
+async def authenticate_token(token: str) -> Dict[str, Any]:
+    """
+    Claims for a bearer token under the current AUTH_MODE; raises InvalidToken.
+    With AUTH_MODE="dev" any "dev"/"dummy*" token is accepted as a local test user, and
+    "dev-admin" as a local admin.
+    """
+    if config.AUTH_MODE == "dev":
+        # --- Dummy acceptance for local testing ---
+        if token == "dev-admin":
+            return {"sub": "local_dev_admin", "role": "admin"}
+        if token == "dev" or token.startswith("dummy"):
+            return {"sub": "local_dev_user", "role": "tester"}
+        raise InvalidToken("not a dev token")
+    return await get_token_verifier().authenticate(token)
+
+
+async def authenticate_request_token(state: Dict[str, Any], token: str) -> Dict[str, Any]:
+    """
+    authenticate_token, done once per request: the outcome (claims or the InvalidToken) is
+    kept in the ASGI scope's "state" dict, so RateLimitMiddleware and verify_jwt share it
+    instead of each verifying (and, for a bad token, introspecting and counting) it.
+    """
+    outcome = state.get("auth")
+    if outcome is None or outcome[0] != token:
+        try:
+            outcome = (token, await authenticate_token(token))
+        except InvalidToken as e:
+            outcome = (token, e)
+        state["auth"] = outcome
+    if isinstance(outcome[1], InvalidToken):
+        raise outcome[1]
+    return outcome[1]
+
+
+async def verify_jwt(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> dict:
     """
-    Temporary JWT/SSO verification stub.
-    In production, this should verify the university's SSO-issued token or headers.
+    FastAPI dependency: the verified token claims, or 401.
     """
     # No Authorization header
     if not credentials or not credentials.credentials:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing Authorization")
 
-    token = credentials.credentials
+    try:
+        return await authenticate_request_token(request.scope.setdefault("state", {}), credentials.credentials)
+    except InvalidToken as e:
+        logger.info("Rejected bearer token: %s", e)
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+
 
-    # --- Dummy acceptance for local testing ---
-    # Accept any non-empty token and simulate an SSO payload
-    if token == "dev" or token.startswith("dummy"):
-        return {"sub": "local_dev_user", "role": "tester"}
+def _claim_values(claims: Dict[str, Any], *names: str) -> List[str]:
+    # role/roles claims may be a string or a list; OAuth scopes are a space-separated string
+    values: List[str] = []
+    for name in names:
+        value = claims.get(name)
+        if isinstance(value, str):
+            values.extend(value.split())
+        elif isinstance(value, (list, tuple)):
+            values.extend(str(v) for v in value)
+    return values
 
-    # In production, replace this with real validation (SSO or JWT)
-    # e.g., decode and verify SSO token, or call university's introspection endpoint
-    raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+
+def is_admin(claims: Dict[str, Any]) -> bool:
+    """True if the claims carry one of AUTH_ADMIN_ROLES or the AUTH_ADMIN_SCOPE scope."""
+    if any(role in config.AUTH_ADMIN_ROLES for role in _claim_values(claims, "role", "roles")):
+        return True
+    return config.AUTH_ADMIN_SCOPE in _claim_values(claims, "scope", "scp")
+
+
+async def require_admin(user: dict = Depends(verify_jwt)) -> dict:
+    """
+    FastAPI dependency for the admin routes: the verified claims if they grant admin, else 403.
+    """
+    if not is_admin(user):
+        logger.info("Admin route refused for sub=%s", user.get("sub"))
+        raise HTTPException(status.HTTP_403_FORBIDDEN, detail="Admin role required")
+    return user
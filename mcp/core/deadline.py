@@ -0,0 +1,74 @@
+# mcp/core/deadline.py
+"""
+Request deadlines for synchronous LLM endpoints.
+
+A Deadline is created from the client's time budget (X-Request-Timeout header or
+?timeout=, capped by LLM_REQUEST_MAX_TIMEOUT) and handed down to LLMService, which
+caps each attempt's provider timeout at the remaining budget and does not start
+retries that cannot finish in time. run_until_disconnected() bounds the whole call
+and cancels it as soon as the client goes away.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Optional
+
+from starlette.requests import Request
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The request's time budget ran out before a valid result was produced."""
+
+
+class ClientDisconnected(Exception):
+    """The client closed the connection while the request was still being processed."""
+
+
+@dataclass(frozen=True)
+class Deadline:
+    expires_at: float  # time.monotonic()
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # the body has already been read, so the next message is http.disconnect
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def run_until_disconnected(request: Request, work: Awaitable[Any], deadline: Optional[Deadline] = None) -> Any:
+    """
+    Await `work`, cancelling it when the deadline passes (DeadlineExceeded) or the client
+    disconnects (ClientDisconnected). Cancellation reaches the ReviewQueue job and the
+    LLM call underneath, so abandoned requests stop costing provider calls.
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait(
+            {task, watcher},
+            timeout=deadline.remaining() if deadline is not None else None,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        if task in done:
+            return task.result()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if watcher in done:
+            raise ClientDisconnected()
+        raise DeadlineExceeded("request deadline exceeded")
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
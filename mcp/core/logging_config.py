@@ -0,0 +1,209 @@
+# mcp/core/logging_config.py
+"""
+Process-wide logging setup: structured JSON lines written off the event loop.
+
+configure_logging() replaces the root handlers with a QueueHandler; a QueueListener
+thread formats records and writes them to stdout, so logging from a coroutine never
+waits on I/O. A full queue drops records (counted in log_records_dropped_total)
+rather than block.
+
+Every record carries the current trace/span id and whatever bind_log_context() put in
+the task's context (review_id for background jobs). Repeats of the same WARNING/ERROR
+(same logger, message template and exception type) are rate limited: the first
+LOG_RATE_LIMIT_BURST per LOG_RATE_LIMIT_WINDOW go through, then one in
+LOG_RATE_LIMIT_SAMPLE_EVERY, with a count of what was suppressed.
+Review text and prompts should only be logged through redact().
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from opentelemetry import trace
+
+from mcp.core.metrics import LOG_RECORDS_DROPPED
+import mcp.config as config
+
+_log_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("mcp_log_context", default={})
+
+# attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+# extra= keys that may hold student text
+_REDACTED_FIELDS = {"review_text", "review", "prompt", "raw", "raw_output", "comments", "additional_comment"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def redact(text: Optional[str]) -> str:
+    """Stand-in for review/prompt text in logs: length and hash, or the text if LOG_REDACT_REVIEW_TEXT is off."""
+    if text is None:
+        return "<none>"
+    if not config.LOG_REDACT_REVIEW_TEXT:
+        return text
+    digest = hashlib.sha256(text.encode("utf-8", "replace")).hexdigest()[:12]
+    return f"<redacted {len(text)} chars sha256:{digest}>"
+
+
+def bind_log_context(**fields: Any) -> None:
+    """
+    Add correlation fields to every record logged from the current context.
+    Queue jobs and requests each run in their own context, so this does not leak
+    into other reviews.
+    """
+    _log_context.set({**_log_context.get(), **fields})
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """Like bind_log_context, but only for the duration of the block."""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Attach trace ids and bound context fields. Runs in the logging thread, before the queue."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span_context = trace.get_current_span().get_span_context()
+        if span_context.is_valid:
+            record.trace_id = format(span_context.trace_id, "032x")
+            record.span_id = format(span_context.span_id, "016x")
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class RepeatFilter(logging.Filter):
+    """Rate-limit identical WARNING+ records; see the module docstring."""
+
+    def __init__(self, window: float, burst: int, sample_every: int, max_keys: int = 10000):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.sample_every = max(sample_every, 1)
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> [window start, records seen in window, suppressed since last emitted]
+        self._seen: Dict[Tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.burst <= 0:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.name, record.levelno, str(record.msg), exc_type)
+        now = time.monotonic()
+        with self._lock:
+            state = self._seen.get(key)
+            if state is None or now - state[0] >= self.window:
+                if len(self._seen) >= self.max_keys:
+                    self._seen.clear()
+                suppressed = state[2] if state else 0
+                state = self._seen[key] = [now, 0, suppressed]
+            state[1] += 1
+            seen = state[1]
+            if seen > self.burst and (seen - self.burst) % self.sample_every:
+                state[2] += 1
+                LOG_RECORDS_DROPPED.labels("rate_limited").inc()
+                return False
+            if state[2]:
+                record.suppressed_repeats = state[2]
+                state[2] = 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service_name: str):
+        super().__init__()
+        self.service_name = service_name
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "service": self.service_name,
+            "process": record.process,
+        }
+        for key, value in vars(record).items():
+            if key in _RECORD_ATTRS or key.startswith("_"):
+                continue
+            if key in _REDACTED_FIELDS and isinstance(value, str):
+                value = redact(value)
+            entry[key] = value
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message and traceback now (arguments may change before the listener
+        # runs); JSON encoding and the write happen on the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels("queue_full").inc()
+
+
+def configure_logging(service_name: str = "mcp-api") -> None:
+    """Route all logging through the queue and listener thread (once per process)."""
+    global _listener
+    if _listener is not None:
+        return
+    level = getattr(logging, config.LOG_LEVEL, logging.INFO)
+    output = logging.StreamHandler(sys.stdout)
+    if config.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter(service_name))
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(processName)s %(name)s %(levelname)s %(message)s"))
+
+    handler = _NonBlockingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_SIZE))
+    handler.addFilter(ContextFilter())
+    handler.addFilter(RepeatFilter(
+        config.LOG_RATE_LIMIT_WINDOW, config.LOG_RATE_LIMIT_BURST, config.LOG_RATE_LIMIT_SAMPLE_EVERY
+    ))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    # uvicorn installs its own synchronous stream handlers; send its records through ours
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,251 @@
+# mcp/core/metrics.py
+"""
+Prometheus metrics for the HTTP, LLM, queue and DB hot paths.
+Metrics are process-global; the API serves them at GET /metrics and worker
+processes can expose them with `python -m mcp.worker --metrics-port`.
+"""
+import time
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from mcp.core.deadline import ClientDisconnected
+
+# LLM calls take seconds; HTTP and DB waits take milliseconds
+_LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+_FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_SIZE_BUCKETS = (256, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=_FAST_BUCKETS + (30, 60),
+)
+LLM_CALL_DURATION = Histogram(
+    "llm_call_duration_seconds",
+    "Latency of a single LLM provider call",
+    ["model", "outcome"],
+    buckets=_LLM_BUCKETS,
+)
+LLM_ATTEMPTS = Histogram(
+    "llm_evaluate_attempts",
+    "LLM attempts used per evaluate_and_parse call",
+    ["outcome"],
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20),
+)
+LLM_OUTPUT_FAILURES = Counter(
+    "llm_output_failures_total",
+    "LLM outputs rejected, by stage (empty, parse, repair, validation)",
+    ["stage"],
+)
+LLM_PROMPT_CHARS = Histogram("llm_prompt_chars", "Prompt size sent to the LLM (characters)", buckets=_SIZE_BUCKETS)
+LLM_RESPONSE_CHARS = Histogram("llm_response_chars", "Raw LLM response size (characters)", buckets=_SIZE_BUCKETS)
+QUEUE_WAIT = Histogram(
+    "review_queue_wait_seconds",
+    "Time LLM jobs wait in the ReviewQueue before starting, by priority class",
+    ["priority"],
+    buckets=_FAST_BUCKETS + (30, 60, 120, 300, 600),
+)
+DB_POOL_CHECKOUT = Histogram(
+    "db_pool_checkout_seconds",
+    "Time to check a connection out of the SQLAlchemy pool",
+    buckets=_FAST_BUCKETS,
+)
+DB_READ_ROUTES = Counter(
+    "db_read_routes_total",
+    "Read-only sessions by the database they were sent to (replica, or primary when it lags)",
+    ["target"],
+)
+DB_REPLICA_LAG = Gauge("db_replica_lag_seconds", "Replay lag of the read replica at its last check")
+FAILURE_ARTIFACTS = Counter(
+    "llm_failure_artifacts_total",
+    "Failed LLM outputs offered to the artifact store, by outcome (stored, sampled_out, dropped, write_error)",
+    ["outcome"],
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records not written, by reason (queue_full, rate_limited)",
+    ["reason"],
+)
+AUTH_VERIFICATIONS = Counter(
+    "auth_verifications_total",
+    "Bearer token checks, by outcome (cache_hit, verified, introspected, rejected)",
+    ["outcome"],
+)
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total",
+    "Requests refused with 429 by RateLimitMiddleware, by reason (rate, quota)",
+    ["reason"],
+)
+LLM_DEADLINE_OUTCOMES = Counter(
+    "llm_request_deadline_total",
+    "Synchronous LLM requests stopped early, by outcome (exceeded, retry_skipped, disconnected)",
+    ["outcome"],
+)
+REVIEW_INPUT_CUTS = Counter(
+    "review_input_cuts_total",
+    "Cuts made to fit review input into REVIEW_INPUT_TOKEN_BUDGET (trimmed, dropped, deduplicated, shortened)",
+    ["action"],
+)
+REVIEW_ROUND_MODES = Counter(
+    "review_round_modes_total",
+    "How later-round reviews were evaluated (incremental, reused, full, unlinked)",
+    ["mode"],
+)
+REVIEW_DUPLICATES = Counter(
+    "review_duplicates_total",
+    "New reviews found to nearly duplicate an evaluated one, by action (reused, flagged)",
+    ["action"],
+)
+# seconds from a review's arrival (reviews_table.created_at); with LLM_TWO_PHASE_MODE="off" both
+# are observed when the single pass is stored, otherwise first-score is phase 1 and complete phase 2
+REVIEW_TIME_TO_FIRST_SCORE = Histogram(
+    "review_time_to_first_score_seconds",
+    "Time from receiving a review to storing its rubric scores",
+    buckets=_LLM_BUCKETS + (300, 600, 1800, 3600),
+)
+REVIEW_TIME_TO_COMPLETE = Histogram(
+    "review_time_to_complete_seconds",
+    "Time from receiving a review to storing its full evaluation (scores, reasoning, feedback)",
+    buckets=_LLM_BUCKETS + (300, 600, 1800, 3600),
+)
+REVIEWS_BY_STATUS = Gauge("reviews_by_status", "Rows in reviews_table per ReviewStatus", ["status"])
+
+# reviews_by_status needs a DB query, so it is refreshed at most this often on scrape
+_STATUS_REFRESH_SECONDS = 15.0
+_status_refreshed_at: Optional[float] = None
+
+
+class _ReviewQueueCollector:
+    """Reads the ReviewQueue at scrape time, so the hot path pays nothing for these gauges."""
+
+    @staticmethod
+    def _families():
+        return (
+            GaugeMetricFamily("review_queue_in_flight", "LLM jobs currently running"),
+            GaugeMetricFamily("review_queue_depth", "LLM jobs waiting, by priority class", labels=["priority"]),
+            GaugeMetricFamily("review_queue_limit", "ReviewQueue admission limits", labels=["limit"]),
+        )
+
+    def describe(self):
+        # lets REGISTRY.register() skip collect(), which would import review_queue.py mid-import
+        return self._families()
+
+    def collect(self):
+        # imported lazily: review_queue imports this module for QUEUE_WAIT
+        from mcp.services.review_queue import get_review_queue
+
+        stats = get_review_queue().stats()
+        in_flight, queued, limit = self._families()
+        in_flight.add_metric([], stats["in_flight"])
+        for name, cls in stats["classes"].items():
+            queued.add_metric([name], cls["queued"])
+        limit.add_metric(["concurrency"], stats["concurrency"])
+        limit.add_metric(["max_depth"], stats["max_depth"])
+        limit.add_metric(["interactive_max_queued"], stats["interactive_max_queued"])
+        yield in_flight
+        yield queued
+        yield limit
+
+
+REGISTRY.register(_ReviewQueueCollector())
+
+
+class _DBPoolCollector:
+    """Reads the SQLAlchemy pools at scrape time (pool size and connections by state, per engine)."""
+
+    @staticmethod
+    def _families():
+        return (
+            GaugeMetricFamily("db_pool_size", "Configured pool size (DB_POOL_SIZE)", labels=["engine"]),
+            GaugeMetricFamily(
+                "db_pool_connections", "Pool connections: checked_out, idle, overflow", labels=["engine", "state"]
+            ),
+        )
+
+    def describe(self):
+        # lets REGISTRY.register() skip collect(), which would import db/session.py mid-import
+        return self._families()
+
+    def collect(self):
+        # imported lazily: db/session.py imports this module
+        from mcp.db.session import engine, replica_engine
+
+        size, connections = self._families()
+        for name, eng in (("primary", engine), ("replica", replica_engine)):
+            if eng is None:
+                continue
+            pool = eng.pool
+            size.add_metric([name], pool.size())
+            connections.add_metric([name, "checked_out"], pool.checkedout())
+            connections.add_metric([name, "idle"], pool.checkedin())
+            connections.add_metric([name, "overflow"], max(pool.overflow(), 0))
+        yield size
+        yield connections
+
+
+REGISTRY.register(_DBPoolCollector())
+
+
+async def refresh_review_status_counts() -> None:
+    """Update reviews_by_status from the database if the cached values are stale."""
+    global _status_refreshed_at
+    now = time.monotonic()
+    if _status_refreshed_at is not None and now - _status_refreshed_at < _STATUS_REFRESH_SECONDS:
+        return
+    _status_refreshed_at = now
+
+    from sqlalchemy import text
+    from mcp.db.models import ReviewStatus
+    from mcp.db.session import read_sessionmaker
+
+    async with (await read_sessionmaker())() as db:
+        result = await db.execute(text("SELECT status, COUNT(*) FROM reviews_table GROUP BY status"))
+        counts: Dict[str, int] = {str(status): n for status, n in result.all()}
+    for status in ReviewStatus:
+        REVIEWS_BY_STATUS.labels(status.value).set(counts.get(status.value, 0))
+
+
+def render_latest() -> bytes:
+    return generate_latest(REGISTRY)
+
+
+class PrometheusMiddleware:
+    """
+    Pure ASGI middleware recording HTTP latency per route template (e.g.
+    /api/v1/reviews/{expertiza_resonse_id}), so label cardinality stays bounded.
+    A ClientDisconnected from a handler ends the request without a response and is
+    recorded as status 499 (client closed request).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except ClientDisconnected:
+            status_code = 499
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(scope["method"], path, str(status_code)).observe(
+                time.perf_counter() - start
+            )
+
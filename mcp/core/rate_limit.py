@@ -0,0 +1,268 @@
+# mcp/core/rate_limit.py
+"""
+Per-client rate limits and daily LLM-call quotas (RATE_LIMITS in config.py).
+
+RateLimitMiddleware identifies the caller from the bearer token (authenticated once per
+request: verify_jwt reuses the outcome kept in the scope state) and:
+  - takes one token from the caller's bucket on every authenticated request,
+  - on routes that start LLM work, refuses callers whose quota for today is used up,
+  - answers 429 with Retry-After in both cases.
+Requests without a valid token pass through (and get verify_jwt's 401), except on LLM
+routes, some of which (/api/review/llmreview) take no token: there the caller is limited
+and charged by client address ("ip:<host>") under the "anonymous" RATE_LIMITS entry.
+
+Quota is charged per LLM provider call, not per request: the middleware puts the
+caller's sub in a context variable, which follows the request into background review
+jobs (the ReviewQueue runs each job in a copy of the submitting context), and
+LLMService calls charge_llm_call() before every attempt. The sub is also stored with the
+review (quota_subject, on insert and when it is deferred), and review jobs running
+outside the request (deferred, in worker processes, or retried by the scheduler) charge
+it through charging_to().
+"""
+import contextlib
+import contextvars
+import datetime
+import logging
+import math
+import re
+import time
+import urllib.parse
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from mcp.core.auth import InvalidToken, authenticate_request_token
+from mcp.core.metrics import RATE_LIMITED
+from mcp.db.session import AsyncSessionLocal
+from mcp.db.crud import add_llm_quota_usage, get_llm_quota_usage, take_rate_limit_token
+import mcp.config as config
+
+logger = logging.getLogger(__name__)
+
+# (method, path, query flag) of the routes that start LLM work and therefore need quota;
+# a route with a flag only does so when that boolean query parameter is true
+_LLM_ROUTES = [
+    ("POST", re.compile(r"^/api/review/llmreview$"), None),
+    ("POST", re.compile(r"^/api/v1/reviews$"), None),
+    ("POST", re.compile(r"^/api/v1/reviews/[^/]+/trigger$"), None),
+    ("GET", re.compile(r"^/api/v1/reviews/[^/]+$"), "details"),
+]
+# what FastAPI reads as true for a bool query parameter
+_TRUE_VALUES = {"1", "true", "on", "yes", "t", "y"}
+
+# in-memory state beyond this many clients is pruned of full buckets
+_MAX_TRACKED_SUBJECTS = 100_000
+
+_quota_subject: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("mcp_quota_subject", default=None)
+
+
+@dataclass
+class ClientLimits:
+    rate: float  # requests per second
+    burst: int
+    daily_llm_calls: int = 0  # 0 = no quota
+
+
+def _seconds_until_utc_midnight() -> float:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(), now.tzinfo)
+    return (tomorrow - now).total_seconds()
+
+
+def _query_flag(query_string: bytes, name: str) -> bool:
+    values = urllib.parse.parse_qs(query_string.decode("latin-1")).get(name)
+    return bool(values) and values[-1].lower() in _TRUE_VALUES
+
+
+def is_llm_route(method: str, path: str, query_string: bytes = b"") -> bool:
+    return any(
+        method == m and pattern.match(path) and (flag is None or _query_flag(query_string, flag))
+        for m, pattern, flag in _LLM_ROUTES
+    )
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, Any] = config.RATE_LIMITS, backend: str = config.RATE_LIMIT_BACKEND):
+        self.backend = backend
+        self._limits: Dict[str, Optional[ClientLimits]] = {
+            role: ClientLimits(**spec) if spec is not None else None for role, spec in limits.items()
+        }
+        self._default = self._limits.get("default")
+        # subject -> [tokens, last refill (monotonic)]
+        self._buckets: Dict[str, list] = {}
+        # subject -> (UTC date, calls)
+        self._usage: Dict[str, Tuple[datetime.date, int]] = {}
+
+    def limits_for(self, role: Optional[str]) -> Optional[ClientLimits]:
+        """Limits for a role; None means the role is not limited."""
+        if role in self._limits:
+            return self._limits[role]
+        return self._default
+
+    async def take(self, subject: str, limits: ClientLimits) -> float:
+        """Take one request token. Returns 0 if allowed, else seconds until the next token."""
+        if self.backend == "postgres":
+            async with AsyncSessionLocal() as db:
+                return await take_rate_limit_token(db, subject, limits.rate, limits.burst)
+
+        now = time.monotonic()
+        bucket = self._buckets.get(subject)
+        if bucket is None:
+            if len(self._buckets) >= _MAX_TRACKED_SUBJECTS:
+                self._prune_buckets(now, limits)
+            bucket = self._buckets[subject] = [float(limits.burst), now]
+        tokens = min(float(limits.burst), bucket[0] + (now - bucket[1]) * limits.rate)
+        bucket[1] = now
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            return 0.0
+        bucket[0] = tokens
+        return (1.0 - tokens) / limits.rate if limits.rate > 0 else _seconds_until_utc_midnight()
+
+    def _prune_buckets(self, now: float, limits: ClientLimits) -> None:
+        # a bucket that has refilled completely is indistinguishable from a new one
+        for subject, (tokens, last) in list(self._buckets.items()):
+            if tokens + (now - last) * limits.rate >= limits.burst:
+                del self._buckets[subject]
+
+    async def used_today(self, subject: str) -> int:
+        if self.backend == "postgres":
+            async with AsyncSessionLocal() as db:
+                return await get_llm_quota_usage(db, subject)
+        day, calls = self._usage.get(subject, (None, 0))
+        return calls if day == datetime.datetime.now(datetime.timezone.utc).date() else 0
+
+    async def quota_retry_after(self, subject: str, limits: ClientLimits) -> float:
+        """0 if the subject has LLM quota left today, else seconds until it resets (UTC midnight)."""
+        if not limits.daily_llm_calls:
+            return 0.0
+        if await self.used_today(subject) < limits.daily_llm_calls:
+            return 0.0
+        return _seconds_until_utc_midnight()
+
+    async def charge(self, subject: str, calls: int = 1) -> None:
+        if self.backend == "postgres":
+            async with AsyncSessionLocal() as db:
+                await add_llm_quota_usage(db, subject, calls)
+            return
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        day, used = self._usage.get(subject, (today, 0))
+        self._usage[subject] = (today, (used if day == today else 0) + calls)
+
+
+_rate_limiter_instance: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the single shared RateLimiter instance."""
+    global _rate_limiter_instance
+    if _rate_limiter_instance is None:
+        _rate_limiter_instance = RateLimiter()
+    return _rate_limiter_instance
+
+
+def current_quota_subject() -> Optional[str]:
+    """The client charged for LLM calls made in the current context (None outside limited requests)."""
+    return _quota_subject.get()
+
+
+@contextlib.contextmanager
+def charging_to(subject: Optional[str]) -> Iterator[None]:
+    """
+    Charge the LLM calls made inside the block to `subject` (a review's stored
+    quota_subject), unless the current request already names a client.
+    """
+    if subject is None or _quota_subject.get() is not None:
+        yield
+        return
+    token = _quota_subject.set(subject)
+    try:
+        yield
+    finally:
+        _quota_subject.reset(token)
+
+
+async def charge_llm_call(calls: int = 1) -> None:
+    """Charge LLM provider calls to the client whose request started this work, if any."""
+    subject = _quota_subject.get()
+    if subject is None:
+        return
+    try:
+        await get_rate_limiter().charge(subject, calls)
+    except Exception:
+        # never fail LLM work because quota bookkeeping is unavailable
+        logger.warning("Could not charge LLM quota for %s", subject, exc_info=True)
+
+
+def _bearer_token(scope: Scope) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, credentials = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and credentials:
+                return credentials.strip()
+    return None
+
+
+def _client_subject(scope: Scope) -> str:
+    # uvicorn --proxy-headers puts the forwarded address in scope["client"]
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware enforcing RATE_LIMITS; see the module docstring."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not config.RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        token = _bearer_token(scope)
+        claims = None
+        if token is not None:
+            try:
+                claims = await authenticate_request_token(scope.setdefault("state", {}), token)
+            except InvalidToken:
+                pass  # verify_jwt answers 401
+        limiter = get_rate_limiter()
+        llm_route = is_llm_route(scope["method"], scope["path"], scope.get("query_string", b""))
+        if claims:
+            limits = limiter.limits_for(claims.get("role"))
+            subject = str(claims.get("sub") or "anonymous")
+        elif llm_route:
+            limits = limiter.limits_for("anonymous")
+            subject = _client_subject(scope)
+        else:
+            limits = None
+        if limits is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            retry_after = await limiter.take(subject, limits)
+            reason = "rate"
+            if not retry_after and llm_route:
+                retry_after = await limiter.quota_retry_after(subject, limits)
+                reason = "quota"
+        except Exception:
+            # shared state unavailable (postgres backend): fail open rather than take the API down
+            logger.warning("Rate limit check failed for %s; allowing request", subject, exc_info=True)
+            retry_after = 0.0
+        if retry_after:
+            RATE_LIMITED.labels(reason).inc()
+            detail = "Rate limit exceeded" if reason == "rate" else "Daily LLM quota exhausted"
+            response = JSONResponse(
+                {"detail": detail}, status_code=429, headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+            await response(scope, receive, send)
+            return
+
+        ctx_token = _quota_subject.set(subject)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _quota_subject.reset(ctx_token)
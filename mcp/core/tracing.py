@@ -0,0 +1,125 @@
+# mcp/core/tracing.py
+"""
+OpenTelemetry tracing for the review pipeline:
+create_review -> schedule_process_review -> queue wait -> process_review ->
+llm.attempt / llm.call / llm.executor_wait -> db.* statements.
+
+TRACE_EXPORTER selects where spans go: "none" (default, tracing is a no-op),
+"console" (stdout) or "file" (one JSON span per line in TRACE_FILE, for offline use).
+The trace id of the latest run is stored on reviews_table.trace_id.
+"""
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, TextIO
+
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.trace import INVALID_SPAN_ID, Link, SpanContext, TraceFlags
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+import mcp.config as config
+
+logger = logging.getLogger(__name__)
+
+# spans are created through the global provider, so this is a no-op until configure_tracing()
+tracer = trace.get_tracer("mcp")
+
+_propagator = TraceContextTextMapPropagator()
+_provider: Optional[TracerProvider] = None
+_trace_file: Optional[TextIO] = None
+
+
+def configure_tracing(service_name: str = "mcp-api") -> None:
+    """Install the tracer provider and exporter chosen by TRACE_EXPORTER (once per process)."""
+    global _provider, _trace_file
+    if _provider is not None or config.TRACE_EXPORTER == "none":
+        return
+    if config.TRACE_EXPORTER == "file":
+        _trace_file = open(config.TRACE_FILE, "a", encoding="utf-8")
+        exporter = ConsoleSpanExporter(out=_trace_file, formatter=lambda span: span.to_json(indent=None) + "\n")
+    elif config.TRACE_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        logger.warning("Unknown TRACE_EXPORTER %r; tracing disabled", config.TRACE_EXPORTER)
+        return
+    _provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    logger.info("Tracing enabled (%s exporter)", config.TRACE_EXPORTER)
+
+
+def shutdown_tracing() -> None:
+    """Flush buffered spans to the exporter and close TRACE_FILE."""
+    global _trace_file
+    if _provider is not None:
+        _provider.shutdown()
+    if _trace_file is not None:
+        _trace_file.close()
+        _trace_file = None
+
+
+def current_trace_id() -> Optional[str]:
+    """Hex trace id of the active span, or None when not tracing."""
+    span_context = trace.get_current_span().get_span_context()
+    return format(span_context.trace_id, "032x") if span_context.is_valid else None
+
+
+def current_traceparent() -> Optional[str]:
+    """W3C traceparent of the active span, for handing work to another task."""
+    carrier: Dict[str, str] = {}
+    _propagator.inject(carrier)
+    return carrier.get("traceparent")
+
+
+@contextmanager
+def use_trace(traceparent: Optional[str] = None, trace_id: Optional[str] = None) -> Iterator[None]:
+    """
+    Continue a trace handed over from elsewhere when no span is active here.
+    `traceparent` resumes under the exact parent span (in-process handoffs).
+    `trace_id` (as stored on reviews_table) is all deferred and retried reviews have to
+    go on; with no span to continue under, they start a new trace whose root span,
+    "resume_trace", links to the stored one (review.previous_trace_id).
+    """
+    ctx = None
+    span = None
+    if not trace.get_current_span().get_span_context().is_valid:
+        if traceparent:
+            ctx = _propagator.extract({"traceparent": traceparent})
+        elif trace_id:
+            try:
+                linked = SpanContext(
+                    trace_id=int(trace_id, 16),
+                    span_id=INVALID_SPAN_ID,  # the trace is known, not which span in it
+                    is_remote=True,
+                    trace_flags=TraceFlags(TraceFlags.SAMPLED),
+                )
+            except ValueError:
+                logger.warning("Ignoring malformed trace id %r", trace_id)
+            else:
+                span = tracer.start_span(
+                    "resume_trace",
+                    context=otel_context.Context(),
+                    # a link without a span id is only kept with attributes of its own
+                    links=[Link(linked, {"review.previous_trace_id": trace_id})],
+                    attributes={"review.previous_trace_id": trace_id},
+                )
+                ctx = trace.set_span_in_context(span)
+    token = otel_context.attach(ctx) if ctx is not None else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            otel_context.detach(token)
+        if span is not None:
+            span.end()
+
+
+def record_span(name: str, start_ns: int, end_ns: int, attributes: Optional[Dict] = None) -> None:
+    """Record an already-finished interval (e.g. a queue or thread-pool wait) as a child span."""
+    if not trace.get_current_span().get_span_context().is_valid:
+        return
+    span = tracer.start_span(name, start_time=start_ns, attributes=attributes)
+    span.end(end_time=end_ns)
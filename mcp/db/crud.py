@@ -1,21 +1,100 @@
 # db/crud.py
 import json
-from typing import Any, Dict, Optional, Union
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import DBAPIError
+from mcp.db.prepared import PreparedQuery
 
 ResponseId = Union[int, str]
 
-async def get_review_by_response_id(database: AsyncSession, response_id: ResponseId) -> Optional[Dict[str, Any]]:
+# Postgres NOTIFY channel signalled whenever reviews are deferred (worker processes LISTEN on it)
+REVIEW_BACKLOG_CHANNEL = "review_backlog"
+
+# The columns of a ReviewResponse. Routes select only these: the review text and the
+# bookkeeping columns are often the larger part of a row and are never returned.
+REVIEW_RESPONSE_COLUMNS = (
+    "id, status, trace_id, llm_generated_feedback, llm_generated_score, llm_details_reasoning, "
+    "llm_generated_output, finalized_feedback, finalized_score, input_tokens, input_truncation, "
+    "previous_review_id, duplicate_of_review_id, duplicate_similarity"
+)
+
+
+# The statements of the review lifecycle run on the PreparedQuery fast path (db/prepared.py).
+# The column-list variants are built once per (constant) column list.
+@lru_cache(maxsize=None)
+def _select_review_by_response_id(columns: str) -> PreparedQuery:
+    return PreparedQuery(f"SELECT {columns} FROM reviews_table WHERE response_id_of_expertiza = :rid LIMIT 1")
+
+
+@lru_cache(maxsize=None)
+def _select_review_by_id(columns: str) -> PreparedQuery:
+    return PreparedQuery(f"SELECT {columns} FROM reviews_table WHERE id = :id")
+
+
+_INSERT_REVIEW = PreparedQuery(
+    f"""
+    INSERT INTO reviews_table (response_id_of_expertiza, review, status, course_name, assignment_name,
+                               trace_id, input_tokens, input_truncation, reviewer_id, reviewee_id,
+                               review_round, previous_review_id, quota_subject, owner_instance_id,
+                               created_at, updated_at)
+    VALUES (:response_id_of_expertiza, :review, :status, :course_name, :assignment_name,
+            :trace_id, :input_tokens, :input_truncation, :reviewer_id, :reviewee_id,
+            :review_round, :previous_review_id, :quota_subject, :owner, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    RETURNING {REVIEW_RESPONSE_COLUMNS}
+    """
+)
+
+_STORE_REVIEW_OUTPUT = PreparedQuery(
+    """
+    UPDATE reviews_table
+       SET llm_generated_feedback = :feedback,
+           llm_generated_score = :evaluation,
+           llm_details_reasoning = :details,
+           llm_generated_output = :full_output,
+           status = 'processed',
+           updated_at = CURRENT_TIMESTAMP
+     WHERE id = :id
+ RETURNING created_at
+    """
+)
+
+_STORE_REVIEW_SCORES = PreparedQuery(
+    """
+    UPDATE reviews_table
+       SET llm_generated_score = :evaluation,
+           status = 'scored',
+           updated_at = CURRENT_TIMESTAMP
+     WHERE id = :id
+ RETURNING created_at
+    """
+)
+
+_MARK_REVIEW_PROCESSING = PreparedQuery(
+    """
+    UPDATE reviews_table
+       SET status = 'processing',
+           trace_id = COALESCE(:trace_id, trace_id),
+           owner_instance_id = COALESCE(:owner, owner_instance_id),
+           updated_at = CURRENT_TIMESTAMP
+     WHERE id = :id
+ RETURNING quota_subject
+    """
+)
+
+_RESOLVE_FAILED_JOB = PreparedQuery("DELETE FROM failed_jobs WHERE reviews_id_from_review_table = :rid")
+
+
+async def get_review_by_response_id(
+    database: AsyncSession, response_id: ResponseId, columns: str = "*"
+) -> Optional[Dict[str, Any]]:
     """
     Return the first review that matches response_id_of_expertiza or None.
+    `columns` is a constant column list such as REVIEW_RESPONSE_COLUMNS (never user input).
     """
-    result = await database.execute(
-        text("SELECT * FROM reviews_table WHERE response_id_of_expertiza = :rid LIMIT 1"),
-        {"rid": response_id},
-    )
-    row = result.mappings().first()
+    row = await _select_review_by_response_id(columns).fetchrow(database, {"rid": response_id})
     return dict(row) if row else None
 
 
@@ -25,48 +104,228 @@ async def insert_review_received(
     review_text: str,
     status: str = "pending",  
     idempotent: bool = True,
+    course_name: Optional[str] = None,
+    assignment_name: Optional[str] = None,
+    trace_id: Optional[str] = None,
+    input_tokens: Optional[int] = None,
+    input_truncation: Optional[List[Dict[str, Any]]] = None,
+    reviewer_id: Optional[str] = None,
+    reviewee_id: Optional[str] = None,
+    review_round: Optional[int] = None,
+    previous_review_id: Optional[int] = None,
+    quota_subject: Optional[str] = None,
+    owner: Optional[str] = None,
 ) -> Optional[Dict[str, Any]]:
     """
-    Insert a review row and return the inserted row as a dict.
+    Insert a review row and return the inserted review (REVIEW_RESPONSE_COLUMNS) as a dict.
+    input_truncation (the cuts made by services/token_budget.py) is stored as JSON; empty means none.
+    quota_subject is the client charged for the review's LLM calls (core/rate_limit.py).
+    owner is the instance id of the process that will queue it (services/heartbeat.py).
     If idempotent=True, will return an existing row for the same response_id_of_expertiza instead of inserting a duplicate.
     Note: for true atomic idempotency, add a UNIQUE constraint on response_id_of_expertiza and use the upsert SQL below.
     """
     if idempotent:
-        existing = await get_review_by_response_id(database, response_id_of_expertiza)
+        existing = await get_review_by_response_id(database, response_id_of_expertiza, REVIEW_RESPONSE_COLUMNS)
         if existing:
             return existing
 
-    insert_sql = text(
-        """
-        INSERT INTO reviews_table (response_id_of_expertiza, review, status, created_at, updated_at)
-        VALUES (:response_id_of_expertiza, :review, :status, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        RETURNING *
-        """
-    )
     try:
-        result = await database.execute(
-            insert_sql,
-            {"response_id_of_expertiza": response_id_of_expertiza, "review": review_text, "status": status},
+        row = await _INSERT_REVIEW.fetchrow(
+            database,
+            {
+                "response_id_of_expertiza": response_id_of_expertiza,
+                "review": review_text,
+                "status": status,
+                "course_name": course_name,
+                "assignment_name": assignment_name,
+                "trace_id": trace_id,
+                "input_tokens": input_tokens,
+                "input_truncation": json.dumps(input_truncation) if input_truncation else None,
+                "reviewer_id": reviewer_id,
+                "reviewee_id": reviewee_id,
+                "review_round": review_round,
+                "previous_review_id": previous_review_id,
+                "quota_subject": quota_subject,
+                "owner": owner,
+            },
         )
         await database.commit()
-        row = result.mappings().first()
         return dict(row) if row else None
     except DBAPIError as exc:
         raise
 
 
-async def get_review_by_id(database: AsyncSession, review_id: int) -> Optional[Dict[str, Any]]:
+async def get_review_by_id(database: AsyncSession, review_id: int, columns: str = "*") -> Optional[Dict[str, Any]]:
     """
     Fetch a review row by database id. Returns a dict or None if not found.
+    `columns` is a constant column list such as REVIEW_RESPONSE_COLUMNS (never user input).
+    """
+    row = await _select_review_by_id(columns).fetchrow(database, {"id": review_id})
+    return dict(row) if row else None
+
+
+async def get_previous_round_review(
+    database: AsyncSession,
+    course_name: Optional[str],
+    assignment_name: Optional[str],
+    reviewer_id: str,
+    reviewee_id: str,
+    review_round: int,
+) -> Optional[Dict[str, Any]]:
+    """
+    The latest review of the same reviewer/reviewee pair in `review_round` of the same
+    assignment, preferring ones the LLM has already evaluated. Returns a dict or None.
     """
     result = await database.execute(
-        text("SELECT * FROM reviews_table WHERE id = :id"),
-        {"id": review_id},
+        text(
+            """
+            SELECT * FROM reviews_table
+             WHERE assignment_name IS NOT DISTINCT FROM :assignment_name
+               AND course_name IS NOT DISTINCT FROM :course_name
+               AND reviewer_id = :reviewer_id
+               AND reviewee_id = :reviewee_id
+               AND review_round = :review_round
+             ORDER BY (llm_generated_output IS NOT NULL) DESC, id DESC
+             LIMIT 1
+            """
+        ),
+        {
+            "course_name": course_name,
+            "assignment_name": assignment_name,
+            "reviewer_id": reviewer_id,
+            "reviewee_id": reviewee_id,
+            "review_round": review_round,
+        },
     )
     row = result.mappings().first()
     return dict(row) if row else None
 
 
+async def store_review_output(
+    database: AsyncSession,
+    review_id: int,
+    feedback: Optional[str],
+    evaluation_json: Optional[str],
+    details_json: Optional[str],
+    full_output_json: Optional[str],
+) -> Optional[datetime]:
+    """
+    Write an LLM result (see orchestrator.serialize_llm_output) to the review and mark it
+    processed. Returns the review's created_at (None if it does not exist). Does not commit.
+    """
+    return await _STORE_REVIEW_OUTPUT.fetchval(
+        database,
+        {
+            "feedback": feedback,
+            "evaluation": evaluation_json,
+            "details": details_json,
+            "full_output": full_output_json,
+            "id": review_id,
+        },
+    )
+
+
+async def store_review_scores(database: AsyncSession, review_id: int, evaluation_json: str) -> Optional[datetime]:
+    """
+    Write the phase-1 evaluation of a two-phase run (LLM_TWO_PHASE_MODE) and mark the
+    review scored. Returns the review's created_at (None if it does not exist). Does not commit.
+    """
+    return await _STORE_REVIEW_SCORES.fetchval(database, {"evaluation": evaluation_json, "id": review_id})
+
+
+async def insert_review_fingerprint(
+    database: AsyncSession,
+    review_id: int,
+    course_name: Optional[str],
+    assignment_name: Optional[str],
+    review_round: Optional[int],
+    simhash: int,
+    bands: List[int],
+) -> None:
+    """Store (or replace) a review's SimHash and its LSH bands. Does not commit."""
+    await database.execute(
+        text(
+            """
+            INSERT INTO review_fingerprints (review_id, course_name, assignment_name, review_round,
+                                             simhash, band0, band1, band2, band3, band4, band5, band6, band7)
+            VALUES (:review_id, :course_name, :assignment_name, :review_round,
+                    :simhash, :band0, :band1, :band2, :band3, :band4, :band5, :band6, :band7)
+            ON CONFLICT (review_id) DO UPDATE
+               SET simhash = EXCLUDED.simhash,
+                   band0 = EXCLUDED.band0, band1 = EXCLUDED.band1, band2 = EXCLUDED.band2,
+                   band3 = EXCLUDED.band3, band4 = EXCLUDED.band4, band5 = EXCLUDED.band5,
+                   band6 = EXCLUDED.band6, band7 = EXCLUDED.band7
+            """
+        ),
+        {
+            "review_id": review_id,
+            "course_name": course_name,
+            "assignment_name": assignment_name,
+            "review_round": review_round,
+            "simhash": simhash,
+            **{f"band{i}": band for i, band in enumerate(bands)},
+        },
+    )
+
+
+async def find_fingerprint_candidates(
+    database: AsyncSession,
+    course_name: Optional[str],
+    assignment_name: Optional[str],
+    review_round: Optional[int],
+    bands: List[int],
+    limit: int = 500,
+) -> List[Dict[str, Any]]:
+    """
+    Evaluated reviews of the same course/assignment/round sharing at least one SimHash band
+    with `bands`. Each row is the review plus its `simhash`.
+    """
+    result = await database.execute(
+        text(
+            """
+            SELECT r.*, f.simhash
+              FROM review_fingerprints f
+              JOIN reviews_table r ON r.id = f.review_id
+             WHERE f.assignment_name IS NOT DISTINCT FROM :assignment_name
+               AND (f.band0 = :band0 OR f.band1 = :band1 OR f.band2 = :band2 OR f.band3 = :band3
+                    OR f.band4 = :band4 OR f.band5 = :band5 OR f.band6 = :band6 OR f.band7 = :band7)
+               AND f.course_name IS NOT DISTINCT FROM :course_name
+               AND f.review_round IS NOT DISTINCT FROM :review_round
+               AND r.llm_generated_output IS NOT NULL
+             LIMIT :limit
+            """
+        ),
+        {
+            "course_name": course_name,
+            "assignment_name": assignment_name,
+            "review_round": review_round,
+            "limit": limit,
+            **{f"band{i}": band for i, band in enumerate(bands)},
+        },
+    )
+    return [dict(row) for row in result.mappings().all()]
+
+
+async def mark_review_duplicate(database: AsyncSession, review_id: int, duplicate_of: int, similarity: float) -> None:
+    """Record which evaluated review this one nearly duplicates. Does not commit."""
+    await database.execute(
+        text(
+            """
+            UPDATE reviews_table
+               SET duplicate_of_review_id = :duplicate_of,
+                   duplicate_similarity = :similarity,
+                   updated_at = CURRENT_TIMESTAMP
+             WHERE id = :id
+            """
+        ),
+        {"id": review_id, "duplicate_of": duplicate_of, "similarity": similarity},
+    )
+
+
+# what finalizing reads from the current row
+_FINALIZE_COLUMNS = "id, llm_generated_score, llm_generated_feedback"
+
+
 async def finalize_review_by_id(
     database: AsyncSession,
     review_id: int,
@@ -80,10 +339,10 @@ async def finalize_review_by_id(
     - A float (for backward compatibility)
     - A dict (evaluation object) - will be JSON serialized
     - A string (JSON string) - will be stored as-is
-    Returns the updated row dict or None if the id does not exist.
+    Returns the updated review (REVIEW_RESPONSE_COLUMNS) or None if the id does not exist.
     """
     # fetch current row
-    current = await get_review_by_id(database, review_id)
+    current = await get_review_by_id(database, review_id, _FINALIZE_COLUMNS)
     if not current:
         return None
 
@@ -105,23 +364,22 @@ async def finalize_review_by_id(
     # Handle finalized_feedback
     ff = finalized_feedback if finalized_feedback is not None else current.get("llm_generated_feedback")
 
-    await database.execute(
+    result = await database.execute(
         text(
-            """
+            f"""
             UPDATE reviews_table
                SET finalized_score    = :fs,
                    finalized_feedback = :ff,
                    status             = 'finalized',
                    updated_at         = CURRENT_TIMESTAMP
              WHERE id = :id
+         RETURNING {REVIEW_RESPONSE_COLUMNS}
             """
         ),
         {"fs": fs, "ff": ff, "id": review_id},
     )
-    await database.commit()
-
-    result = await database.execute(text("SELECT * FROM reviews_table WHERE id = :id"), {"id": review_id})
     updated = result.mappings().first()
+    await database.commit()
     return dict(updated) if updated else None
 
 
@@ -138,10 +396,10 @@ async def finalize_review_by_response_id(
     - A float (for backward compatibility)
     - A dict (evaluation object) - will be JSON serialized
     - A string (JSON string) - will be stored as-is
-    Returns the updated row dict or None if the response_id does not exist.
+    Returns the updated review (REVIEW_RESPONSE_COLUMNS) or None if the response_id does not exist.
     """
     # fetch current row by response_id_of_expertiza
-    current = await get_review_by_response_id(database, response_id_of_expertiza)
+    current = await get_review_by_response_id(database, response_id_of_expertiza, _FINALIZE_COLUMNS)
     if not current:
         return None
 
@@ -167,22 +425,586 @@ async def finalize_review_by_response_id(
     # Handle finalized_feedback
     ff = finalized_feedback if finalized_feedback is not None else current.get("llm_generated_feedback")
 
-    await database.execute(
+    result = await database.execute(
         text(
-            """
+            f"""
             UPDATE reviews_table
                SET finalized_score    = :fs,
                    finalized_feedback = :ff,
                    status             = 'finalized',
                    updated_at         = CURRENT_TIMESTAMP
              WHERE id = :id
+         RETURNING {REVIEW_RESPONSE_COLUMNS}
             """
         ),
         {"fs": fs, "ff": ff, "id": review_id},
     )
-    await database.commit()
-
-    result = await database.execute(text("SELECT * FROM reviews_table WHERE id = :id"), {"id": review_id})
     updated = result.mappings().first()
+    await database.commit()
     return dict(updated) if updated else None
 
+
+async def record_failed_job(
+    database: AsyncSession,
+    review_id: int,
+    error_message: str,
+    max_attempts: int,
+    base_delay: float,
+    max_delay: float,
+) -> Optional[Dict[str, Any]]:
+    """
+    Record a failed processing attempt for a review in failed_jobs (one row per review).
+    Increments attempts and schedules the next retry at base_delay * 2**(attempts - 1)
+    seconds (capped at max_delay). Once attempts reach max_attempts the job is
+    dead-lettered: next_attempt_at is cleared and dead_lettered_at is set.
+    Does not commit; the caller commits together with the review status update.
+    Returns the failed_jobs row as a dict.
+    """
+    result = await database.execute(
+        text(
+            """
+            INSERT INTO failed_jobs (reviews_id_from_review_table, error_message, attempts,
+                                     last_attempt_at, next_attempt_at, dead_lettered_at, created_at)
+            VALUES (:rid, :err, 1, CURRENT_TIMESTAMP,
+                    CASE WHEN :max_attempts <= 1 THEN NULL
+                         ELSE CURRENT_TIMESTAMP
+                              + make_interval(secs => LEAST(CAST(:base AS double precision),
+                                                            CAST(:cap AS double precision))) END,
+                    CASE WHEN :max_attempts <= 1 THEN CURRENT_TIMESTAMP ELSE NULL END,
+                    CURRENT_TIMESTAMP)
+            ON CONFLICT (reviews_id_from_review_table) DO UPDATE
+               SET error_message    = EXCLUDED.error_message,
+                   attempts         = failed_jobs.attempts + 1,
+                   last_attempt_at  = CURRENT_TIMESTAMP,
+                   next_attempt_at  = CASE
+                       WHEN failed_jobs.attempts + 1 >= :max_attempts THEN NULL
+                       ELSE CURRENT_TIMESTAMP
+                            + make_interval(secs => LEAST(CAST(:base AS double precision) * power(2, failed_jobs.attempts),
+                                                          CAST(:cap AS double precision)))
+                   END,
+                   dead_lettered_at = CASE
+                       WHEN failed_jobs.attempts + 1 >= :max_attempts THEN CURRENT_TIMESTAMP
+                       ELSE NULL
+                   END
+            RETURNING *
+            """
+        ),
+        {
+            "rid": review_id,
+            "err": error_message,
+            "max_attempts": max_attempts,
+            "base": float(base_delay),
+            "cap": float(max_delay),
+        },
+    )
+    row = result.mappings().first()
+    return dict(row) if row else None
+
+
+async def resolve_failed_job(database: AsyncSession, review_id: int) -> None:
+    """
+    Remove the failed_jobs entry for a review after it was processed successfully.
+    Does not commit; the caller commits together with the review update.
+    """
+    await _RESOLVE_FAILED_JOB.execute(database, {"rid": review_id})
+
+
+async def claim_due_failed_jobs(
+    database: AsyncSession, limit: int, lease_seconds: float, owner: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Claim up to `limit` failed jobs whose retry is due and reset their reviews to 'pending',
+    owned by `owner` (the claiming process's instance id).
+    Claimed jobs get next_attempt_at pushed out by lease_seconds, so a job whose retry dies
+    with the process becomes due again instead of being lost; a retry that ends up in the
+    deferred backlog gives the lease up (_release_failed_job_leases). FOR UPDATE SKIP LOCKED keeps
+    concurrent schedulers (several API replicas) from claiming the same job.
+    Returns dicts with failed_job_id, review_id, attempts, review (the LLM-facing text),
+    course_name, assignment_name and trace_id.
+    """
+    result = await database.execute(
+        text(
+            """
+            UPDATE failed_jobs AS f
+               SET next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => CAST(:lease AS double precision))
+              FROM reviews_table AS r
+             WHERE r.id = f.reviews_id_from_review_table
+               AND f.id IN (
+                   SELECT id FROM failed_jobs
+                    WHERE dead_lettered_at IS NULL
+                      AND next_attempt_at <= CURRENT_TIMESTAMP
+                    ORDER BY next_attempt_at
+                    LIMIT :limit
+                    FOR UPDATE SKIP LOCKED
+               )
+            RETURNING f.id AS failed_job_id, f.reviews_id_from_review_table AS review_id,
+                      f.attempts, r.review, r.course_name, r.assignment_name, r.trace_id
+            """
+        ),
+        {"limit": limit, "lease": float(lease_seconds)},
+    )
+    claimed = [dict(row) for row in result.mappings().all()]
+    if claimed:
+        await database.execute(
+            text(
+                """
+                UPDATE reviews_table
+                   SET status = 'pending',
+                       owner_instance_id = :owner,
+                       updated_at = CURRENT_TIMESTAMP
+                 WHERE id = ANY(:ids)
+                """
+            ),
+            {"ids": [job["review_id"] for job in claimed], "owner": owner},
+        )
+    await database.commit()
+    return claimed
+
+
+async def list_failed_jobs(
+    database: AsyncSession,
+    dead_letter: Optional[bool] = None,
+    limit: int = 50,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    List failed jobs joined with their review's Expertiza id and status, newest failure first,
+    with the ids of the review's stored failure artifacts (newest first).
+    dead_letter=True returns only dead-lettered jobs, False only jobs still being retried,
+    None returns both.
+    """
+    where = ""
+    if dead_letter is True:
+        where = "WHERE f.dead_lettered_at IS NOT NULL"
+    elif dead_letter is False:
+        where = "WHERE f.dead_lettered_at IS NULL"
+
+    result = await database.execute(
+        text(
+            f"""
+            SELECT f.id, f.reviews_id_from_review_table AS review_id, r.response_id_of_expertiza,
+                   r.status AS review_status, f.error_message, f.attempts, f.last_attempt_at,
+                   f.next_attempt_at, f.dead_lettered_at, f.created_at,
+                   ARRAY(SELECT a.id FROM llm_failure_artifacts AS a
+                          WHERE a.reviews_id_from_review_table = f.reviews_id_from_review_table
+                          ORDER BY a.id DESC) AS artifact_ids
+              FROM failed_jobs AS f
+              JOIN reviews_table AS r ON r.id = f.reviews_id_from_review_table
+              {where}
+             ORDER BY f.last_attempt_at DESC NULLS LAST, f.id DESC
+             LIMIT :limit OFFSET :offset
+            """
+        ),
+        {"limit": limit, "offset": offset},
+    )
+    return [dict(row) for row in result.mappings().all()]
+
+
+async def requeue_failed_jobs(database: AsyncSession, failed_job_ids: Optional[List[int]] = None) -> List[int]:
+    """
+    Move dead-lettered jobs back into the retry schedule with a fresh attempt budget.
+    If failed_job_ids is None, every dead-lettered job is requeued.
+    Returns the ids of the requeued failed_jobs rows.
+    """
+    filter_sql = "AND id = ANY(:ids)" if failed_job_ids is not None else ""
+    params: Dict[str, Any] = {"ids": list(failed_job_ids)} if failed_job_ids is not None else {}
+    result = await database.execute(
+        text(
+            f"""
+            UPDATE failed_jobs
+               SET attempts = 0,
+                   dead_lettered_at = NULL,
+                   next_attempt_at = CURRENT_TIMESTAMP
+             WHERE dead_lettered_at IS NOT NULL
+               {filter_sql}
+            RETURNING id
+            """
+        ),
+        params,
+    )
+    requeued = [row[0] for row in result.all()]
+    await database.commit()
+    return requeued
+
+
+async def _release_failed_job_leases(database: AsyncSession, review_ids: List[int]) -> None:
+    """
+    Clear the retry lease (next_attempt_at) of the failed jobs of reviews that were just
+    deferred: the backlog now runs the retry, and a lease left to expire would let
+    claim_due_failed_jobs run it a second time. A new failure schedules the next retry again
+    (record_failed_job). Does not commit.
+    """
+    if not review_ids:
+        return
+    await database.execute(
+        text(
+            """
+            UPDATE failed_jobs
+               SET next_attempt_at = NULL
+             WHERE reviews_id_from_review_table = ANY(:ids)
+               AND dead_lettered_at IS NULL
+            """
+        ),
+        {"ids": list(review_ids)},
+    )
+
+
+async def defer_review(
+    database: AsyncSession, review_id: int, priority: int, quota_subject: Optional[str] = None
+) -> None:
+    """
+    Park a review in the durable backlog (status 'pending', deferred_at set) because the
+    in-process queue is full. The backlog feeder claims it once there is room.
+    quota_subject, when given, becomes the client charged for the deferred run.
+    A failed job retrying the review loses its lease (_release_failed_job_leases).
+    """
+    await database.execute(
+        text(
+            """
+            UPDATE reviews_table
+               SET status = 'pending',
+                   deferred_at = CURRENT_TIMESTAMP,
+                   deferred_priority = :priority,
+                   quota_subject = COALESCE(:quota_subject, quota_subject),
+                   updated_at = CURRENT_TIMESTAMP
+             WHERE id = :id
+            """
+        ),
+        {"id": review_id, "priority": int(priority), "quota_subject": quota_subject},
+    )
+    await _release_failed_job_leases(database, [review_id])
+    # wake idle workers listening on the backlog channel (delivered on commit)
+    await database.execute(text("SELECT pg_notify(:channel, '')"), {"channel": REVIEW_BACKLOG_CHANNEL})
+    await database.commit()
+
+
+async def claim_deferred_reviews(database: AsyncSession, limit: int, owner: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Claim up to `limit` deferred reviews for `owner` (the claiming process's instance id),
+    clearing deferred_at so no other process claims them.
+    Rows are taken by priority and then round-robin across course/assignment (oldest first
+    within each), so a large deferred backlog from one course does not delay the others.
+    Returns dicts with id, review, course_name, assignment_name, deferred_priority and trace_id.
+    """
+    result = await database.execute(
+        text(
+            """
+            UPDATE reviews_table
+               SET deferred_at = NULL,
+                   owner_instance_id = :owner,
+                   updated_at = CURRENT_TIMESTAMP
+             WHERE id IN (
+                   SELECT id FROM reviews_table
+                    WHERE id IN (
+                          SELECT id FROM (
+                                 SELECT id, deferred_priority, deferred_at,
+                                        ROW_NUMBER() OVER (
+                                            PARTITION BY deferred_priority, course_name, assignment_name
+                                            ORDER BY deferred_at
+                                        ) AS tenant_rank
+                                   FROM reviews_table
+                                  WHERE deferred_at IS NOT NULL
+                          ) AS ranked
+                           ORDER BY deferred_priority, tenant_rank, deferred_at
+                           LIMIT :limit
+                    )
+                      AND deferred_at IS NOT NULL
+                      FOR UPDATE SKIP LOCKED
+             )
+            RETURNING id, review, course_name, assignment_name, deferred_priority, trace_id
+            """
+        ),
+        {"limit": limit, "owner": owner},
+    )
+    claimed = [dict(row) for row in result.mappings().all()]
+    await database.commit()
+    return claimed
+
+
+async def count_deferred_reviews(database: AsyncSession) -> Dict[int, int]:
+    """Return the number of deferred reviews per deferred_priority."""
+    result = await database.execute(
+        text(
+            """
+            SELECT deferred_priority, COUNT(*) AS n
+              FROM reviews_table
+             WHERE deferred_at IS NOT NULL
+             GROUP BY deferred_priority
+            """
+        )
+    )
+    return {row["deferred_priority"]: row["n"] for row in result.mappings().all()}
+
+
+async def defer_reviews(database: AsyncSession, reviews: List[Tuple[int, int]]) -> None:
+    """
+    Bulk version of defer_review for (review_id, priority) pairs, used to checkpoint
+    unfinished work on shutdown. Reviews that already reached 'processed' or 'finalized'
+    are left untouched (and have no failed job left to release).
+    """
+    if not reviews:
+        return
+    await database.execute(
+        text(
+            """
+            UPDATE reviews_table
+               SET status = 'pending',
+                   deferred_at = CURRENT_TIMESTAMP,
+                   deferred_priority = :priority,
+                   updated_at = CURRENT_TIMESTAMP
+             WHERE id = :id
+               AND status NOT IN ('processed', 'finalized')
+            """
+        ),
+        [{"id": review_id, "priority": int(priority)} for review_id, priority in reviews],
+    )
+    await _release_failed_job_leases(database, [review_id for review_id, _ in reviews])
+    await database.execute(text("SELECT pg_notify(:channel, '')"), {"channel": REVIEW_BACKLOG_CHANNEL})
+    await database.commit()
+
+
+async def defer_orphaned_reviews(
+    database: AsyncSession, grace_seconds: float, heartbeat_timeout: float, priority: int
+) -> int:
+    """
+    Put reviews stuck in 'pending'/'processing' by a process that died back into the
+    deferred backlog: rows whose owner has no heartbeat newer than heartbeat_timeout, and
+    rows without an owner that were not updated for grace_seconds. Rows held by a live
+    process are left alone however old they are. Then forgets the dead processes' heartbeats.
+    Returns the number of rows re-deferred.
+    """
+    result = await database.execute(
+        text(
+            """
+            UPDATE reviews_table AS r
+               SET status = 'pending',
+                   deferred_at = CURRENT_TIMESTAMP,
+                   deferred_priority = :priority,
+                   updated_at = CURRENT_TIMESTAMP
+             WHERE r.status IN ('pending', 'processing')
+               AND r.deferred_at IS NULL
+               AND CASE
+                   WHEN r.owner_instance_id IS NULL
+                   THEN r.updated_at < CURRENT_TIMESTAMP - make_interval(secs => CAST(:grace AS double precision))
+                   ELSE NOT EXISTS (
+                        SELECT 1 FROM process_heartbeats AS h
+                         WHERE h.instance_id = r.owner_instance_id
+                           AND h.heartbeat_at >= CURRENT_TIMESTAMP
+                                                 - make_interval(secs => CAST(:timeout AS double precision))
+                   )
+               END
+            RETURNING r.id
+            """
+        ),
+        {"grace": float(grace_seconds), "timeout": float(heartbeat_timeout), "priority": int(priority)},
+    )
+    deferred = [row[0] for row in result.all()]
+    await database.execute(
+        text(
+            """
+            DELETE FROM process_heartbeats
+             WHERE heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => CAST(:timeout AS double precision))
+            """
+        ),
+        {"timeout": float(heartbeat_timeout)},
+    )
+    if deferred:
+        await _release_failed_job_leases(database, deferred)
+        await database.execute(text("SELECT pg_notify(:channel, '')"), {"channel": REVIEW_BACKLOG_CHANNEL})
+    await database.commit()
+    return len(deferred)
+
+
+async def mark_review_processing(
+    database: AsyncSession, review_id: int, trace_id: Optional[str] = None, owner: Optional[str] = None
+) -> Optional[str]:
+    """
+    Mark a review as 'processing' when a worker starts on it, recording the run's trace id
+    and the instance id of the process running it.
+    Returns the review's quota_subject.
+    """
+    quota_subject = await _MARK_REVIEW_PROCESSING.fetchval(
+        database, {"id": review_id, "trace_id": trace_id, "owner": owner}
+    )
+    await database.commit()
+    return quota_subject
+
+
+async def record_process_heartbeat(database: AsyncSession, instance_id: str) -> None:
+    """Mark the process `instance_id` alive now (services/heartbeat.py). Commits."""
+    await database.execute(
+        text(
+            """
+            INSERT INTO process_heartbeats (instance_id, started_at, heartbeat_at)
+            VALUES (:id, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            ON CONFLICT (instance_id) DO UPDATE SET heartbeat_at = CURRENT_TIMESTAMP
+            """
+        ),
+        {"id": instance_id},
+    )
+    await database.commit()
+
+
+async def remove_process_heartbeat(database: AsyncSession, instance_id: str) -> None:
+    """Forget a process on clean shutdown, so the reviews it still owns are swept at once. Commits."""
+    await database.execute(text("DELETE FROM process_heartbeats WHERE instance_id = :id"), {"id": instance_id})
+    await database.commit()
+
+
+async def insert_failure_artifacts(database: AsyncSession, artifacts: List[Dict[str, Any]]) -> None:
+    """
+    Bulk-insert failed LLM outputs into llm_failure_artifacts. Each dict has review_id,
+    attempt, stage, error_message, raw_output, raw_chars and trace_id. Commits.
+    """
+    if not artifacts:
+        return
+    await database.execute(
+        text(
+            """
+            INSERT INTO llm_failure_artifacts (reviews_id_from_review_table, attempt, stage, error_message,
+                                               raw_output, raw_chars, trace_id, created_at)
+            VALUES (:review_id, :attempt, :stage, :error_message, :raw_output, :raw_chars, :trace_id,
+                    CURRENT_TIMESTAMP)
+            """
+        ),
+        artifacts,
+    )
+    await database.commit()
+
+
+async def prune_failure_artifacts(database: AsyncSession, retention_days: float, max_per_review: int) -> int:
+    """
+    Delete artifacts older than retention_days and all but the newest max_per_review per review.
+    Returns the number of rows deleted. Commits.
+    """
+    result = await database.execute(
+        text(
+            """
+            DELETE FROM llm_failure_artifacts
+             WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => CAST(:retention AS double precision))
+                OR id IN (
+                   SELECT id FROM (
+                          SELECT id, ROW_NUMBER() OVER (
+                                     PARTITION BY reviews_id_from_review_table ORDER BY id DESC
+                                 ) AS newest
+                            FROM llm_failure_artifacts
+                           WHERE reviews_id_from_review_table IS NOT NULL
+                   ) AS ranked
+                    WHERE newest > :max_per_review
+                )
+            """
+        ),
+        {"retention": retention_days * 86400, "max_per_review": max_per_review},
+    )
+    await database.commit()
+    return result.rowcount or 0
+
+
+async def list_failure_artifacts(
+    database: AsyncSession,
+    review_id: Optional[int] = None,
+    limit: int = 50,
+) -> List[Dict[str, Any]]:
+    """List artifact metadata (without the raw output), newest first, optionally for one review."""
+    where = "WHERE reviews_id_from_review_table = :review_id" if review_id is not None else ""
+    result = await database.execute(
+        text(
+            f"""
+            SELECT id, reviews_id_from_review_table AS review_id, attempt, stage, error_message,
+                   raw_chars, trace_id, created_at
+              FROM llm_failure_artifacts
+              {where}
+             ORDER BY id DESC
+             LIMIT :limit
+            """
+        ),
+        {"review_id": review_id, "limit": limit},
+    )
+    return [dict(row) for row in result.mappings().all()]
+
+
+async def get_failure_artifact(database: AsyncSession, artifact_id: int) -> Optional[Dict[str, Any]]:
+    result = await database.execute(
+        text(
+            """
+            SELECT id, reviews_id_from_review_table AS review_id, attempt, stage, error_message,
+                   raw_output, raw_chars, trace_id, created_at
+              FROM llm_failure_artifacts
+             WHERE id = :id
+            """
+        ),
+        {"id": artifact_id},
+    )
+    row = result.mappings().first()
+    return dict(row) if row else None
+
+
+async def take_rate_limit_token(database: AsyncSession, subject: str, rate: float, burst: int) -> float:
+    """
+    Take one token from the subject's shared bucket (refilled at `rate` per second up to
+    `burst`). Returns 0 if the request may proceed, else seconds until a token is available.
+    The refill and the take are one atomic upsert, so replicas never double-spend. Commits.
+    """
+    refill = (
+        "LEAST(CAST(:burst AS double precision), rate_limit_buckets.tokens "
+        "+ EXTRACT(EPOCH FROM (now() - rate_limit_buckets.updated_at)) * CAST(:rate AS double precision))"
+    )
+    params = {"subject": subject, "rate": rate, "burst": burst}
+    result = await database.execute(
+        text(
+            f"""
+            INSERT INTO rate_limit_buckets (subject, tokens, updated_at)
+            VALUES (:subject, CAST(:burst AS double precision) - 1, now())
+            ON CONFLICT (subject) DO UPDATE
+               SET tokens = {refill} - 1,
+                   updated_at = now()
+             WHERE {refill} >= 1
+            RETURNING tokens
+            """
+        ),
+        params,
+    )
+    taken = result.first() is not None
+    retry_after = 0.0
+    if not taken:
+        # the conditional update left the row alone; work out when the next token arrives
+        result = await database.execute(
+            text(f"SELECT {refill} FROM rate_limit_buckets WHERE subject = :subject"), params
+        )
+        available = result.scalar() or 0.0
+        retry_after = max((1.0 - available) / rate, 0.0) if rate > 0 else 86400.0
+    await database.commit()
+    return retry_after
+
+
+async def get_llm_quota_usage(database: AsyncSession, subject: str) -> int:
+    """LLM calls charged to subject so far today (UTC)."""
+    result = await database.execute(
+        text(
+            """
+            SELECT calls FROM llm_quota_usage
+             WHERE subject = :subject AND day = CAST(timezone('UTC', now()) AS date)
+            """
+        ),
+        {"subject": subject},
+    )
+    return result.scalar() or 0
+
+
+async def add_llm_quota_usage(database: AsyncSession, subject: str, calls: int = 1) -> None:
+    """Charge LLM calls to subject for today (UTC) and drop usage rows older than a week. Commits."""
+    await database.execute(
+        text(
+            """
+            INSERT INTO llm_quota_usage (subject, day, calls)
+            VALUES (:subject, CAST(timezone('UTC', now()) AS date), :calls)
+            ON CONFLICT (subject, day) DO UPDATE SET calls = llm_quota_usage.calls + EXCLUDED.calls
+            """
+        ),
+        {"subject": subject, "calls": calls},
+    )
+    await database.execute(
+        text("DELETE FROM llm_quota_usage WHERE subject = :subject AND day < CAST(timezone('UTC', now()) AS date) - 7"),
+        {"subject": subject},
+    )
+    await database.commit()
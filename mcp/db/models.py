@@ -1,5 +1,5 @@
 # db/models.py
-from sqlalchemy import Column, Integer, Text, Float, Enum, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import BigInteger, Column, Integer, Text, Float, Enum, Date, DateTime, ForeignKey, UniqueConstraint, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -8,6 +8,7 @@ from mcp.db.session import Base
 class ReviewStatus(enum.Enum):
     pending = "pending"
     processing = "processing"
+    scored = "scored"  # evaluation stored, reasoning and feedback pending (LLM_TWO_PHASE_MODE)
     processed = "processed"
     failed = "failed"
     finalized = "finalized"
@@ -20,6 +21,41 @@ class Review(Base):
 
     review = Column(Text, nullable=False)
 
+    # tenant key for fair scheduling of LLM work (see services/review_queue.py)
+    course_name = Column(Text, nullable=True)
+    assignment_name = Column(Text, nullable=True)
+
+    # set when admission control could not queue the review; the backlog feeder
+    # clears it when it hands the review to the queue (see services/backlog.py)
+    deferred_at = Column(DateTime(timezone=True), nullable=True)
+    deferred_priority = Column(Integer, nullable=True)
+
+    # sub of the client whose request asked for the review's LLM work, charged for the calls
+    # made when it runs outside that request: deferred, in a worker or retried (core/rate_limit.py)
+    quota_subject = Column(Text, nullable=True)
+
+    # instance id of the process that last queued or started the review; the orphan sweep
+    # only re-defers it once that process stops heartbeating (see services/heartbeat.py)
+    owner_instance_id = Column(Text, nullable=True)
+
+    # OpenTelemetry trace id of the latest processing run (see core/tracing.py)
+    trace_id = Column(Text, nullable=True, index=True)
+
+    # estimated tokens of `review` and, if it had to be cut to REVIEW_INPUT_TOKEN_BUDGET,
+    # a JSON list of what was cut (see services/token_budget.py)
+    input_tokens = Column(Integer, nullable=True)
+    input_truncation = Column(Text, nullable=True)
+
+    # links the rounds of one reviewer/reviewee pair (see services/incremental.py)
+    reviewer_id = Column(Text, nullable=True)
+    reviewee_id = Column(Text, nullable=True)
+    review_round = Column(Integer, nullable=True)
+    previous_review_id = Column(Integer, ForeignKey("reviews_table.id", ondelete="SET NULL"), nullable=True)
+
+    # set when a near-duplicate of an evaluated review was found (see services/dedup.py)
+    duplicate_of_review_id = Column(Integer, ForeignKey("reviews_table.id", ondelete="SET NULL"), nullable=True)
+    duplicate_similarity = Column(Float, nullable=True)
+
     llm_generated_feedback = Column(Text, nullable=True)
     llm_generated_score = Column(Text, nullable=True)  
     llm_details_reasoning = Column(Text, nullable=True)
@@ -35,6 +71,13 @@ class Review(Base):
 
     __table_args__ = (
         UniqueConstraint("response_id_of_expertiza", name="uq_response_id_of_expertiza"), 
+        Index(
+            "ix_reviews_table_deferred",
+            "deferred_priority",
+            "deferred_at",
+            postgresql_where=text("deferred_at IS NOT NULL"),
+        ),
+        Index("ix_reviews_table_rounds", "assignment_name", "reviewer_id", "reviewee_id", "review_round"),
     )
 
 class FailedJob(Base):
@@ -45,6 +88,122 @@ class FailedJob(Base):
     error_message = Column(Text, nullable=True)
     attempts = Column(Integer, nullable=False, default=0)
     last_attempt_at = Column(DateTime(timezone=True), nullable=True)
+    # when the retry scheduler should pick the job up again (NULL once dead-lettered)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    # set once attempts reach FAILED_JOB_MAX_ATTEMPTS; only an admin requeue clears it
+    dead_lettered_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     review = relationship("Review", backref="failed_jobs")
+
+    __table_args__ = (
+        UniqueConstraint("reviews_id_from_review_table", name="uq_failed_jobs_review_id"),
+    )
+
+
+class LLMFailureArtifact(Base):
+    """Raw LLM output that failed parsing/validation, kept for debugging (services/failure_artifacts.py)."""
+    __tablename__ = "llm_failure_artifacts"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    # NULL for interactive /api/review/llmreview calls, which have no review row
+    reviews_id_from_review_table = Column(Integer, ForeignKey("reviews_table.id", ondelete="CASCADE"), nullable=True, index=True)
+    attempt = Column(Integer, nullable=False)  # attempt number within evaluate_and_parse
+    stage = Column(Text, nullable=False)  # empty | parse | repair | validation
+    error_message = Column(Text, nullable=True)
+    raw_output = Column(Text, nullable=True)  # truncated to FAILURE_ARTIFACT_MAX_CHARS
+    raw_chars = Column(Integer, nullable=False, default=0)  # length before truncation
+    trace_id = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+
+class RateLimitBucket(Base):
+    """Shared token-bucket state per client (RATE_LIMIT_BACKEND="postgres", core/rate_limit.py)."""
+    __tablename__ = "rate_limit_buckets"
+
+    subject = Column(Text, primary_key=True)  # the token's sub claim
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class LLMQuotaUsage(Base):
+    """LLM provider calls per client per UTC day (RATE_LIMIT_BACKEND="postgres")."""
+    __tablename__ = "llm_quota_usage"
+
+    subject = Column(Text, primary_key=True)
+    day = Column(Date, primary_key=True)
+    calls = Column(Integer, nullable=False, default=0)
+
+
+class ProcessHeartbeat(Base):
+    """Liveness of each API/worker process, refreshed by services/heartbeat.py."""
+    __tablename__ = "process_heartbeats"
+
+    instance_id = Column(Text, primary_key=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    heartbeat_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ReviewFingerprint(Base):
+    """SimHash of a review's normalized text, banded for LSH lookups (services/dedup.py)."""
+    __tablename__ = "review_fingerprints"
+
+    review_id = Column(Integer, ForeignKey("reviews_table.id", ondelete="CASCADE"), primary_key=True)
+    course_name = Column(Text, nullable=True)
+    assignment_name = Column(Text, nullable=True)
+    review_round = Column(Integer, nullable=True)
+    simhash = Column(BigInteger, nullable=False)  # 64-bit hash stored signed
+    band0 = Column(Integer, nullable=False)
+    band1 = Column(Integer, nullable=False)
+    band2 = Column(Integer, nullable=False)
+    band3 = Column(Integer, nullable=False)
+    band4 = Column(Integer, nullable=False)
+    band5 = Column(Integer, nullable=False)
+    band6 = Column(Integer, nullable=False)
+    band7 = Column(Integer, nullable=False)
+
+    __table_args__ = tuple(
+        Index(f"ix_review_fingerprints_band{i}", "assignment_name", f"band{i}") for i in range(8)
+    )
+
+
+class SchemaVersion(Base):
+    """Fingerprint of the schema last applied (db/session.py ensure_schema); a single row."""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True, default=1)
+    fingerprint = Column(Text, nullable=False)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# Idempotent DDL applied after create_all() so databases created by older
+# versions pick up new columns/indexes. Append only; never edit existing entries.
+SCHEMA_PATCHES = [
+    "ALTER TABLE failed_jobs ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ",
+    "ALTER TABLE failed_jobs ADD COLUMN IF NOT EXISTS dead_lettered_at TIMESTAMPTZ",
+    "CREATE INDEX IF NOT EXISTS ix_failed_jobs_next_attempt_at ON failed_jobs (next_attempt_at)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_failed_jobs_review_id ON failed_jobs (reviews_id_from_review_table)",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS course_name TEXT",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS assignment_name TEXT",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS deferred_at TIMESTAMPTZ",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS deferred_priority INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_reviews_table_deferred ON reviews_table (deferred_priority, deferred_at) "
+    "WHERE deferred_at IS NOT NULL",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS trace_id TEXT",
+    "CREATE INDEX IF NOT EXISTS ix_reviews_table_trace_id ON reviews_table (trace_id)",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS input_tokens INTEGER",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS input_truncation TEXT",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS reviewer_id TEXT",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS reviewee_id TEXT",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS review_round INTEGER",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS previous_review_id INTEGER "
+    "REFERENCES reviews_table (id) ON DELETE SET NULL",
+    "CREATE INDEX IF NOT EXISTS ix_reviews_table_rounds "
+    "ON reviews_table (assignment_name, reviewer_id, reviewee_id, review_round)",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS duplicate_of_review_id INTEGER "
+    "REFERENCES reviews_table (id) ON DELETE SET NULL",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS duplicate_similarity DOUBLE PRECISION",
+    "ALTER TYPE review_status ADD VALUE IF NOT EXISTS 'scored' AFTER 'processing'",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS quota_subject TEXT",
+    "ALTER TABLE reviews_table ADD COLUMN IF NOT EXISTS owner_instance_id TEXT",
+]
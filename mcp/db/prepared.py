@@ -0,0 +1,129 @@
+# mcp/db/prepared.py
+"""
+Fast path for the hot crud statements. A PreparedQuery is written like any text() statement
+(":name" binds) and translated once to asyncpg's "$n" form; it then runs directly on the
+session's asyncpg connection (AsyncConnection.get_raw_connection().driver_connection)
+through asyncpg's prepared-statement cache (DB_PREPARED_STATEMENT_CACHE_SIZE). That skips
+SQLAlchemy's compile/execute/result layers, half or more of the time of a primary-key
+lookup (mcp/test/db_benchmark.py).
+
+SQLAlchemy opens the database transaction lazily, on a session's first statement, and has
+no public way to open it without running one. So a statement takes the fast path when
+that transaction is already open (it joins it) or when it is a plain SELECT (on its own
+it reads the same rows); a write that would be the first statement goes through text(),
+which opens the transaction, so it still commits or rolls back with the session's work.
+Like the session itself, the connection must not be used by two tasks at once.
+
+Errors are raised as the sqlalchemy.exc classes the text() path raises for them, and a span
+per statement is recorded as session.py does for SQLAlchemy statements. With
+DB_PREPARED_FAST_PATH off every statement goes through db.execute(text(...)) unchanged.
+"""
+import re
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import asyncpg
+from opentelemetry import trace
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from mcp.core.tracing import tracer
+import mcp.config as config
+
+# ":name" but not the second half of a "::type" cast
+_BIND = re.compile(r"(?<![:\w]):(\w+)")
+# row locks only hold inside a transaction
+_LOCKING = re.compile(r"\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b", re.IGNORECASE)
+
+# asyncpg error -> the sqlalchemy.exc class SQLAlchemy's asyncpg dialect raises for it
+_ERRORS = (
+    (asyncpg.IntegrityConstraintViolationError, exc.IntegrityError),
+    (asyncpg.SyntaxOrAccessError, exc.ProgrammingError),
+    (asyncpg.InternalServerError, exc.InternalError),
+    (asyncpg.PostgresError, exc.DBAPIError),
+    (asyncpg.InterfaceError, exc.InterfaceError),
+)
+
+
+class PreparedQuery:
+    """One SQL statement with named binds, runnable on the fast path or through SQLAlchemy."""
+
+    def __init__(self, sql: str):
+        names: List[str] = []
+
+        def number(match: "re.Match[str]") -> str:
+            if match.group(1) not in names:
+                names.append(match.group(1))
+            return f"${names.index(match.group(1)) + 1}"
+
+        self.text = text(sql)
+        self.sql = _BIND.sub(number, sql)
+        self.names: Tuple[str, ...] = tuple(names)
+        self.operation = sql.lstrip().split(None, 1)[0].lower()
+        # may run outside the session's transaction (see the module docstring)
+        self.read_only = self.operation == "select" and not _LOCKING.search(sql)
+        self._statement = " ".join(sql.split())[:1000]
+
+    def args(self, params: Dict[str, Any]) -> List[Any]:
+        """The positional arguments for self.sql."""
+        return [params[name] for name in self.names]
+
+    async def fetch(self, db: AsyncSession, params: Dict[str, Any]) -> List[Mapping[str, Any]]:
+        driver = await self._driver_connection(db)
+        if driver is None:
+            return list((await db.execute(self.text, params)).mappings().all())
+        return await self._run(driver, params, "fetch")
+
+    async def fetchrow(self, db: AsyncSession, params: Dict[str, Any]) -> Optional[Mapping[str, Any]]:
+        driver = await self._driver_connection(db)
+        if driver is None:
+            return (await db.execute(self.text, params)).mappings().first()
+        return await self._run(driver, params, "fetchrow")
+
+    async def fetchval(self, db: AsyncSession, params: Dict[str, Any]) -> Any:
+        driver = await self._driver_connection(db)
+        if driver is None:
+            return (await db.execute(self.text, params)).scalar()
+        return await self._run(driver, params, "fetchval")
+
+    async def execute(self, db: AsyncSession, params: Dict[str, Any]) -> None:
+        driver = await self._driver_connection(db)
+        if driver is None:
+            await db.execute(self.text, params)
+            return
+        await self._run(driver, params, "execute")
+
+    async def _driver_connection(self, db: AsyncSession) -> Optional[asyncpg.Connection]:
+        """The session's asyncpg connection if this statement may run on it, else None (use text())."""
+        if not config.DB_PREPARED_FAST_PATH:
+            return None
+        # the session's connection, so the statement joins its transaction
+        raw = await (await db.connection()).get_raw_connection()
+        driver = raw.driver_connection
+        if not isinstance(driver, asyncpg.Connection):
+            return None
+        if not self.read_only and not driver.is_in_transaction():
+            return None
+        return driver
+
+    async def _run(self, driver: asyncpg.Connection, params: Dict[str, Any], method: str) -> Any:
+        args = self.args(params)
+        span = None
+        if trace.get_current_span().get_span_context().is_valid:
+            span = tracer.start_span(
+                f"db.{self.operation}",
+                kind=trace.SpanKind.CLIENT,
+                attributes={"db.system": "postgresql", "db.statement": self._statement},
+            )
+        try:
+            return await getattr(driver, method)(self.sql, *args)
+        except Exception as error:
+            if span is not None:
+                span.record_exception(error)
+                span.set_status(trace.Status(trace.StatusCode.ERROR))
+            for driver_error, sqlalchemy_error in _ERRORS:
+                if isinstance(error, driver_error):
+                    raise sqlalchemy_error(self.sql, args, error) from error
+            raise
+        finally:
+            if span is not None:
+                span.end()
@@ -0,0 +1,88 @@
+# mcp/routes/admin.py
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from mcp.schemas import FailedJobResponse, FailureArtifactResponse, RequeueFailedJobs
+from mcp.db.crud import (
+    list_failed_jobs,
+    requeue_failed_jobs,
+    count_deferred_reviews,
+    list_failure_artifacts,
+    get_failure_artifact,
+)
+from mcp.core.auth import require_admin, verify_jwt
+from mcp.routes.reviews import get_db, get_read_db
+from mcp.services.review_queue import Priority, get_review_queue
+
+# every admin route (failed jobs, raw LLM failure artifacts, queue stats) needs an admin token
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/failed-jobs", response_model=List[FailedJobResponse])
+async def get_failed_jobs(
+    dead_letter: Optional[bool] = Query(None, description="true: dead-lettered only, false: still retrying"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    user=Depends(verify_jwt),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Inspect failed background LLM jobs, newest failure first.
+    """
+    rows = await list_failed_jobs(db, dead_letter=dead_letter, limit=limit, offset=offset)
+    return [FailedJobResponse(**row) for row in rows]
+
+
+@router.post("/failed-jobs/requeue")
+async def requeue_dead_letter_jobs(
+    payload: RequeueFailedJobs,
+    user=Depends(verify_jwt),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Requeue dead-lettered jobs in bulk with a fresh attempt budget.
+    The retry scheduler picks them up on its next poll.
+    """
+    requeued = await requeue_failed_jobs(db, payload.failed_job_ids)
+    return {"requeued": len(requeued), "failed_job_ids": requeued}
+
+
+@router.get("/failure-artifacts", response_model=List[FailureArtifactResponse])
+async def get_failure_artifacts(
+    review_id: Optional[int] = Query(None, description="only artifacts for this reviews_table id"),
+    limit: int = Query(50, ge=1, le=500),
+    user=Depends(verify_jwt),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    List stored LLM outputs that failed parsing/validation, newest first (without the raw text).
+    """
+    rows = await list_failure_artifacts(db, review_id=review_id, limit=limit)
+    return [FailureArtifactResponse(**row) for row in rows]
+
+
+@router.get("/failure-artifacts/{artifact_id}", response_model=FailureArtifactResponse)
+async def get_failure_artifact_by_id(artifact_id: int, user=Depends(verify_jwt), db: AsyncSession = Depends(get_read_db)):
+    """
+    Fetch one stored failure artifact including the raw LLM output.
+    """
+    row = await get_failure_artifact(db, artifact_id)
+    if not row:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Failure artifact not found")
+    return FailureArtifactResponse(**row)
+
+
+@router.get("/queue")
+async def get_queue_stats(user=Depends(verify_jwt), db: AsyncSession = Depends(get_read_db)):
+    """
+    Snapshot of the in-process LLM work queue for dashboards and autoscaling: admission
+    limits, in-flight and queued jobs per priority class and tenant, queue wait time per
+    class, and the number of reviews deferred in the database by admission control.
+    """
+    stats = get_review_queue().stats()
+    deferred = await count_deferred_reviews(db)
+    stats["deferred"] = {
+        Priority(p).name if p is not None else "unknown": n for p, n in deferred.items()
+    }
+    stats["deferred_total"] = sum(deferred.values())
+    return stats
@@ -1,34 +1,53 @@
 # routes/review_routes.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
 from typing import Optional
 import logging
-from mcp.services.llm_service import LLMService 
+from mcp.core.deadline import ClientDisconnected, Deadline, DeadlineExceeded, run_until_disconnected
+from mcp.core.metrics import LLM_DEADLINE_OUTCOMES
+from mcp.services.llm_service import LLMService, get_llm_service
+from mcp.services.review_queue import Priority, QueueClosed, QueueFull, get_review_queue
 from mcp.schemas import ReviewRequest
+import mcp.config as config
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-_llm_service_instance: Optional[LLMService] = None
-
-def get_llm_service() -> LLMService:
-    """Return a single shared LLMService instance."""
-    global _llm_service_instance
-    if _llm_service_instance is None:
-        _llm_service_instance = LLMService()  # internally creates an LLMClient
-    return _llm_service_instance
-
-
 @router.post("/llmreview", status_code=200)
-async def llmservice_endpoint(request: ReviewRequest, svc: LLMService = Depends(get_llm_service)):
+async def llmservice_endpoint(
+    request: ReviewRequest,
+    http_request: Request,
+    timeout: Optional[float] = Query(None, gt=0, description="time budget in seconds"),
+    x_request_timeout: Optional[float] = Header(None, gt=0, description="time budget in seconds"),
+    svc: LLMService = Depends(get_llm_service),
+):
     """
     POST /llmreview
     Calls svc.evaluate_and_parse(review_text=...) and returns validated JSON.
+    Runs through the shared ReviewQueue in the interactive class, ahead of background work.
+    max_attempts is capped at LLM_MAX_ATTEMPTS_PER_REQUEST; every attempt is an LLM call.
+    The whole call, queue wait included, must finish within the client's budget
+    (X-Request-Timeout header or ?timeout=, default LLM_REQUEST_DEFAULT_TIMEOUT, capped at
+    LLM_REQUEST_MAX_TIMEOUT) or it is abandoned with 504; if the client disconnects
+    first, the LLM work is cancelled.
     """
+    max_attempts = max(1, min(request.max_attempts or config.LLM_MAX_ATTEMPTS_PER_REQUEST,
+                              config.LLM_MAX_ATTEMPTS_PER_REQUEST))
+    budget = min(x_request_timeout or timeout or config.LLM_REQUEST_DEFAULT_TIMEOUT, config.LLM_REQUEST_MAX_TIMEOUT)
+    deadline = Deadline.after(budget)
     try:
-        validated = await svc.evaluate_and_parse(
-            review_text=request.review_text,
-            temperature=request.temperature or 0.0,
-            max_attempts=request.max_attempts or 10,
+        validated = await run_until_disconnected(
+            http_request,
+            get_review_queue().run(
+                lambda: svc.evaluate_and_parse(
+                    review_text=request.review_text,
+                    temperature=request.temperature or 0.0,
+                    max_attempts=max_attempts,
+                    deadline=deadline,
+                ),
+                Priority.interactive,
+                tenant="interactive",
+            ),
+            deadline,
         )
 
         # Handle both Pydantic v1/v2 output
@@ -38,6 +57,27 @@ async def llmservice_endpoint(request: ReviewRequest, svc: LLMService = Depends(
             return validated.dict()
         return validated
 
+    except ClientDisconnected:
+        # nobody is listening any more: no response is sent, PrometheusMiddleware records 499
+        LLM_DEADLINE_OUTCOMES.labels("disconnected").inc()
+        logger.info("Client disconnected; cancelled /llmreview work (499)")
+        raise
+    except DeadlineExceeded as exc:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(exc))
+    except QueueFull as exc:
+        # too many interactive calls already waiting; tell the client when to come back
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    except QueueClosed as exc:
+        # this replica is draining for shutdown; another one can take the call
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(exc),
+            headers={"Retry-After": "1"},
+        )
     except Exception as exc:
         msg = str(exc)
         logger.exception("LLM evaluate_and_parse failed: %s", msg)
@@ -0,0 +1,20 @@
+# mcp/routes/metrics.py
+import logging
+from fastapi import APIRouter, Response
+from mcp.core.metrics import CONTENT_TYPE_LATEST, refresh_review_status_counts, render_latest
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus scrape endpoint. Review counts per status come from a cached DB query;
+    if the DB is unavailable the last known values are served.
+    """
+    try:
+        await refresh_review_status_counts()
+    except Exception:
+        logger.warning("Could not refresh reviews_by_status", exc_info=True)
+    return Response(render_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,12 +1,22 @@
 # app/routes/reviews.py
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException, status
+import asyncio
+from typing import Any, Dict
+from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from mcp.schemas import ReviewPayload, ReviewResponse, FinalizeReview
-from mcp.db.session import AsyncSessionLocal
-from mcp.db.crud import get_review_by_response_id, insert_review_received, get_review_by_id, finalize_review_by_id, finalize_review_by_response_id
-from mcp.services.utils import schedule_process_review  
+from mcp.db.session import AsyncSessionLocal, read_sessionmaker, reads_from_replica
+from mcp.db.crud import REVIEW_RESPONSE_COLUMNS, get_review_by_response_id, insert_review_received, get_review_by_id, finalize_review_by_id, finalize_review_by_response_id, store_review_output
+from mcp.services.utils import request_review_details, schedule_process_review
 from mcp.core.auth import verify_jwt  
-from mcp.services.utils import build_review_text
+from mcp.services.token_budget import fit_review
+from mcp.services.incremental import plan_round
+from mcp.services.dedup import check_duplicate
+from mcp.services.orchestrator import serialize_llm_output
+from mcp.services.review_queue import Priority, QueueClosed, QueueFull
+from mcp.services.heartbeat import instance_id
+from mcp.core.rate_limit import current_quota_subject
+from mcp.core.tracing import current_trace_id, current_traceparent, tracer
+import mcp.config as config
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
@@ -15,7 +25,25 @@ async def get_db() -> AsyncSession:
         yield session
 
 
+async def get_read_db() -> AsyncSession:
+    """Session for read-only endpoints: the replica while it is within DB_REPLICA_MAX_LAG, else the primary."""
+    async with (await read_sessionmaker())() as session:
+        yield session
+
+
+def review_response(row: Dict[str, Any], status_code: int = status.HTTP_200_OK) -> Response:
+    """
+    A reviews_table row (REVIEW_RESPONSE_COLUMNS) as a ReviewResponse body, serialized by
+    pydantic's compiled serializer without validating it: the row comes from our own columns,
+    and returning a Response keeps FastAPI from validating it again (response_model is for
+    the docs). The stored JSON columns are passed through as the strings they are.
+    """
+    model = ReviewResponse.model_construct(**{k: v for k, v in row.items() if k in ReviewResponse.model_fields})
+    return Response(model.model_dump_json(), status_code=status_code, media_type="application/json")
+
+
 @router.post("", response_model=ReviewResponse, status_code=status.HTTP_201_CREATED)
+@tracer.start_as_current_span("create_review")
 async def create_review(
     payload: ReviewPayload,
     background_tasks: BackgroundTasks,
@@ -29,27 +57,102 @@ async def create_review(
     if not (payload.additional_comment or payload.scores):
         raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Review content cannot be empty")
 
-    # Convert structured payload into single LLM-facing text
-    review_text = build_review_text(payload)
-
-    # Insert (idempotency handled inside insert helper)
-    inserted = await insert_review_received(db, payload.response_id_of_expertiza, review_text)
+    # later rounds are evaluated against the stored previous round where possible
+    plan = await plan_round(db, payload)
+
+    # Convert structured payload into single LLM-facing text, cut to REVIEW_INPUT_TOKEN_BUDGET
+    review_text, input_tokens, cuts = fit_review(plan.payload, extra=plan.extra)
+
+    # Idempotent: a re-POST gets the existing row, whose stored output is never replaced here
+    inserted = await get_review_by_response_id(db, payload.response_id_of_expertiza, REVIEW_RESPONSE_COLUMNS)
+    created = inserted is None
+    if created:
+        inserted = await insert_review_received(
+            db,
+            payload.response_id_of_expertiza,
+            review_text,
+            idempotent=False,
+            course_name=payload.course_name,
+            assignment_name=payload.assignment_name,
+            trace_id=current_trace_id(),
+            input_tokens=input_tokens,
+            input_truncation=cuts,
+            reviewer_id=str(payload.reviewer_id) if payload.reviewer_id is not None else None,
+            reviewee_id=str(payload.reviewee_id) if payload.reviewee_id is not None else None,
+            review_round=payload.round,
+            previous_review_id=plan.previous_review_id,
+            quota_subject=current_quota_subject(),
+            owner=instance_id(),
+        )
     if not inserted:
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, "Failed to insert review")
 
+    # an unchanged later round or a near-duplicate of an evaluated review needs no LLM call
+    reused_output = plan.reused_output if created else None
+    if created:
+        duplicate = await check_duplicate(db, payload, inserted["id"])
+        if duplicate is not None:
+            inserted.update(duplicate_of_review_id=duplicate.review_id, duplicate_similarity=duplicate.similarity)
+            if reused_output is None:
+                reused_output = duplicate.output
+    if reused_output is not None:
+        await store_review_output(db, inserted["id"], *serialize_llm_output(reused_output))
+    await db.commit()
+    if reused_output is not None:
+        return review_response(await get_review_by_id(db, inserted["id"], REVIEW_RESPONSE_COLUMNS), status.HTTP_201_CREATED)
+
     # schedule background LLM work — pass review_text (not payload.review)
-    background_tasks.add_task(schedule_process_review, inserted["id"], review_text)
+    background_tasks.add_task(
+        schedule_process_review,
+        inserted["id"],
+        review_text,
+        priority=Priority.fresh,
+        course_name=payload.course_name,
+        assignment_name=payload.assignment_name,
+        traceparent=current_traceparent(),
+    )
 
-    return ReviewResponse(**inserted)
+    return review_response(inserted, status.HTTP_201_CREATED)
 
 
 
 @router.get("/{expertiza_resonse_id}", response_model=ReviewResponse)
-async def get_review(expertiza_resonse_id: int, user=Depends(verify_jwt), db: AsyncSession = Depends(get_db)):
-    rec = await get_review_by_response_id(db, expertiza_resonse_id)
+async def get_review(
+    expertiza_resonse_id: int,
+    details: bool = Query(False, description="complete a 'scored' review's reasoning and feedback first"),
+    user=Depends(verify_jwt),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    With ?details=true, a review whose scores are stored but whose reasoning and feedback are
+    not yet (status 'scored', LLM_TWO_PHASE_MODE) gets them generated in the interactive
+    class first. If that takes longer than LLM_REQUEST_DEFAULT_TIMEOUT the review is returned
+    as it is, still 'scored', and the work carries on for a later GET.
+    Read from the replica when one is configured; a review it does not have yet (just
+    created) and the review completed here are read from the primary.
+    """
+    rec = await get_review_by_response_id(db, expertiza_resonse_id, REVIEW_RESPONSE_COLUMNS)
+    if not rec and reads_from_replica(db):
+        async with AsyncSessionLocal() as primary:
+            rec = await get_review_by_response_id(primary, expertiza_resonse_id, REVIEW_RESPONSE_COLUMNS)
     if not rec:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Review not found")
-    return ReviewResponse(**rec)
+    if details and getattr(rec["status"], "value", rec["status"]) == "scored":
+        await db.rollback()  # do not hold a pooled connection while the LLM works
+        try:
+            # the review text is loaded by the job itself
+            job = request_review_details(rec["id"], None, Priority.interactive)
+            # shielded: the job may be shared with other requests for this review
+            await asyncio.wait_for(asyncio.shield(job), config.LLM_REQUEST_DEFAULT_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        except QueueFull as exc:
+            raise HTTPException(status.HTTP_429_TOO_MANY_REQUESTS, str(exc), headers={"Retry-After": str(exc.retry_after)})
+        except QueueClosed as exc:
+            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, str(exc), headers={"Retry-After": "1"})
+        async with AsyncSessionLocal() as primary:
+            rec = await get_review_by_response_id(primary, expertiza_resonse_id, REVIEW_RESPONSE_COLUMNS)
+    return review_response(rec)
 
 
 @router.post("/{response_id_of_expertiza}/accept", response_model=ReviewResponse)
@@ -61,10 +164,11 @@ async def accept_review(response_id_of_expertiza: int, payload: FinalizeReview,
     updated = await finalize_review_by_response_id(db, response_id_of_expertiza, payload.finalized_score, payload.finalized_feedback)
     if not updated:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Review not found")
-    return ReviewResponse(**updated)
+    return review_response(updated)
 
 
 @router.post("/{review_id}/trigger", status_code=status.HTTP_202_ACCEPTED)
+@tracer.start_as_current_span("trigger_llm_job")
 async def trigger_llm_job(
     review_id: int,
     background_tasks: BackgroundTasks,
@@ -79,8 +183,16 @@ async def trigger_llm_job(
     if not review:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Review not found")
 
-    # Schedule background LLM job (uses same helper as /POST /v1/reviews)
-    background_tasks.add_task(schedule_process_review, review_id, review["review"])
+    # Schedule background LLM job (uses same helper as /POST /v1/reviews) behind fresh submissions
+    background_tasks.add_task(
+        schedule_process_review,
+        review_id,
+        review["review"],
+        priority=Priority.reprocess,
+        course_name=review.get("course_name"),
+        assignment_name=review.get("assignment_name"),
+        traceparent=current_traceparent(),
+    )
 
     return {
         "message": f"Triggered LLM processing for review {review_id}",
@@ -1,9 +1,33 @@
 import json
-from pydantic import BaseModel, Field, conint, field_validator
-from typing import Optional, Union, List
+from datetime import datetime
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, conint, field_validator
+from typing import Any, Optional, Union, List
+from typing_extensions import Annotated
 
-# Accept ints, floats, strings, or None for scores
-RubricKey = Optional[Union[int, float, str]]
+_NULL_LIKE = {"", "NONE", "NULL"}
+_NULL_LIKE_MAX_CHARS = 16  # "null" with some padding
+
+
+def _null_like_to_none(value: Any) -> Any:
+    """Model output: "", "null" and "None" (any case, surrounding spaces ignored) mean no value."""
+    # length check first: most values are long text that cannot be null-like
+    if isinstance(value, str) and len(value) <= _NULL_LIKE_MAX_CHARS and value.strip().upper() in _NULL_LIKE:
+        return None
+    return value
+
+
+# Accept ints, floats, strings, or None for scores. Tried left to right, so numeric strings
+# the model sometimes writes ("7", "7.5") become numbers and "N/A" stays a string.
+RubricKey = Annotated[
+    Optional[Union[int, float, str]], Field(union_mode="left_to_right"), BeforeValidator(_null_like_to_none)
+]
+# free text written by the model; null-like strings become None
+LLMText = Annotated[Optional[str], BeforeValidator(_null_like_to_none)]
+
+# shared by the models the LLM output is validated against: accept rubric labels ("Acted On")
+# and field names ("Acted_On", as stored), strip whitespace from strings, and keep "nan" or
+# "inf" scores as strings rather than floats
+_LLM_OUTPUT_CONFIG = ConfigDict(populate_by_name=True, str_strip_whitespace=True, allow_inf_nan=False)
 
 class ScoreItem(BaseModel):
     question: str = Field(..., description="Question identifier or label")
@@ -19,6 +43,8 @@ class ReviewPayload(BaseModel):
     scores: Optional[List[ScoreItem]] = Field(None, description="List of scores with questions and comments")
     additional_comment: Optional[str] = Field(None, description="Additional comments about the review")
     round:Optional[int]=Field(None,description="Round number of the review")
+    reviewer_id: Optional[Union[int, str]] = Field(None, description="Expertiza reviewer (participant) id; links rounds")
+    reviewee_id: Optional[Union[int, str]] = Field(None, description="Expertiza reviewee (team) id; links rounds")
     previous_round_review: Optional[Union[str, dict, list]] = Field(
         None,
         alias="previousRoundReview",
@@ -31,28 +57,27 @@ class FinalizeReview(BaseModel):
     finalized_score: Optional[Union[str, dict, float]] = None  # Can accept JSON (str/dict) or float
 
 class Reasoning(BaseModel):
-    Praise: Optional[str] = None
-    Problems_and_Solutions: Optional[str] = Field(None, alias="Problems & Solutions")
-    Tone: Optional[str] = None
-    Localization: Optional[str] = None
-    Helpfulness: Optional[str] = None
-    Explanation: Optional[str] = None
-    Acted_On: Optional[str] = Field(None, alias="Acted On")
-    Relevance: Optional[str] = None
-    Consistency: Optional[str] = None
-    Actionability: Optional[str] = None
-    Factuality: Optional[str] = None
-    Accessibility: Optional[str] = None
-    Comprehensiveness: Optional[str] = None
-
-    class Config:
-
-        allow_population_by_field_name = True
-        anystr_strip_whitespace = True
+    Praise: LLMText = None
+    Problems_and_Solutions: LLMText = Field(None, alias="Problems & Solutions")
+    Tone: LLMText = None
+    Localization: LLMText = None
+    Helpfulness: LLMText = None
+    Explanation: LLMText = None
+    Acted_On: LLMText = Field(None, alias="Acted On")
+    Relevance: LLMText = None
+    Consistency: LLMText = None
+    Actionability: LLMText = None
+    Factuality: LLMText = None
+    Accessibility: LLMText = None
+    Comprehensiveness: LLMText = None
+
+    model_config = _LLM_OUTPUT_CONFIG
 
 class RubricEvaluation(BaseModel):
+    model_config = _LLM_OUTPUT_CONFIG
+
     score: RubricKey
-    justification: Optional[str] = None
+    justification: LLMText = None
 
 
 class Evaluation(BaseModel):
@@ -70,18 +95,14 @@ class Evaluation(BaseModel):
     Accessibility: RubricEvaluation
     Comprehensiveness: RubricEvaluation
 
-    class Config:
-        allow_population_by_field_name = True
-        anystr_strip_whitespace = True
+    model_config = _LLM_OUTPUT_CONFIG
 
 class ReviewLLMOutput(BaseModel):
     reasoning: Reasoning
     evaluation: Evaluation
-    feedback: Optional[str] = None
+    feedback: LLMText = None
 
-    class Config:
-        allow_population_by_field_name = True
-        anystr_strip_whitespace = True
+    model_config = _LLM_OUTPUT_CONFIG
 
 class ReviewResponse(BaseModel):
     id: int
@@ -92,12 +113,45 @@ class ReviewResponse(BaseModel):
     finalized_feedback: Optional[str] = None
     finalized_score: Optional[Union[str, dict, float]] = None  # Can accept JSON (str/dict) or float for backward compatibility
     status: str
+    trace_id: Optional[str] = None
+    input_tokens: Optional[int] = None
+    input_truncation: Optional[Union[str, list]] = None  # JSON list of cuts made to fit the token budget
+    previous_review_id: Optional[int] = None  # the same reviewer/reviewee's previous round
+    duplicate_of_review_id: Optional[int] = None  # near-duplicate of this evaluated review
+    duplicate_similarity: Optional[float] = None
 
-    class Config:
-        orm_mode = True
-        allow_population_by_field_name = True
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
 class ReviewRequest(BaseModel):
     review_text: str = Field(..., description="Raw review text to evaluate")
     temperature: Optional[float] = Field(0.0, description="LLM temperature")
     max_attempts: Optional[int] = Field(None, description="Override max attempts (optional)")
+
+class FailedJobResponse(BaseModel):
+    id: int
+    review_id: int
+    response_id_of_expertiza: int
+    review_status: str
+    error_message: Optional[str] = None
+    attempts: int
+    last_attempt_at: Optional[datetime] = None
+    next_attempt_at: Optional[datetime] = None
+    dead_lettered_at: Optional[datetime] = None
+    created_at: datetime
+    artifact_ids: List[int] = []
+
+class FailureArtifactResponse(BaseModel):
+    id: int
+    review_id: Optional[int] = None
+    attempt: int
+    stage: str
+    error_message: Optional[str] = None
+    raw_chars: int
+    trace_id: Optional[str] = None
+    created_at: datetime
+    raw_output: Optional[str] = None  # only returned when fetching a single artifact
+
+class RequeueFailedJobs(BaseModel):
+    failed_job_ids: Optional[List[int]] = Field(
+        None, description="failed_jobs ids to requeue; omit to requeue every dead-lettered job"
+    )
@@ -0,0 +1,91 @@
+# mcp/services/backlog.py
+import asyncio
+import logging
+from typing import Optional
+
+from mcp.db.session import AsyncSessionLocal
+from mcp.db.crud import claim_deferred_reviews
+from mcp.services.heartbeat import instance_id
+from mcp.services.review_queue import Priority, get_review_queue
+from mcp.services.utils import enqueue_review
+import mcp.config as config
+
+logger = logging.getLogger(__name__)
+
+
+class BacklogFeeder:
+    """
+    Background loop that moves deferred reviews (parked by admission control) from the
+    database into the ReviewQueue, claiming only as many as the queue has room for.
+    """
+
+    def __init__(self, poll_interval: float = config.LLM_BACKLOG_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def wake(self) -> None:
+        """Poll again right away instead of waiting for the next interval (e.g. on NOTIFY)."""
+        self._wakeup.set()
+
+    def start(self) -> None:
+        """Start the feeder loop on the running event loop (no-op if already running)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancel the feeder loop and wait for it to exit."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_once(self) -> int:
+        """Claim deferred reviews up to the queue's free room. Returns how many were scheduled."""
+        room = get_review_queue().room(Priority.fresh)
+        if room <= 0:
+            return 0
+        async with AsyncSessionLocal() as db:
+            reviews = await claim_deferred_reviews(db, room, instance_id())
+        for row in reviews:
+            # enqueue_review defers the row again if the queue filled up meanwhile
+            await enqueue_review(
+                row["id"],
+                row["review"],
+                priority=Priority(row["deferred_priority"] or Priority.fresh),
+                course_name=row["course_name"],
+                assignment_name=row["assignment_name"],
+                trace_id=row["trace_id"],
+            )
+        if reviews:
+            logger.info("Scheduled %d deferred reviews", len(reviews))
+        return len(reviews)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Deferred backlog poll failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+_backlog_feeder_instance: Optional[BacklogFeeder] = None
+
+
+def get_backlog_feeder() -> BacklogFeeder:
+    """Return the single shared BacklogFeeder instance."""
+    global _backlog_feeder_instance
+    if _backlog_feeder_instance is None:
+        _backlog_feeder_instance = BacklogFeeder()
+    return _backlog_feeder_instance
@@ -0,0 +1,145 @@
+# mcp/services/dedup.py
+"""
+Near-duplicate review detection (DEDUP_MODE, DEDUP_SIMILARITY_THRESHOLD).
+
+Every new review gets a 64-bit SimHash of its normalized current-round content (points,
+comments and additional comment; not the rubric questions, which every review of an
+assignment shares, nor the course, round or previous round). It is stored in
+review_fingerprints split into eight 8-bit bands. Two hashes within 7 differing bits must
+share at least one band, so an indexed band lookup finds every candidate for thresholds
+of 57/64 (~0.89) and up; lower thresholds still work but may miss some matches.
+Candidates are compared by Hamming distance: similarity = 1 - distance / 64. Changing
+one word in a 20-word comment typically costs 6-9 bits, so the default 0.9 catches
+copies that differ in case, punctuation or a word or two.
+
+When a new review is that similar to an already evaluated review of the same assignment
+and round, the match and similarity are recorded on the row (duplicate_of_review_id,
+duplicate_similarity); with DEDUP_MODE="reuse" (opt-in) its evaluation is copied instead
+of calling the LLM. Later-round reviews are only flagged, since their "Acted On" depends on
+the reviewer's own previous round.
+"""
+import hashlib
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from mcp.core.metrics import REVIEW_DUPLICATES
+from mcp.db.crud import find_fingerprint_candidates, insert_review_fingerprint, mark_review_duplicate
+from mcp.schemas import ReviewPayload
+import mcp.config as config
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+BANDS = 8
+_BAND_BITS = HASH_BITS // BANDS
+_SHINGLE_WORDS = 2
+_WORD = re.compile(r"\w+")
+
+
+def normalized_text(payload: ReviewPayload) -> str:
+    """The current-round answers of a review, lowercased, without punctuation or extra spaces."""
+    parts: List[str] = []
+    for i, s in enumerate(payload.scores or [], start=1):
+        parts.extend([f"q{i} {s.awarded_points}", s.comments or ""])
+    parts.append(payload.additional_comment or "")
+    return " ".join(_WORD.findall(" ".join(parts).lower()))
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over the distinct word 2-shingles of `text`."""
+    words = text.split()
+    if len(words) >= _SHINGLE_WORDS:
+        shingles = {" ".join(words[i:i + _SHINGLE_WORDS]) for i in range(len(words) - _SHINGLE_WORDS + 1)}
+    else:
+        shingles = {" ".join(words)}
+    weights = [0] * HASH_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+        for bit in range(HASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(HASH_BITS) if weights[bit] > 0)
+
+
+def bands(value: int) -> List[int]:
+    mask = (1 << _BAND_BITS) - 1
+    return [value >> (i * _BAND_BITS) & mask for i in range(BANDS)]
+
+
+def similarity(a: int, b: int) -> float:
+    return 1.0 - bin(a ^ b).count("1") / HASH_BITS
+
+
+def to_signed(value: int) -> int:
+    # stored in a BIGINT column
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+@dataclass
+class DuplicateMatch:
+    review_id: int
+    similarity: float
+    row: Dict[str, Any]
+    output: Optional[Dict[str, Any]] = None  # the evaluation to reuse, if it may be reused
+
+
+class ReviewFingerprint:
+    def __init__(self, payload: ReviewPayload):
+        self.course_name = payload.course_name
+        self.assignment_name = payload.assignment_name
+        self.review_round = payload.round
+        self.value = simhash(normalized_text(payload))
+
+    async def find_duplicate(self, db: AsyncSession, exclude_review_id: Optional[int] = None) -> Optional[DuplicateMatch]:
+        """The most similar already-evaluated review at or above the threshold, if any."""
+        candidates = await find_fingerprint_candidates(
+            db, self.course_name, self.assignment_name, self.review_round, bands(self.value)
+        )
+        best: Optional[DuplicateMatch] = None
+        for row in candidates:
+            if row["id"] == exclude_review_id:
+                continue
+            score = similarity(self.value, to_unsigned(row["simhash"]))
+            if score >= config.DEDUP_SIMILARITY_THRESHOLD and (best is None or score > best.similarity):
+                best = DuplicateMatch(row["id"], score, row)
+        return best
+
+    async def store(self, db: AsyncSession, review_id: int) -> None:
+        """Add the review to the index. Does not commit."""
+        await insert_review_fingerprint(
+            db, review_id, self.course_name, self.assignment_name, self.review_round,
+            to_signed(self.value), bands(self.value),
+        )
+
+
+async def check_duplicate(db: AsyncSession, payload: ReviewPayload, review_id: int) -> Optional[DuplicateMatch]:
+    """
+    Index a newly inserted review and look for an evaluated near-duplicate (DEDUP_MODE).
+    Records and returns the match, if any; match.output is set when its evaluation may be
+    reused. Does not commit.
+    """
+    if config.DEDUP_MODE == "off":
+        return None
+    fingerprint = ReviewFingerprint(payload)
+    match = await fingerprint.find_duplicate(db, exclude_review_id=review_id)
+    await fingerprint.store(db, review_id)
+    if match is None:
+        return None
+
+    await mark_review_duplicate(db, review_id, match.review_id, match.similarity)
+    # "Acted On" in later rounds depends on the reviewer's own previous round, so those are only flagged
+    reusable = config.DEDUP_MODE == "reuse" and not (payload.round and payload.round > 1)
+    if reusable:
+        match.output = json.loads(match.row["llm_generated_output"])
+    REVIEW_DUPLICATES.labels("reused" if reusable else "flagged").inc()
+    logger.info("Review %s is a near-duplicate of review %s (similarity %.3f)", review_id, match.review_id,
+                match.similarity)
+    return match
@@ -0,0 +1,147 @@
+# mcp/services/failure_artifacts.py
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from mcp.db.session import AsyncSessionLocal
+from mcp.db.crud import insert_failure_artifacts, prune_failure_artifacts
+from mcp.core.metrics import FAILURE_ARTIFACTS
+from mcp.core.tracing import current_trace_id
+import mcp.config as config
+
+logger = logging.getLogger(__name__)
+
+# how often the writer prunes old artifacts
+PRUNE_INTERVAL_SECONDS = 3600.0
+
+
+class FailureArtifactStore:
+    """
+    Keeps raw LLM outputs that failed parsing/validation in llm_failure_artifacts.
+    record() never blocks the caller: artifacts are sampled, truncated and put on a
+    bounded queue (dropped when it is full), and a background task writes them in batches
+    and, every PRUNE_INTERVAL_SECONDS whether or not anything was written, prunes by age
+    and per-review count.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = config.FAILURE_ARTIFACT_QUEUE_SIZE,
+        sample_rate: float = config.FAILURE_ARTIFACT_SAMPLE_RATE,
+        max_chars: int = config.FAILURE_ARTIFACT_MAX_CHARS,
+        retention_days: float = config.FAILURE_ARTIFACT_RETENTION_DAYS,
+        max_per_review: int = config.FAILURE_ARTIFACT_MAX_PER_REVIEW,
+        batch_size: int = 50,
+    ):
+        self.sample_rate = sample_rate
+        self.max_chars = max_chars
+        self.retention_days = retention_days
+        self.max_per_review = max_per_review
+        self.batch_size = batch_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._last_prune: Optional[float] = None
+
+    def record(
+        self,
+        review_id: Optional[int],
+        attempt: int,
+        stage: str,
+        error: Optional[BaseException],
+        raw: Optional[str],
+    ) -> bool:
+        """Offer a failed output for storage. Returns True if it was queued."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            FAILURE_ARTIFACTS.labels("sampled_out").inc()
+            return False
+        raw_text = raw if isinstance(raw, str) or raw is None else str(raw)
+        artifact = {
+            "review_id": review_id,
+            "attempt": attempt,
+            "stage": stage,
+            "error_message": f"{type(error).__name__}: {error}"[:2000] if error is not None else None,
+            "raw_output": raw_text[: self.max_chars] if raw_text is not None else None,
+            "raw_chars": len(raw_text) if raw_text is not None else 0,
+            "trace_id": current_trace_id(),
+        }
+        self.start()
+        try:
+            self._queue.put_nowait(artifact)
+        except asyncio.QueueFull:
+            FAILURE_ARTIFACTS.labels("dropped").inc()
+            logger.warning("Failure artifact queue full; dropping artifact for review %s", review_id)
+            return False
+        return True
+
+    def start(self) -> None:
+        """Start the writer on the running event loop (no-op if already running)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write whatever is still queued, then stop the writer."""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.put(None)  # sentinel: the writer exits after flushing
+            await self._task
+        self._task = None
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await insert_failure_artifacts(db, batch)
+            FAILURE_ARTIFACTS.labels("stored").inc(len(batch))
+        except Exception:
+            FAILURE_ARTIFACTS.labels("write_error").inc(len(batch))
+            logger.exception("Failed to store %d failure artifacts", len(batch))
+
+    async def _prune(self) -> None:
+        self._last_prune = time.monotonic()
+        try:
+            async with AsyncSessionLocal() as db:
+                deleted = await prune_failure_artifacts(db, self.retention_days, self.max_per_review)
+            if deleted:
+                logger.info("Pruned %d failure artifacts", deleted)
+        except Exception:
+            logger.exception("Failure artifact pruning failed")
+
+    async def _run(self) -> None:
+        while True:
+            if self._last_prune is None:
+                wait = 0.0
+            else:
+                wait = self._last_prune + PRUNE_INTERVAL_SECONDS - time.monotonic()
+            if wait <= 0:
+                await self._prune()
+                continue
+            try:
+                item = await asyncio.wait_for(self._queue.get(), wait)
+            except asyncio.TimeoutError:
+                continue  # time to prune
+            stopping = item is None
+            batch = [] if stopping else [item]
+            # batch whatever else is already queued into the same INSERT
+            while not stopping and len(batch) < self.batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+            if batch:
+                await self._write(batch)
+            if stopping:
+                return
+
+
+_failure_artifact_store_instance: Optional[FailureArtifactStore] = None
+
+
+def get_failure_artifact_store() -> FailureArtifactStore:
+    """Return the single shared FailureArtifactStore instance."""
+    global _failure_artifact_store_instance
+    if _failure_artifact_store_instance is None:
+        _failure_artifact_store_instance = FailureArtifactStore()
+    return _failure_artifact_store_instance
@@ -0,0 +1,97 @@
+# mcp/services/heartbeat.py
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Optional, Tuple
+
+from mcp.db.session import AsyncSessionLocal
+from mcp.db.crud import record_process_heartbeat, remove_process_heartbeat
+from mcp.services.lifecycle import sweep_orphaned_reviews
+import mcp.config as config
+
+logger = logging.getLogger(__name__)
+
+# (pid, id): recomputed in a forked child, which must not share its parent's id
+_instance_id: Optional[Tuple[int, str]] = None
+
+
+def instance_id() -> str:
+    """This process's id in process_heartbeats and reviews_table.owner_instance_id."""
+    global _instance_id
+    pid = os.getpid()
+    if _instance_id is None or _instance_id[0] != pid:
+        _instance_id = (pid, f"{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:8]}")
+    return _instance_id[1]
+
+
+class ProcessHeartbeat:
+    """
+    Background loop that keeps this process's row in process_heartbeats fresh and, in
+    processes that run background review jobs, re-defers the reviews of processes that
+    stopped beating (lifecycle.sweep_orphaned_reviews). Reviews are stamped with
+    instance_id() when this process inserts, claims or starts them, so the sweep never
+    takes work that a live process still holds in its ReviewQueue.
+    """
+
+    def __init__(self, interval: float = config.PROCESS_HEARTBEAT_INTERVAL):
+        self.interval = interval
+        self.sweep = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def beat(self) -> None:
+        """Record one heartbeat. Never raises; a missed beat is retried on the next interval."""
+        try:
+            async with AsyncSessionLocal() as db:
+                await record_process_heartbeat(db, instance_id())
+        except Exception:
+            logger.exception("Could not record heartbeat for %s", instance_id())
+
+    async def start(self, sweep: bool = True) -> None:
+        """
+        Record the first heartbeat (before this process queues anything, or other processes
+        would take its reviews for orphans), sweep once if `sweep`, then keep both going on
+        the running event loop. No-op if already running.
+        """
+        if self._task is not None and not self._task.done():
+            return
+        self.sweep = sweep
+        await self.beat()
+        if sweep:
+            await sweep_orphaned_reviews()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancel the loop and remove this process's heartbeat, so what it still owns is swept at once."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            async with AsyncSessionLocal() as db:
+                await remove_process_heartbeat(db, instance_id())
+        except Exception:
+            logger.exception("Could not remove heartbeat for %s", instance_id())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.beat()
+            if self.sweep:
+                await sweep_orphaned_reviews()
+
+
+_process_heartbeat_instance: Optional[ProcessHeartbeat] = None
+
+
+def get_process_heartbeat() -> ProcessHeartbeat:
+    """Return the single shared ProcessHeartbeat instance."""
+    global _process_heartbeat_instance
+    if _process_heartbeat_instance is None:
+        _process_heartbeat_instance = ProcessHeartbeat()
+    return _process_heartbeat_instance
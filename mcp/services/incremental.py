@@ -0,0 +1,167 @@
+# mcp/services/incremental.py
+"""
+Incremental evaluation of later review rounds.
+
+A round-N review (N > 1) that names its reviewer_id and reviewee_id is linked to the
+same pair's stored round N-1 review. When that review has been evaluated, the LLM is not
+sent the previous round in full (previous_round_review); it gets
+  - "previous_round_evaluation": the stored scores with shortened justifications, and
+  - "changes_since_previous_round": which questions changed and how,
+and is told in the system prompt to keep unaffected dimensions as they were. A review
+that did not change at all is not sent to the LLM: the previous evaluation is reused,
+with "Acted On" scored for a review that acted on nothing.
+
+Anything that cannot be linked or diffed (no ids, round 1, previous round not evaluated
+yet, stored in the prose format) falls back to the full evaluation.
+"""
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from mcp.core.metrics import REVIEW_ROUND_MODES
+from mcp.db.crud import get_previous_round_review
+from mcp.schemas import ReviewPayload
+from mcp.services.token_budget import shorten
+from mcp.services.utils import review_input
+import mcp.config as config
+
+logger = logging.getLogger(__name__)
+
+# justifications in the digest are cut to this many characters
+_DIGEST_JUSTIFICATION_CHARS = 160
+_ACTED_ON_KEYS = ("Acted_On", "Acted On")
+
+
+@dataclass
+class RoundPlan:
+    mode: str  # full | incremental | reused
+    payload: ReviewPayload  # what to render (previous_round_review removed unless mode is full)
+    extra: Optional[Dict[str, Any]] = None  # extra input fields for build_review_text
+    previous_review_id: Optional[int] = None
+    reused_output: Optional[Dict[str, Any]] = None  # set when mode is reused
+
+
+def _rubric_label(name: str) -> str:
+    # stored outputs use field names ("Problems_and_Solutions"); the prompt uses aliases
+    return name.replace("_and_", " & ").replace("_", " ")
+
+
+def _loads(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+    return value
+
+
+def evaluation_digest(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The stored evaluation of a review as {dimension: {"score", "justification"}}, compacted."""
+    evaluation = _loads(row.get("llm_generated_score"))
+    if not isinstance(evaluation, dict):
+        return None
+    digest = {}
+    for name, item in evaluation.items():
+        if not isinstance(item, dict):
+            continue
+        entry = {"score": item.get("score")}
+        if item.get("justification"):
+            entry["justification"] = shorten(str(item["justification"]), _DIGEST_JUSTIFICATION_CHARS)
+        digest[_rubric_label(name)] = entry
+    return digest or None
+
+
+def diff_rounds(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    What changed between two review inputs (as built by utils.review_input), matching
+    questions by their text. Unchanged questions are only counted.
+    """
+    old = {s["question"]: s for s in previous.get("scores") or []}
+    changed: List[Dict[str, Any]] = []
+    added: List[str] = []
+    unchanged = 0
+    for item in current.get("scores") or []:
+        before = old.pop(item["question"], None)
+        if before is None:
+            added.append(item["question"])
+            continue
+        change: Dict[str, Any] = {}
+        if before.get("awarded_points") != item.get("awarded_points"):
+            change["awarded_points"] = [before.get("awarded_points"), item.get("awarded_points")]
+        if before.get("comment") != item.get("comment"):
+            change["previous_comment"] = before.get("comment")
+        if change:
+            changed.append({"question": item["question"], **change})
+        else:
+            unchanged += 1
+    diff: Dict[str, Any] = {"unchanged_questions": unchanged, "changed": changed}
+    if added:
+        diff["new_questions"] = added
+    if old:
+        diff["removed_questions"] = list(old)
+    if previous.get("additional_comment") != current.get("additional_comment"):
+        diff["previous_additional_comment"] = previous.get("additional_comment")
+    return diff
+
+
+def _is_unchanged(diff: Dict[str, Any]) -> bool:
+    return not (diff["changed"] or "new_questions" in diff or "removed_questions" in diff
+                or "previous_additional_comment" in diff)
+
+
+def reused_output(row: Dict[str, Any], previous_round: int) -> Optional[Dict[str, Any]]:
+    """The stored LLM output of an identical earlier review, re-scored for "Acted On"."""
+    output = _loads(row.get("llm_generated_output"))
+    if not isinstance(output, dict) or not isinstance(output.get("evaluation"), dict):
+        return None
+    output = json.loads(json.dumps(output))  # deep copy
+    note = (f"The review is identical to round {previous_round}, so it does not show that any "
+            f"feedback from that round was acted on.")
+    key = next((k for k in _ACTED_ON_KEYS if k in output["evaluation"]), _ACTED_ON_KEYS[0])
+    output["evaluation"][key] = {"score": 1, "justification": note}
+    if isinstance(output.get("reasoning"), dict):
+        output["reasoning"][next((k for k in _ACTED_ON_KEYS if k in output["reasoning"]), key)] = note
+    return output
+
+
+async def plan_round(db: AsyncSession, payload: ReviewPayload) -> RoundPlan:
+    """Decide how to evaluate `payload`: in full, incrementally, or by reusing the previous round."""
+    full = RoundPlan("full", payload)
+    if not (config.INCREMENTAL_ROUNDS_ENABLED and payload.round and payload.round > 1
+            and payload.reviewer_id is not None and payload.reviewee_id is not None):
+        return full
+
+    row = await get_previous_round_review(
+        db, payload.course_name, payload.assignment_name, str(payload.reviewer_id), str(payload.reviewee_id),
+        payload.round - 1,
+    )
+    if row is None:
+        REVIEW_ROUND_MODES.labels("unlinked").inc()
+        return full
+    plan = RoundPlan("full", payload, previous_review_id=row["id"])
+    previous_input = _loads(row.get("review"))
+    digest = evaluation_digest(row)
+    if not isinstance(previous_input, dict) or digest is None:
+        # prose-format or not yet evaluated: link the rows but send the whole previous round
+        REVIEW_ROUND_MODES.labels("full").inc()
+        return plan
+
+    current = payload.model_copy(update={"previous_round_review": None})
+    diff = diff_rounds(previous_input, review_input(current))
+    if _is_unchanged(diff):
+        output = reused_output(row, payload.round - 1)
+        if output is not None:
+            REVIEW_ROUND_MODES.labels("reused").inc()
+            logger.info("Round %s review unchanged since review %s; reusing its evaluation", payload.round, row["id"])
+            return RoundPlan("reused", current, previous_review_id=row["id"], reused_output=output)
+
+    REVIEW_ROUND_MODES.labels("incremental").inc()
+    return RoundPlan(
+        "incremental",
+        current,
+        extra={"previous_round_evaluation": digest, "changes_since_previous_round": diff},
+        previous_review_id=row["id"],
+    )
@@ -0,0 +1,98 @@
+# mcp/services/lifecycle.py
+import asyncio
+import logging
+import time
+from typing import Set
+
+from mcp.db.session import AsyncSessionLocal, ensure_schema, warm_pool
+from mcp.db.crud import defer_reviews, defer_orphaned_reviews
+from mcp.services.review_queue import Priority, get_review_queue
+import mcp.config as config
+
+logger = logging.getLogger(__name__)
+
+
+# the background SDK import, referenced so it is not garbage-collected while running
+_background_warmups: Set["asyncio.Task[None]"] = set()
+
+
+async def prepare_startup(pool_connections: int = config.DB_POOL_WARM_CONNECTIONS) -> None:
+    """
+    Startup, before anything touches the database: check the schema (applying it only if
+    its fingerprint changed; raises if the database stays unreachable for
+    DB_STARTUP_TIMEOUT) and open `pool_connections` pool connections. The LLM provider SDK
+    is loaded alongside (LLM_WARMUP="startup") or in the background afterwards
+    ("background"), so the first requests pay for neither. No provider call is made.
+    """
+    start = time.perf_counter()
+    await ensure_schema(config.DB_STARTUP_TIMEOUT)
+    warmups = [warm_pool(pool_connections)]
+    if config.LLM_WARMUP == "startup":
+        warmups.append(asyncio.to_thread(_warm_llm_service))
+    await asyncio.gather(*warmups)
+    if config.LLM_WARMUP == "background":
+        task = asyncio.create_task(asyncio.to_thread(_load_provider_sdk))
+        _background_warmups.add(task)
+        task.add_done_callback(_background_warmups.discard)
+    logger.info("Startup checks and warmup took %.0f ms", (time.perf_counter() - start) * 1000)
+
+
+# a misconfigured provider must not block startup; LLM calls report it when made
+def _warm_llm_service() -> None:
+    try:
+        from mcp.services.llm_service import get_llm_service
+
+        get_llm_service()
+    except Exception:
+        logger.exception("LLM service warmup failed")
+
+
+def _load_provider_sdk() -> None:
+    try:
+        from mcp.services.llm_client import load_provider_sdk
+
+        load_provider_sdk()
+    except Exception:
+        logger.exception("LLM provider SDK warmup failed")
+
+
+async def sweep_orphaned_reviews(
+    grace_seconds: float = config.ORPHAN_SWEEP_GRACE_SECONDS,
+    heartbeat_timeout: float = config.PROCESS_HEARTBEAT_TIMEOUT,
+) -> int:
+    """
+    Re-defer reviews left in 'pending'/'processing' by a process that died without
+    checkpointing (its heartbeat is older than heartbeat_timeout), so the backlog feeder
+    picks them up again. Run at startup and on every heartbeat (services/heartbeat.py).
+    Never raises; a sweep failure must not block startup.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            count = await defer_orphaned_reviews(db, grace_seconds, heartbeat_timeout, Priority.reprocess)
+    except Exception:
+        logger.exception("Orphaned review sweep failed")
+        return 0
+    if count:
+        logger.warning("Re-deferred %d orphaned pending/processing reviews", count)
+    return count
+
+
+async def drain_and_checkpoint(timeout: float = config.SHUTDOWN_DRAIN_TIMEOUT) -> int:
+    """
+    Shutdown: let in-flight LLM jobs finish for up to `timeout` seconds, then put every
+    review that was queued or cut off back in the deferred backlog so another process
+    resumes it. Returns the number of reviews checkpointed.
+    """
+    unfinished = await get_review_queue().drain(timeout)
+    reviews = [(key, priority) for key, priority in unfinished if key is not None]
+    if not reviews:
+        return 0
+    try:
+        async with AsyncSessionLocal() as db:
+            await defer_reviews(db, reviews)
+    except Exception:
+        # still owned by this process: swept once its heartbeat is gone
+        logger.exception("Failed to checkpoint %d unfinished reviews", len(reviews))
+        return 0
+    logger.info("Checkpointed %d unfinished reviews for resume", len(reviews))
+    return len(reviews)
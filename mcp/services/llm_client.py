@@ -4,27 +4,74 @@ import logging
 from typing import Optional, Dict, Any
 import httpx
 import asyncio
-import google.generativeai as genai
+import time
+from functools import lru_cache
+from urllib.parse import urlsplit
 
 import mcp.config as config
+from mcp.core.metrics import LLM_CALL_DURATION, LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS
+from mcp.core.tracing import record_span, tracer
+from mcp.core.logging_config import redact
+from mcp.services.llm_recording import LLMRecorder, LLMReplayer
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_TIMEOUT = getattr(config, "LLM_TIMEOUT", 15)
 
 
+@lru_cache(maxsize=None)
+def _genai():
+    """
+    The google.generativeai module, imported on first use: it pulls in grpc, protobuf and
+    IPython (over half a second), which importing this module, a replay run or an API
+    process that never calls the provider should not pay for.
+    """
+    import google.generativeai as genai
+
+    return genai
+
+
+def load_provider_sdk() -> None:
+    """Import the provider SDK now (LLM_WARMUP) unless LLM calls are replayed. Thread-safe."""
+    if config.LLM_RECORD_MODE != "replay":
+        _genai()
+
+
 class LLMClient:
 
     def __init__(self, timeout: float = DEFAULT_TIMEOUT):
         self.timeout = timeout
         # keep an httpx client for potential fallback or other endpoints
         self._client = httpx.AsyncClient(timeout=self.timeout)
+        self._recorder: Optional[LLMRecorder] = None
+        self._replayer: Optional[LLMReplayer] = None
+
+        if config.LLM_RECORD_MODE == "replay":
+            # recorded responses stand in for the provider; no SDK setup or API key needed
+            self._replayer = LLMReplayer(
+                config.LLM_RECORD_PATH,
+                latency_scale=config.LLM_REPLAY_LATENCY_SCALE,
+                match=config.LLM_REPLAY_MATCH,
+            )
+            return
+        if config.LLM_RECORD_MODE == "record":
+            self._recorder = LLMRecorder(config.LLM_RECORD_PATH)
+            logger.info("Recording LLM responses to %s", config.LLM_RECORD_PATH)
 
         # configure the official SDK (safe to call multiple times)
         api_key = getattr(config, "GEMINI_API_KEY", None)
         if api_key:
+            genai = _genai()
             try:
-                genai.configure(api_key=api_key)
+                if config.GEMINI_API_ENDPOINT:
+                    genai.configure(
+                        api_key=api_key,
+                        transport="rest",
+                        client_options={"api_endpoint": config.GEMINI_API_ENDPOINT},
+                    )
+                    logger.info("Gemini SDK pointed at %s", config.GEMINI_API_ENDPOINT)
+                else:
+                    genai.configure(api_key=api_key)
                 logger.info("Configured google.generativeai with API key (length: %d)", len(api_key))
             except Exception as e:
                 logger.error("Failed to configure google.generativeai SDK: %s", e)
@@ -34,27 +81,73 @@ class LLMClient:
             logger.error(error_msg)
             raise ValueError(error_msg)
 
+    def model_label(self, model_name: Optional[str] = None) -> str:
+        """
+        What answers a call to `model_name` (default GEMINI_MODEL_NAME), for the llm.model
+        span attribute and the llm_call_duration_seconds model label: "replay:<model>" for
+        recorded responses ("replay:any" with LLM_REPLAY_MATCH="any", which ignores the
+        model), "<model>@<host>" when GEMINI_API_ENDPOINT points the SDK elsewhere (e.g.
+        mcp/test/fake_llm_server.py), else the model name.
+        """
+        model_name = model_name or config.GEMINI_MODEL_NAME
+        if self._replayer is not None:
+            return "replay:any" if self._replayer.match == "any" else f"replay:{model_name}"
+        if config.GEMINI_API_ENDPOINT:
+            return f"{model_name}@{urlsplit(config.GEMINI_API_ENDPOINT).netloc or config.GEMINI_API_ENDPOINT}"
+        return model_name
+
     async def close(self):
-        """Close the HTTP client session."""
+        """Close the HTTP client session (and the response recording, if any)."""
         await self._client.aclose()
+        if self._recorder is not None:
+            self._recorder.close()
 
     async def call_gemini(
         self,
         prompt: str,
         model_name: Optional[str] = None,
         temperature: float = 0.0,
+        timeout: Optional[float] = None,
     ) -> str:
+        """
+        One provider call. `timeout` (seconds) is passed to the SDK as the request timeout and
+        also bounds the wait here, raising asyncio.TimeoutError; None means no limit.
+        """
         model_name = model_name or config.GEMINI_MODEL_NAME
+        if self._replayer is not None:
+            return await asyncio.wait_for(
+                self._replayer.respond(prompt, model_name, {"temperature": temperature}), timeout
+            )
+        submitted_ns = time.time_ns()
+        started_ns = None
 
         def _sync_call():
+            nonlocal started_ns
+            started_ns = time.time_ns()
+            if self._recorder is None:
+                return _generate()
+            # record from this worker thread so the event loop never waits on the file
+            start = time.perf_counter()
+            try:
+                raw = _generate()
+            except Exception as e:
+                self._recorder.append(prompt, model_name, {"temperature": temperature},
+                                      time.perf_counter() - start, error=e)
+                raise
+            self._recorder.append(prompt, model_name, {"temperature": temperature},
+                                  time.perf_counter() - start, raw=raw)
+            return raw
+
+        def _generate():
             try:
                 logger.debug("Creating GenerativeModel with name: %s", model_name)
-                model = genai.GenerativeModel(model_name)
+                model = _genai().GenerativeModel(model_name)
                 logger.debug("Calling generate_content with prompt length: %d", len(prompt))
               
                 resp = model.generate_content(
                     prompt,
-                    generation_config={"temperature": temperature}
+                    generation_config={"temperature": temperature},
+                    request_options={"timeout": timeout} if timeout is not None else None,
                 )
                 logger.debug("Received response from Gemini API")
                 
@@ -86,18 +179,43 @@ class LLMClient:
                 raise
 
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, _sync_call)
+        try:
+            # the executor thread cannot be interrupted; the SDK timeout above ends it
+            return await asyncio.wait_for(loop.run_in_executor(None, _sync_call), timeout)
+        finally:
+            # time spent waiting for a free thread-pool worker before the SDK call began
+            if started_ns is not None:
+                record_span("llm.executor_wait", submitted_ns, started_ns)
 
 
-    async def evaluate(self, prompt: str, temperature: float = 0.0) -> str:
+    async def evaluate(
+        self,
+        prompt: str,
+        temperature: float = 0.0,
+        timeout: Optional[float] = None,
+        model_name: Optional[str] = None,
+    ) -> str:
+        LLM_PROMPT_CHARS.observe(len(prompt))
+        model = self.model_label(model_name)
+        start = time.perf_counter()
         try:
-            # Log prompt length for debugging
-            logger.debug("Calling Gemini with prompt length: %d chars", len(prompt))
-            result = await self.call_gemini(prompt, temperature=temperature)
-            logger.debug("Gemini returned response length: %d chars", len(result) if result else 0)
+            with tracer.start_as_current_span(
+                "llm.call",
+                attributes={"llm.model": model, "llm.prompt_chars": len(prompt)},
+            ) as span:
+                # Log prompt length for debugging
+                logger.debug("Calling Gemini with prompt length: %d chars", len(prompt))
+                result = await self.call_gemini(prompt, model_name=model_name, temperature=temperature, timeout=timeout)
+                logger.debug("Gemini returned response length: %d chars", len(result) if result else 0)
+                span.set_attribute("llm.response_chars", len(result) if result else 0)
+            LLM_CALL_DURATION.labels(model, "success" if result else "empty").observe(time.perf_counter() - start)
+            LLM_RESPONSE_CHARS.observe(len(result) if result else 0)
             return result
+        except asyncio.TimeoutError:
+            LLM_CALL_DURATION.labels(model, "timeout").observe(time.perf_counter() - start)
+            logger.warning("LLM call (Gemini) timed out after %.1fs", timeout)
+            raise
         except Exception as e:
-            logger.error("LLM call (Gemini) failed: %s", e)
-            logger.error("Prompt length was: %d chars", len(prompt))
-            logger.error("Prompt preview (first 500 chars): %s", prompt[:500])
+            LLM_CALL_DURATION.labels(model, "error").observe(time.perf_counter() - start)
+            logger.error("LLM call (Gemini) failed: %s (prompt %s)", e, redact(prompt))
             raise
@@ -0,0 +1,135 @@
+# mcp/services/llm_recording.py
+"""
+Record/replay of raw LLM responses (LLM_RECORD_MODE in config.py).
+
+record: LLMClient appends one gzip-compressed JSON line per provider call to
+        LLM_RECORD_PATH: prompt hash, model, params, raw response (or error) and latency.
+        Prompts themselves are not stored, only their SHA-256.
+replay: LLMClient never calls the provider; responses come from the recording, after
+        the recorded latency times LLM_REPLAY_LATENCY_SCALE (0 = instant).
+        LLM_REPLAY_MATCH="exact" serves the responses recorded for the same prompt hash,
+        model and params (in recorded order, cycling), "any" cycles through the whole
+        corpus regardless of prompt, for throughput runs with generated reviews.
+"""
+import asyncio
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def _params_key(params: Dict[str, Any]) -> str:
+    return json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield recorded calls in order; a truncated last line (crash mid-write) is skipped."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("Skipping unreadable record in %s", path)
+        except EOFError:
+            logger.warning("%s ends mid-record (process stopped while writing)", path)
+
+
+class LLMRecorder:
+    """
+    Append-only, gzip-compressed JSON-lines store. Each record is sync-flushed so a crash
+    loses at most the record being written. Thread-safe: LLMClient records from the
+    executor thread that made the SDK call, so the event loop never touches the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "ab")
+
+    def append(
+        self,
+        prompt: str,
+        model: str,
+        params: Dict[str, Any],
+        latency: float,
+        raw: Optional[str] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        record = {
+            "ts": round(time.time(), 3),
+            "prompt_sha256": prompt_hash(prompt),
+            "prompt_chars": len(prompt),
+            "model": model,
+            "params": params,
+            "latency_ms": round(latency * 1000, 1),
+            "raw": raw,
+        }
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        try:
+            with self._lock:
+                self._file.write(line)
+                self._file.flush(zlib.Z_SYNC_FLUSH)
+        except Exception:
+            logger.exception("Failed to record LLM response to %s", self.path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class ReplayMiss(LookupError):
+    """No recorded response matches the prompt (LLM_REPLAY_MATCH="exact")."""
+
+
+class RecordedLLMError(RuntimeError):
+    """Replays a provider error that was recorded instead of a response."""
+
+
+class LLMReplayer:
+    def __init__(self, path: str, latency_scale: float = 1.0, match: str = "exact"):
+        self.path = path
+        self.latency_scale = latency_scale
+        self.match = match
+        records = list(iter_records(path))
+        if not records:
+            raise ValueError(f"LLM replay corpus {path} is empty")
+        grouped: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+        for record in records:
+            key = (record["prompt_sha256"], record["model"], _params_key(record.get("params") or {}))
+            grouped.setdefault(key, []).append(record)
+        self._by_key: Dict[Tuple[str, str, str], Iterator[Dict[str, Any]]] = {
+            key: itertools.cycle(group) for key, group in grouped.items()
+        }
+        self._all = itertools.cycle(records)
+        logger.info("Loaded %d recorded LLM responses (%d distinct prompts) from %s", len(records), len(grouped), path)
+
+    def _next(self, prompt: str, model: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if self.match == "any":
+            return next(self._all)
+        records = self._by_key.get((prompt_hash(prompt), model, _params_key(params)))
+        if records is None:
+            raise ReplayMiss(f"No recorded response for prompt {prompt_hash(prompt)[:12]} on {model}")
+        return next(records)
+
+    async def respond(self, prompt: str, model: str, params: Dict[str, Any]) -> str:
+        record = self._next(prompt, model, params)
+        delay = record.get("latency_ms", 0) / 1000.0 * self.latency_scale
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if record.get("error"):
+            raise RecordedLLMError(record["error"])
+        return record["raw"]
@@ -2,21 +2,104 @@
 import asyncio
 import json
 import logging
-from typing import Optional
-from pydantic import ValidationError
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from pydantic import BaseModel, Field, ValidationError, create_model
+from opentelemetry import context as otel_context
+from opentelemetry import trace
 from mcp.services.llm_client import LLMClient
-from mcp.services.prompt import build_review_prompt
-from mcp.schemas import ReviewLLMOutput
-from mcp.services.utils import _normalize
+from mcp.services.prompt import (
+    build_details_prompt,
+    build_feedback_prompt,
+    build_review_prompt,
+    build_rubric_group_prompt,
+    build_scores_prompt,
+)
+from mcp.schemas import _LLM_OUTPUT_CONFIG, Evaluation, LLMText, Reasoning, ReviewLLMOutput, RubricEvaluation
+from mcp.core.metrics import LLM_ATTEMPTS, LLM_DEADLINE_OUTCOMES, LLM_OUTPUT_FAILURES, REVIEW_INPUT_CUTS
+from mcp.core.deadline import Deadline, DeadlineExceeded
+from mcp.core.tracing import tracer
+from mcp.core.logging_config import redact
+from mcp.core.rate_limit import charge_llm_call
+from mcp.services.failure_artifacts import get_failure_artifact_store
+from mcp.services.token_budget import estimate_tokens, fit_review_json, truncate_to_budget
 import mcp.config as config
-from statistics import mode, StatisticsError, mean
-from collections import Counter
-from typing import Any, Dict, List
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
 # How many times to retry a single evaluate call until we accept a parsed JSON
 MAX_ATTEMPTS_PER_CALL = getattr(config, "MAX_REVIEW_ATTEMPTS", 10)
+RETRY_BACKOFF_SECONDS = 0.3
+
+T = TypeVar("T")
+
+# rubric label as the model writes it ("Acted On") -> Evaluation field name ("Acted_On")
+_RUBRIC_FIELDS = {field.alias or name: name for name, field in Evaluation.model_fields.items()}
+
+
+class _FeedbackOutput(BaseModel):
+    feedback: LLMText
+
+
+class _ScoresOutput(BaseModel):
+    evaluation: Evaluation
+
+
+class _DetailsOutput(BaseModel):
+    reasoning: Reasoning
+    feedback: LLMText = None
+
+
+def _by_label(evaluation: Dict[str, Any]) -> Dict[str, Any]:
+    """An evaluation keyed by field names (as stored) or labels, keyed by labels."""
+    names = {name: label for label, name in _RUBRIC_FIELDS.items()}
+    return {names.get(key, key): value for key, value in evaluation.items()}
+
+
+@lru_cache(maxsize=None)
+def _rubric_group_model(dimensions: Tuple[str, ...]) -> type:
+    """
+    Output model for one rubric group: reasoning and evaluation of only those dimensions,
+    validated like Reasoning and Evaluation so a bad field is retried like any other output.
+    """
+    group_reasoning = create_model(
+        "RubricGroupReasoning",
+        __config__=_LLM_OUTPUT_CONFIG,
+        **{_RUBRIC_FIELDS[d]: (LLMText, Field(None, alias=d)) for d in dimensions},
+    )
+    group_evaluation = create_model(
+        "RubricGroupEvaluation",
+        __config__=_LLM_OUTPUT_CONFIG,
+        **{_RUBRIC_FIELDS[d]: (RubricEvaluation, Field(..., alias=d)) for d in dimensions},
+    )
+    return create_model("RubricGroupOutput", reasoning=(group_reasoning, ...), evaluation=(group_evaluation, ...))
+
+
+def _failure_stage(exc: Exception, raw: str) -> str:
+    """Classify a rejected output the same way as llm_output_failures_total."""
+    if isinstance(exc, ValidationError):
+        # validate_json reports malformed JSON as a validation error of type json_invalid
+        if any(e["type"] == "json_invalid" for e in exc.errors(include_url=False)):
+            return "parse"
+        return "validation"
+    if isinstance(exc, TypeError):
+        return "repair"
+    return "parse" if raw.strip() else "empty"
+
+
+def strip_code_fences(raw: str) -> str:
+    """Remove markdown code fences (```json ... ``` or ``` ... ```) around the model's JSON."""
+    cleaned = raw.strip()
+    if cleaned.startswith("```"):
+        # Find the first newline after ```
+        first_newline = cleaned.find("\n")
+        if first_newline != -1:
+            cleaned = cleaned[first_newline:].strip()
+        # Remove trailing ```
+        if cleaned.endswith("```"):
+            cleaned = cleaned[:-3].strip()
+    return cleaned
 
 
 class LLMService:
@@ -30,6 +113,30 @@ class LLMService:
         # allow injection of a custom client for testing; otherwise create one
         self.client = client or LLMClient()
         self._lock = asyncio.Lock()
+        # moving average of provider call time, to tell whether a retry fits in a deadline
+        self._call_seconds: Optional[float] = None
+
+    def _record_call_time(self, seconds: float) -> None:
+        self._call_seconds = seconds if self._call_seconds is None else 0.8 * self._call_seconds + 0.2 * seconds
+
+    def _check_deadline(self, deadline: Optional[Deadline], attempt: int, last_error: Optional[Exception]) -> None:
+        """Raise DeadlineExceeded if the next attempt cannot finish before the deadline."""
+        if deadline is None:
+            return
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            outcome = "exceeded"
+        elif attempt and self._call_seconds is not None and remaining < self._call_seconds:
+            # a retry that would typically still be running at the deadline is not worth paying for
+            outcome = "retry_skipped"
+        else:
+            return
+        LLM_DEADLINE_OUTCOMES.labels(outcome).inc()
+        LLM_ATTEMPTS.labels("deadline").observe(attempt)
+        raise DeadlineExceeded(
+            f"Request deadline reached after {attempt} LLM attempts ({remaining:.1f}s left)"
+            + (f"; last error: {last_error}" if last_error is not None else "")
+        )
 
     async def close(self) -> None:
         """Close underlying HTTP client connections."""
@@ -57,93 +164,269 @@ class LLMService:
         review_text: str,
         temperature: float = 0.0,
         max_attempts: int = MAX_ATTEMPTS_PER_CALL,
+        review_id: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
     ) -> ReviewLLMOutput:
         """
         Repeatedly call the LLM (up to max_attempts) until we can parse and validate
         a JSON object that conforms to ReviewLLMOutput. Returns the validated model.
         Raises ValueError if unable to get valid structured output after attempts.
+        Each rejected output is handed to the failure-artifact store under review_id.
+        With a deadline, each provider call's timeout is the remaining budget and no
+        attempt is started that cannot finish in time (raises DeadlineExceeded).
+        Review text over REVIEW_INPUT_TOKEN_BUDGET (raw /llmreview text; stored reviews are
+        already fitted by services/token_budget.py) is shortened once, before the first attempt,
+        so retries do not all fail on the same oversized prompt.
+        With LLM_EVALUATION_MODE="parallel" the rubric groups are evaluated concurrently and
+        merged (see _evaluate_parallel); max_attempts then applies to each call.
+        """
+        review_text = self._fit_review_text(review_text)
+        if config.LLM_EVALUATION_MODE == "parallel":
+            return await self._evaluate_parallel(review_text, temperature, max_attempts, review_id, deadline)
+        return await self._evaluate_prompt(
+            build_review_prompt(review_text), ReviewLLMOutput.model_validate_json,
+            temperature, max_attempts, review_id, deadline,
+        )
+
+    async def evaluate_scores(
+        self,
+        review_text: str,
+        temperature: float = 0.0,
+        max_attempts: int = MAX_ATTEMPTS_PER_CALL,
+        review_id: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Evaluation:
+        """
+        Phase 1 of a two-phase evaluation (LLM_TWO_PHASE_MODE): only the rubric scores with
+        one-sentence justifications, a much shorter output than the full evaluation.
+        """
+        review_text = self._fit_review_text(review_text)
+        with tracer.start_as_current_span("llm.scores_phase"):
+            return (await self._evaluate_prompt(
+                build_scores_prompt(review_text), _ScoresOutput.model_validate_json,
+                temperature, max_attempts, review_id, deadline,
+            )).evaluation
+
+    async def evaluate_details(
+        self,
+        review_text: str,
+        evaluation: Dict[str, Any],
+        temperature: float = 0.0,
+        max_attempts: int = MAX_ATTEMPTS_PER_CALL,
+        review_id: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> ReviewLLMOutput:
+        """
+        Phase 2 of a two-phase evaluation: reasoning and feedback for the phase-1 `evaluation`
+        (keyed by rubric labels or field names), merged with it into a full ReviewLLMOutput.
+        """
+        review_text = self._fit_review_text(review_text)
+        evaluation = _by_label(evaluation)
+        with tracer.start_as_current_span("llm.details_phase"):
+            details = await self._evaluate_prompt(
+                build_details_prompt(review_text, evaluation), _DetailsOutput.model_validate_json,
+                temperature, max_attempts, review_id, deadline,
+            )
+        return ReviewLLMOutput.model_validate({
+            "reasoning": details.reasoning.model_dump(by_alias=True),
+            "evaluation": evaluation,
+            "feedback": details.feedback,
+        })
+
+    def _fit_review_text(self, review_text: str) -> str:
+        """
+        Cut review text over REVIEW_INPUT_TOKEN_BUDGET: a JSON review through
+        fit_review_json (so it stays valid JSON), anything else by characters.
+        """
+        budget = config.REVIEW_INPUT_TOKEN_BUDGET
+        if budget <= 0 or estimate_tokens(review_text) <= budget:
+            return review_text
+        original_chars = len(review_text)
+        try:
+            data = json.loads(review_text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            review_text, _, cuts = fit_review_json(data, budget)
+            logger.warning("Review JSON over token budget; cut from %d to %d chars: %s", original_chars,
+                           len(review_text), ", ".join(f"{c['action']} {c['field']}" for c in cuts))
+            return review_text
+        review_text = truncate_to_budget(review_text, budget)
+        REVIEW_INPUT_CUTS.labels("shortened").inc()
+        logger.warning("Review text over token budget; shortened from %d to %d chars", original_chars, len(review_text))
+        return review_text
+
+    async def _evaluate_parallel(
+        self,
+        review_text: str,
+        temperature: float,
+        max_attempts: int,
+        review_id: Optional[int],
+        deadline: Optional[Deadline],
+    ) -> ReviewLLMOutput:
+        """
+        Evaluate each group in RUBRIC_GROUPS with its own, shorter-output prompt concurrently,
+        then run a feedback pass over the merged scores. If any group fails, the others are
+        cancelled and the error is raised; a failed feedback pass leaves feedback empty.
+        """
+        listed = [d for dimensions in config.RUBRIC_GROUPS for d in dimensions]
+        if sorted(listed) != sorted(_RUBRIC_FIELDS):
+            raise ValueError(f"RUBRIC_GROUPS must list each rubric dimension exactly once: {sorted(_RUBRIC_FIELDS)}")
+
+        async def group(dimensions: List[str]) -> BaseModel:
+            with tracer.start_as_current_span("llm.rubric_group", attributes={"llm.rubric_group": dimensions}):
+                return await self._evaluate_prompt(
+                    build_rubric_group_prompt(review_text, dimensions), _rubric_group_model(tuple(dimensions)).model_validate_json,
+                    temperature, max_attempts, review_id, deadline,
+                )
+
+        tasks = [asyncio.ensure_future(group(dimensions)) for dimensions in config.RUBRIC_GROUPS]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        reasoning: Dict[str, Any] = {}
+        evaluation: Dict[str, Any] = {}
+        for dimensions, result in zip(config.RUBRIC_GROUPS, results):
+            for dimension in dimensions:
+                reasoning[dimension] = getattr(result.reasoning, _RUBRIC_FIELDS[dimension])
+                evaluation[dimension] = getattr(result.evaluation, _RUBRIC_FIELDS[dimension]).model_dump()
+
+        feedback = None
+        try:
+            with tracer.start_as_current_span("llm.feedback_pass"):
+                feedback = (await self._evaluate_prompt(
+                    build_feedback_prompt(review_text, evaluation), _FeedbackOutput.model_validate_json,
+                    temperature, max_attempts, review_id, deadline,
+                )).feedback
+        except DeadlineExceeded:
+            raise
+        except ValueError as e:
+            logger.warning("Feedback pass failed; returning the rubric evaluation without feedback: %s", e)
+        return ReviewLLMOutput.model_validate({"reasoning": reasoning, "evaluation": evaluation, "feedback": feedback})
+
+    async def _evaluate_prompt(
+        self,
+        prompt: str,
+        validate: Callable[[str], T],
+        temperature: float,
+        max_attempts: int,
+        review_id: Optional[int],
+        deadline: Optional[Deadline],
+    ) -> T:
+        """
+        The attempt loop behind evaluate_and_parse: call, strip code fences, then `validate`
+        (a model's model_validate_json, which parses and validates in one pass).
         """
         attempt = 0
         last_raw = None
+        last_error: Optional[Exception] = None
+        artifacts = get_failure_artifact_store()
 
         while attempt < max_attempts:
+            self._check_deadline(deadline, attempt, last_error)
             attempt += 1
+            # one span per attempt; the retry sleep gets its own span below
+            attempt_span = tracer.start_span("llm.attempt", attributes={"llm.attempt": attempt})
+            token = otel_context.attach(trace.set_span_in_context(attempt_span))
+            raw = None
             try:
-                prompt = build_review_prompt(review_text)
-                raw = await self.client.evaluate(prompt, temperature=temperature)
+                # counts against the requesting client's daily LLM quota
+                await charge_llm_call()
+                call_start = time.monotonic()
+                raw = await self.client.evaluate(
+                    prompt,
+                    temperature=temperature,
+                    timeout=deadline.remaining() if deadline is not None else None,
+                )
+                self._record_call_time(time.monotonic() - call_start)
                 
                 # Check if raw is None or empty
                 if not raw or raw.strip() == "":
                     logger.warning("Attempt %d/%d: LLM returned empty response", attempt, max_attempts)
                     last_raw = raw or "Empty response from LLM"
+                    LLM_OUTPUT_FAILURES.labels("empty").inc()
                     raise ValueError("LLM returned empty response")
                 
                 last_raw = raw
 
                 # Extract JSON from markdown code blocks if present
-                cleaned = raw.strip()
-                # Remove markdown code fences (```json ... ``` or ``` ... ```)
-                if cleaned.startswith("```"):
-                    # Find the first newline after ```
-                    first_newline = cleaned.find("\n")
-                    if first_newline != -1:
-                        cleaned = cleaned[first_newline:].strip()
-                    # Remove trailing ```
-                    if cleaned.endswith("```"):
-                        cleaned = cleaned[:-3].strip()
-                
-                try:
-                    parsed = json.loads(cleaned)
-                except json.JSONDecodeError as jde:
-                    logger.info("JSON decode failed on cleaned string: %s", jde)
-                    logger.debug("JSON candidate (truncated): %s", cleaned[:1000])
-                    raise
+                cleaned = strip_code_fences(raw)
 
-                if parsed is None:
-                    logger.info("Attempt %d: no JSON extracted from LLM output; raw saved for inspection.", attempt)
-                    raise ValueError("No JSON parsed from LLM output")
-            
+                # one pass: pydantic-core parses the JSON and validates it, normalizing
+                # scores and null-like strings in the schemas' field validators
                 try:
-                    parsed = _normalize(parsed)
-                except Exception as e:
-                    logger.debug("Normalization failed (non-fatal): %s", e, exc_info=True)
-
-                if not isinstance(parsed, (dict, list)):
-                    logger.info("Parsed object is not a dict/list after normalization; type=%s", type(parsed))
-                    raise TypeError("Parsed object is not JSON-mappable")
-
-                try:
-                    validated = ReviewLLMOutput.model_validate(parsed)
+                    validated = validate(cleaned)
+                    LLM_ATTEMPTS.labels("success").observe(attempt)
                     return validated
                 except ValidationError as ve:
+                    stage = _failure_stage(ve, cleaned)
+                    LLM_OUTPUT_FAILURES.labels(stage).inc()
                     try:
-                        details = ve.errors()
-                    except Exception:
-                        try:
-                            details = ve.json()
-                        except Exception:
-                            details = str(ve)
-                    logger.info("Pydantic validation failed on attempt %d/%d: %s", attempt, max_attempts, details)
-                    logger.debug("Raw LLM output (truncated): %s", raw[:2000])
-                    try:
-                        with open("tmp_last_raw.json", "w", encoding="utf-8") as f:
-                            f.write(raw if isinstance(raw, str) else str(raw))
+                        details = ve.errors(include_url=False)
                     except Exception:
-                        logger.debug("Failed writing tmp_last_raw.json", exc_info=True)
+                        details = str(ve)
+                    if stage == "parse":
+                        logger.info("JSON decode failed on attempt %d/%d: %s", attempt, max_attempts, details)
+                        logger.debug("JSON candidate: %s", redact(cleaned[:1000]))
+                    else:
+                        logger.info("Pydantic validation failed on attempt %d/%d: %s", attempt, max_attempts, details)
+                        logger.debug("Raw LLM output: %s", redact(raw[:2000]))
                     raise
 
             except Exception as e:
+                last_error = e
+                if deadline is not None and deadline.expired():
+                    attempt_span.record_exception(e)
+                    attempt_span.set_status(trace.Status(trace.StatusCode.ERROR, "deadline exceeded"))
+                    LLM_DEADLINE_OUTCOMES.labels("exceeded").inc()
+                    LLM_ATTEMPTS.labels("deadline").observe(attempt)
+                    raise DeadlineExceeded(f"Request deadline reached during LLM attempt {attempt}: {e}") from e
                 logger.warning("Attempt %d/%d: LLM output invalid or parsing failed: %s", attempt, max_attempts, e)
                 logger.debug("Full traceback for attempt %d:", attempt, exc_info=True)
-                await asyncio.sleep(0.3)
+                attempt_span.record_exception(e)
+                attempt_span.set_status(trace.Status(trace.StatusCode.ERROR, type(e).__name__))
+                if raw is not None:
+                    # the model answered but the answer was unusable; keep it for debugging
+                    artifacts.record(review_id, attempt, _failure_stage(e, raw), e, raw)
+            finally:
+                otel_context.detach(token)
+                attempt_span.end()
+            with tracer.start_as_current_span("llm.retry_backoff"):
+                await asyncio.sleep(
+                    min(RETRY_BACKOFF_SECONDS, deadline.remaining()) if deadline is not None else RETRY_BACKOFF_SECONDS
+                )
 
         # After attempts exhausted, raise with last raw output location for debugging
+        LLM_ATTEMPTS.labels("exhausted").observe(attempt)
         raise ValueError(
             f"Could not obtain valid LLM JSON after {max_attempts} attempts. "
-            f"Last raw output (saved to tmp_last_raw.json if available):\n{last_raw!s}"
+            f"Last raw output (rejected outputs are kept in llm_failure_artifacts):\n{last_raw!s}"
         )
 
 
+
+_llm_service_instance: Optional[LLMService] = None
+
+def get_llm_service() -> LLMService:
+    """Return a single shared LLMService instance (API routes and background jobs)."""
+    global _llm_service_instance
+    if _llm_service_instance is None:
+        _llm_service_instance = LLMService()  # internally creates an LLMClient
+    return _llm_service_instance
+
+
+async def close_llm_service() -> None:
+    """Close the shared LLMService if one was created (does not create one)."""
+    global _llm_service_instance
+    if _llm_service_instance is not None:
+        await _llm_service_instance.close()
+        _llm_service_instance = None
+
+
 ## Still working on multiple output resolution
     # async def evaluate_multiple_times(
     #         self,
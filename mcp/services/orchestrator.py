@@ -1,56 +1,85 @@
 # mcp/services/orchestrator.py
 import json
 import logging
-import traceback
-from typing import Optional, Any, Dict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional, Any, Dict, Tuple
 from pydantic import BaseModel
+from opentelemetry import trace
 
-from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from mcp.db.session import AsyncSessionLocal
+from mcp.db.prepared import PreparedQuery
+from mcp.db.crud import (
+    get_review_by_id,
+    mark_review_processing,
+    record_failed_job,
+    resolve_failed_job,
+    store_review_output,
+    store_review_scores,
+)
+from mcp.services.heartbeat import instance_id
+from mcp.core.rate_limit import charging_to
+from mcp.core.metrics import REVIEW_TIME_TO_COMPLETE, REVIEW_TIME_TO_FIRST_SCORE
+from mcp.core.tracing import current_trace_id, tracer
+from mcp.core.logging_config import bind_log_context
+import mcp.config as config
 
 logger = logging.getLogger(__name__)
 
-async def generate_llm_review(review_text: str, temperature: float = 0.0, max_attempts: int = 10) -> Any:
+_MARK_REVIEW_FAILED = PreparedQuery(
     """
-    Dynamically import LLMService at call time to avoid circular imports.
+    UPDATE reviews_table
+       SET status = 'failed',
+           llm_details_reasoning = :err,
+           updated_at = CURRENT_TIMESTAMP
+     WHERE id = :id
+    """
+)
+
+
+async def _mark_review_failed(db: AsyncSession, review_id: int, error_message: str) -> None:
+    """
+    Set the review status to 'failed' and record the attempt in failed_jobs so the
+    retry scheduler picks it up again (or dead-letters it). Commits.
+    """
+    await _MARK_REVIEW_FAILED.execute(db, {"err": error_message, "id": review_id})
+    failed_job = await record_failed_job(
+        db,
+        review_id,
+        error_message,
+        max_attempts=config.FAILED_JOB_MAX_ATTEMPTS,
+        base_delay=config.FAILED_JOB_RETRY_BASE_DELAY,
+        max_delay=config.FAILED_JOB_RETRY_MAX_DELAY,
+    )
+    await db.commit()
+    if failed_job and failed_job.get("dead_lettered_at"):
+        logger.warning("Review %s dead-lettered after %s attempts", review_id, failed_job.get("attempts"))
+
+
+async def generate_llm_review(
+    review_text: str,
+    temperature: float = 0.0,
+    max_attempts: int = 10,
+    review_id: Optional[int] = None,
+) -> Any:
+    """
+    Dynamically import the shared LLMService at call time to avoid circular imports.
     Returns whatever evaluate_and_parse returns (pydantic model or dict).
     """
-    from mcp.services.llm_service import LLMService
+    from mcp.services.llm_service import get_llm_service
 
-    llm = LLMService()
-    result = await llm.evaluate_and_parse(review_text=review_text, temperature=temperature, max_attempts=max_attempts)
+    llm = get_llm_service()
+    result = await llm.evaluate_and_parse(
+        review_text=review_text, temperature=temperature, max_attempts=max_attempts, review_id=review_id
+    )
     return result
 
 
-async def process_review_and_update(review_id: int, review_text: str):
+def serialize_llm_output(llm_out: Any) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
     """
-    Worker coroutine: calls LLM via generate_llm_review, normalizes output,
-    and writes llm_generated_feedback, llm_generated_score (evaluation JSON), 
-    llm_details_reasoning, llm_generated_output (full output), and status.
+    Turn an LLM result (pydantic model or dict) into the reviews_table text columns:
+    (feedback, evaluation JSON, reasoning JSON, full output JSON).
     """
-    try:
-        llm_out = await generate_llm_review(review_text)  
-    except Exception as exc:
-        traceback.print_exc()
-        try:
-            async with AsyncSessionLocal() as db:
-                await db.execute(
-                    text(
-                        """
-                        UPDATE reviews_table
-                           SET status = :status,
-                               llm_details_reasoning = :err,
-                               updated_at = CURRENT_TIMESTAMP
-                         WHERE id = :id
-                        """
-                    ),
-                    {"status": "failed", "err": str(exc), "id": review_id},
-                )
-                await db.commit()
-        except Exception:
-            traceback.print_exc()
-        return
-
     # Normalize to plain dict
     if isinstance(llm_out, BaseModel):
         try:
@@ -85,60 +114,158 @@ async def process_review_and_update(review_id: int, review_text: str):
     except (TypeError, ValueError):
         full_output_json = json.dumps(str(llm_dict))
 
-    update_sql = text(
-        """
-        UPDATE reviews_table
-           SET llm_generated_feedback = :feedback,
-               llm_generated_score = :evaluation,
-               llm_details_reasoning = :details,
-               llm_generated_output = :full_output,
-               status = :status,
-               updated_at = CURRENT_TIMESTAMP
-         WHERE id = :id
-        """
+    return feedback, evaluation_json, details_json, full_output_json
+
+
+def _seconds_since(created_at: Optional[datetime]) -> Optional[float]:
+    if created_at is None:
+        return None
+    return max((datetime.now(timezone.utc) - created_at).total_seconds(), 0.0)
+
+
+@tracer.start_as_current_span("process_review")
+async def process_review_and_update(review_id: int, review_text: str):
+    """
+    Worker coroutine: calls LLM via generate_llm_review, normalizes output,
+    and writes llm_generated_feedback, llm_generated_score (evaluation JSON), 
+    llm_details_reasoning, llm_generated_output (full output), and status.
+    With LLM_TWO_PHASE_MODE on, only the scores are evaluated and stored here (status
+    'scored'); process_review_details completes the review.
+    """
+    span = trace.get_current_span()
+    span.set_attribute("review.id", review_id)
+    # the job runs in its own context, so this only tags this review's log records
+    bind_log_context(review_id=review_id)
+    # flag the row as started here, so the orphan sweep leaves it alone while this process lives
+    quota_subject = None
+    try:
+        async with AsyncSessionLocal() as db:
+            quota_subject = await mark_review_processing(db, review_id, current_trace_id(), instance_id())
+    except Exception:
+        logger.exception("Could not mark review %s as processing", review_id)
+
+    two_phase = config.LLM_TWO_PHASE_MODE != "off"
+    try:
+        # outside the submitting request (deferred, worker, retry) the stored client pays
+        with charging_to(quota_subject):
+            if two_phase:
+                from mcp.services.llm_service import get_llm_service
+
+                llm_out = await get_llm_service().evaluate_scores(review_text, max_attempts=10, review_id=review_id)
+            else:
+                llm_out = await generate_llm_review(review_text, review_id=review_id)
+    except Exception as exc:
+        logger.error("LLM evaluation failed for review %s: %s", review_id, exc)
+        span.record_exception(exc)
+        span.set_status(trace.Status(trace.StatusCode.ERROR, "LLM evaluation failed"))
+        try:
+            async with AsyncSessionLocal() as db:
+                await _mark_review_failed(db, review_id, str(exc))
+        except Exception:
+            logger.exception("Failed to mark review %s as failed", review_id)
+        return
+
+    if two_phase:
+        evaluation_json = json.dumps(llm_out.model_dump())
+        elapsed = await _store_result(review_id, span, lambda db: store_review_scores(db, review_id, evaluation_json))
+        if elapsed is not None:
+            REVIEW_TIME_TO_FIRST_SCORE.observe(elapsed)
+            logger.info("Scored review id=%s", review_id)
+            if config.LLM_TWO_PHASE_MODE == "background":
+                from mcp.services.utils import request_review_details
+
+                request_review_details(review_id, review_text)
+        return
+
+    feedback, evaluation_json, details_json, full_output_json = serialize_llm_output(llm_out)
+    elapsed = await _store_result(
+        review_id, span,
+        lambda db: store_review_output(db, review_id, feedback, evaluation_json, details_json, full_output_json),
     )
+    if elapsed is not None:
+        REVIEW_TIME_TO_FIRST_SCORE.observe(elapsed)
+        REVIEW_TIME_TO_COMPLETE.observe(elapsed)
+        logger.info("Processed review id=%s", review_id)
+
 
+async def _store_result(
+    review_id: int,
+    span: trace.Span,
+    store: Callable[[AsyncSession], Awaitable[Optional[datetime]]],
+) -> Optional[float]:
+    """
+    Run `store` (a crud writer returning created_at), resolve the review's failed job and
+    commit. Returns the seconds since the review arrived, or None if the write failed, in
+    which case the review is marked failed.
+    """
     async with AsyncSessionLocal() as db:
         try:
-            await db.execute(
-                update_sql,
-                {
-                    "feedback": feedback,
-                    "evaluation": evaluation_json,
-                    "details": details_json,
-                    "full_output": full_output_json,
-                    "status": "processed",
-                    "id": review_id,
-                },
-            )
+            created_at = await store(db)
+            await resolve_failed_job(db, review_id)
             await db.commit()
-            print(f"Processed review id={review_id}")
-            return
+            return _seconds_since(created_at) or 0.0
         except Exception as exc:
             try:
                 await db.rollback()
             except Exception:
                 pass
-            traceback.print_exc()
+            logger.exception("Failed to store LLM result for review %s", review_id)
+            span.record_exception(exc)
+            span.set_status(trace.Status(trace.StatusCode.ERROR, "Result write failed"))
             try:
-                await db.execute(
-                    text(
-                        """
-                        UPDATE reviews_table
-                           SET status = :status,
-                               llm_details_reasoning = :err,
-                               updated_at = CURRENT_TIMESTAMP
-                         WHERE id = :id
-                        """
-                    ),
-                    {"status": "failed", "err": str(exc), "id": review_id},
-                )
-                await db.commit()
-                print(f"Marked review {review_id} as failed")
+                await _mark_review_failed(db, review_id, str(exc))
+                logger.info("Marked review %s as failed", review_id)
             except Exception:
                 try:
                     await db.rollback()
                 except Exception:
                     pass
-                traceback.print_exc()
-                print(f"Failed to mark review {review_id} as failed (see stack traces above)")
+                logger.exception("Failed to mark review %s as failed", review_id)
+            return None
+
+
+@tracer.start_as_current_span("process_review_details")
+async def process_review_details(review_id: int, review_text: Optional[str] = None) -> None:
+    """
+    Phase 2 of a two-phase evaluation: generate the reasoning and feedback for a 'scored'
+    review and mark it processed. Does nothing if the review is no longer 'scored'. A
+    failure is logged and leaves the scores in place, so the details can be asked for again.
+    """
+    span = trace.get_current_span()
+    span.set_attribute("review.id", review_id)
+    bind_log_context(review_id=review_id)
+    async with AsyncSessionLocal() as db:
+        row = await get_review_by_id(db, review_id)
+    status = getattr(row["status"], "value", row["status"]) if row else None
+    if status != "scored":
+        logger.info("Review %s is %s, not scored; skipping details", review_id, status or "missing")
+        return
+    try:
+        evaluation = json.loads(row["llm_generated_score"])
+        from mcp.services.llm_service import get_llm_service
+
+        with charging_to(row.get("quota_subject")):
+            llm_out = await get_llm_service().evaluate_details(
+                review_text or row["review"], evaluation, max_attempts=10, review_id=review_id
+            )
+    except Exception as exc:
+        logger.warning("Details phase failed for review %s; scores kept: %s", review_id, exc)
+        span.record_exception(exc)
+        span.set_status(trace.Status(trace.StatusCode.ERROR, "Details phase failed"))
+        return
+
+    feedback, _, details_json, full_output_json = serialize_llm_output(llm_out)
+    try:
+        async with AsyncSessionLocal() as db:
+            # the stored phase-1 evaluation is kept as it was written
+            created_at = await store_review_output(
+                db, review_id, feedback, row["llm_generated_score"], details_json, full_output_json
+            )
+            await db.commit()
+    except Exception as exc:
+        logger.exception("Failed to store details for review %s", review_id)
+        span.record_exception(exc)
+        span.set_status(trace.Status(trace.StatusCode.ERROR, "Result write failed"))
+        return
+    REVIEW_TIME_TO_COMPLETE.observe(_seconds_since(created_at) or 0.0)
+    logger.info("Processed review id=%s (details)", review_id)
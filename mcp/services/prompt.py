@@ -1,4 +1,6 @@
-from typing import Dict, List
+import json
+import re
+from typing import Dict, List, Sequence
 
 # === Prompt ===
 
@@ -35,6 +37,11 @@ Each element of "scores" has:
 
 The JSON also contains the review of the previous round (if any) as an array under the "previous_round_review" key.
 
+Instead of "previous_round_review", a later-round input may contain:
+- "previous_round_evaluation": your earlier evaluation of this reviewer's previous round, as {dimension: {"score", "justification"}}
+- "changes_since_previous_round": what the reviewer changed since then: "changed" lists each edited question with its "awarded_points" as [before, after] and/or its "previous_comment" (the current comment is in "scores"); "unchanged_questions" counts the questions left as they were; "new_questions", "removed_questions" and "previous_additional_comment" appear when applicable.
+In that case, judge "Acted On" from the changes, re-assess the dimensions the changes affect, and keep the previous score and justification for dimensions they do not affect.
+
 Example Input Structure:
 
 {
@@ -167,6 +174,138 @@ def build_review_prompt(review_json: str) -> str:
     return f"{SYSTEM_PROMPT_TEMPLATE}\n{review_json.strip()}\n"
 
 
+# === Rubric-group prompts (LLM_EVALUATION_MODE="parallel") ===
+
+# Each group call gets only what it needs from SYSTEM_PROMPT_TEMPLATE: the role, the input
+# format, and the output format, rubric definitions and notes of its own dimensions. The
+# pieces are cut out of the template, so the two prompts cannot drift apart.
+_INPUT_MARKER = "Below is the input"
+_SECTIONS = SYSTEM_PROMPT_TEMPLATE.split("\n---\n")
+_ROLE = SYSTEM_PROMPT_TEMPLATE.split("\n\n")[1]
+_INPUT_FORMAT = next(s for s in _SECTIONS if s.lstrip().startswith("Input Format")).strip()
+# dimension -> its line in the rubric, and its score format in "Output Format"
+_RUBRIC_LINES = dict(re.findall(r"^\d+\. (.+?) – (.+)$", SYSTEM_PROMPT_TEMPLATE, re.MULTILINE))
+_SCORE_FORMATS = dict(re.findall(r'^ +"(.+?)": \{"score": (.+?), "justification"', SYSTEM_PROMPT_TEMPLATE, re.MULTILINE))
+_ACTED_ON_NOTES = SYSTEM_PROMPT_TEMPLATE[
+    SYSTEM_PROMPT_TEMPLATE.index('- For "Acted On":'):SYSTEM_PROMPT_TEMPLATE.index("\n\nCRITICAL")
+]
+
+RUBRIC_GROUP_PROMPT_TEMPLATE = """System / Role Instruction
+
+{role}
+
+Evaluate ONLY these rubric dimensions: {dimensions}
+The other dimensions and the student-facing feedback are produced separately.
+
+---
+
+{input_format}
+
+---
+
+Output Format
+
+Return ONLY a JSON object with exactly this structure and keys:
+
+{output_format}
+
+Notes:
+- Scores are integers from 1 to 10, where 1 = very poor / not present and 10 = excellent / fully present.
+{notes}
+CRITICAL: Return ONLY valid JSON. Do NOT wrap in markdown code blocks (no ```json or ```). Do NOT include any text before or after the JSON. Return the raw JSON object only.
+
+---
+
+Rubric
+
+{rubric}
+
+For each dimension, first write a few sentences of reasoning under "reasoning" (strengths,
+weaknesses and the rationale for the score), then give the final score and a short
+justification (1–3 sentences) under "evaluation". Remember: you are evaluating the quality
+of the **peer review**, not the original assignment.
+
+Below is the input
+"""
+
+FEEDBACK_PROMPT_TEMPLATE = """System / Role Instruction
+
+You are an impartial expert evaluator of student peer reviews in an academic setting. The peer review below has already been scored on a meta-evaluation rubric (scores 1–10, "N/A" for "Acted On" in round 1). Write the short, student-facing feedback summary for the reviewer: what the review does well and the most useful ways to improve it, consistent with the scores and justifications. Remember that you are giving feedback on the **peer review**, not the original assignment.
+
+Return ONLY a JSON object with a single key: {{"feedback": "string"}}. Do NOT wrap it in markdown code blocks.
+
+Rubric evaluation:
+{evaluation}
+
+Below is the input
+"""
+
+
+def _scoped_prompt(review_json: str, scope: str) -> str:
+    instructions, marker, _ = SYSTEM_PROMPT_TEMPLATE.rpartition(_INPUT_MARKER)
+    return f"{instructions}{scope}{marker}\n{review_json.strip()}\n"
+
+
+def build_rubric_group_prompt(review_json: str, dimensions: Sequence[str]) -> str:
+    """The review prompt cut down to `dimensions` (rubric names as in the output format)."""
+    reasoning = ",\n".join(f'    "{d}": "string"' for d in dimensions)
+    evaluation = ",\n".join(
+        f'    "{d}": {{"score": {_SCORE_FORMATS[d]}, "justification": "string"}}' for d in dimensions
+    )
+    prompt = RUBRIC_GROUP_PROMPT_TEMPLATE.format(
+        role=_ROLE,
+        dimensions=json.dumps(list(dimensions), ensure_ascii=False),
+        input_format=_INPUT_FORMAT,
+        output_format=f'{{\n  "reasoning": {{\n{reasoning}\n  }},\n  "evaluation": {{\n{evaluation}\n  }}\n}}',
+        notes=_ACTED_ON_NOTES + "\n" if "Acted On" in dimensions else "",
+        rubric="\n".join(f"{i}. {d} – {_RUBRIC_LINES[d]}" for i, d in enumerate(dimensions, start=1)),
+    )
+    return f"{prompt}\n{review_json.strip()}\n"
+
+
+def build_feedback_prompt(review_json: str, evaluation: Dict) -> str:
+    """Prompt for the feedback pass that runs over the merged rubric evaluation."""
+    return FEEDBACK_PROMPT_TEMPLATE.format(evaluation=json.dumps(evaluation, ensure_ascii=False)) + review_json.strip() + "\n"
+
+
+# === Two-phase prompts (LLM_TWO_PHASE_MODE) ===
+
+# Phase 1 returns the scores only; phase 2 writes the reasoning and feedback for those
+# scores. Both keep the full instructions so they share the prefix with the other calls.
+_SCORES_SCOPE = """---
+
+Scope of this request
+
+Return ONLY the "evaluation" object, as {"evaluation": {...}}, with all thirteen rubric
+dimensions in the format given in "Output Format". Keep each justification to one short
+sentence. Do NOT include "reasoning" or "feedback"; they are produced separately.
+
+"""
+
+_DETAILS_SCOPE = """---
+
+Scope of this request
+
+The review has already been scored; this is the final evaluation:
+{evaluation}
+
+Return a JSON object with exactly two top-level keys, "reasoning" (all thirteen rubric
+dimensions, in the format given in "Output Format") and "feedback". Explain and stay
+consistent with the scores above; do NOT change them or include "evaluation".
+
+"""
+
+
+def build_scores_prompt(review_json: str) -> str:
+    """Phase-1 prompt: the evaluation scores and short justifications only."""
+    return _scoped_prompt(review_json, _SCORES_SCOPE)
+
+
+def build_details_prompt(review_json: str, evaluation: Dict) -> str:
+    """Phase-2 prompt: reasoning and feedback for an evaluation made in phase 1."""
+    return _scoped_prompt(review_json, _DETAILS_SCOPE.format(evaluation=json.dumps(evaluation, ensure_ascii=False)))
+
+
 def build_chat_messages(review_json: str) -> List[Dict[str, str]]:
     """
     Build chat-style messages for APIs expecting the 'messages' format.
@@ -0,0 +1,95 @@
+# mcp/services/retry_scheduler.py
+import asyncio
+import logging
+from typing import Optional
+
+from mcp.db.session import AsyncSessionLocal
+from mcp.db.crud import claim_due_failed_jobs
+from mcp.services.heartbeat import instance_id
+from mcp.services.utils import enqueue_review
+from mcp.services.review_queue import Priority, get_review_queue
+import mcp.config as config
+
+logger = logging.getLogger(__name__)
+
+
+class FailedJobRetryScheduler:
+    """
+    Background loop that polls failed_jobs for retries that are due and re-enqueues
+    them through enqueue_review. Backoff and dead-lettering are decided when
+    the failure is recorded (see crud.record_failed_job); this loop only claims due jobs.
+    """
+
+    def __init__(
+        self,
+        poll_interval: float = config.FAILED_JOB_POLL_INTERVAL,
+        batch_size: int = config.FAILED_JOB_BATCH_SIZE,
+        lease_seconds: float = config.FAILED_JOB_LEASE_SECONDS,
+    ):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the polling loop on the running event loop (no-op if already running)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancel the polling loop and wait for it to exit."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_once(self) -> int:
+        """Claim due failed jobs and schedule them. Returns the number of jobs re-enqueued."""
+        # leave jobs in failed_jobs rather than overfilling the queue; they stay due
+        limit = min(self.batch_size, get_review_queue().room(Priority.reprocess))
+        if limit <= 0:
+            return 0
+        async with AsyncSessionLocal() as db:
+            jobs = await claim_due_failed_jobs(db, limit, self.lease_seconds, instance_id())
+        for job in jobs:
+            logger.info(
+                "Retrying review %s (failed job %s, attempt %s)",
+                job["review_id"], job["failed_job_id"], job["attempts"] + 1,
+            )
+            await enqueue_review(
+                job["review_id"],
+                job["review"],
+                priority=Priority.reprocess,
+                course_name=job["course_name"],
+                assignment_name=job["assignment_name"],
+                trace_id=job["trace_id"],
+            )
+        return len(jobs)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                claimed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed-job retry poll failed")
+                claimed = 0
+            # a full batch means more jobs are probably due; poll again right away
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+
+_retry_scheduler_instance: Optional[FailedJobRetryScheduler] = None
+
+
+def get_retry_scheduler() -> FailedJobRetryScheduler:
+    """Return the single shared FailedJobRetryScheduler instance."""
+    global _retry_scheduler_instance
+    if _retry_scheduler_instance is None:
+        _retry_scheduler_instance = FailedJobRetryScheduler()
+    return _retry_scheduler_instance
@@ -0,0 +1,381 @@
+# mcp/services/review_queue.py
+import asyncio
+import contextvars
+import enum
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import mcp.config as config
+from mcp.core.metrics import QUEUE_WAIT
+from mcp.core.tracing import record_span
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(enum.IntEnum):
+    """Priority classes for LLM work; lower value is served first."""
+    interactive = 0  # synchronous /api/review/llmreview calls
+    fresh = 1        # newly submitted reviews
+    reprocess = 2    # /trigger, failed-job retries and backfills
+
+
+class QueueFull(Exception):
+    """Raised by ReviewQueue.submit when admission limits are reached."""
+
+    def __init__(self, priority: "Priority", retry_after: int):
+        super().__init__(f"LLM work queue is full for class '{priority.name}'")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class QueueClosed(Exception):
+    """Raised by ReviewQueue.submit once the queue is draining for shutdown."""
+
+
+def tenant_key(course_name: Optional[str], assignment_name: Optional[str]) -> str:
+    """Fair-queuing key for a review: one tenant per course/assignment pair."""
+    return f"{course_name or '-'}/{assignment_name or '-'}"
+
+
+@dataclass
+class _Job:
+    run: Callable[[], Awaitable[Any]]
+    priority: Priority
+    tenant: str
+    enqueued_at: float
+    future: asyncio.Future
+    key: Any = None  # caller's identifier (review id) reported back by drain()
+    # the submitter's contextvars (active trace span), restored when the job runs
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+
+class _FairQueue:
+    """
+    Weighted fair queue across tenants (start-time fair queuing).
+    Each backlogged tenant gets a virtual finish tag advanced by 1/weight per job,
+    and the job with the smallest tag is served next, so a tenant with thousands of
+    queued jobs only gets its weighted share while others are waiting.
+    """
+
+    def __init__(self, weights: Dict[str, float]):
+        self._weights = weights
+        self._backlog: Dict[str, Deque[_Job]] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._vtime = 0.0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _cost(self, tenant: str) -> float:
+        return 1.0 / max(self._weights.get(tenant, 1.0), 1e-6)
+
+    def push(self, job: _Job) -> None:
+        backlog = self._backlog.get(job.tenant)
+        if backlog is None:
+            # tenant was idle: it starts at the current virtual time, no banked credit
+            backlog = self._backlog[job.tenant] = deque()
+            heapq.heappush(self._heap, (self._vtime + self._cost(job.tenant), next(self._seq), job.tenant))
+        backlog.append(job)
+        self._size += 1
+
+    def pop(self) -> Optional[_Job]:
+        while self._heap:
+            tag, _, tenant = heapq.heappop(self._heap)
+            backlog = self._backlog[tenant]
+            self._vtime = tag
+            job = backlog.popleft()
+            self._size -= 1
+            if backlog:
+                heapq.heappush(self._heap, (tag + self._cost(tenant), next(self._seq), tenant))
+            else:
+                del self._backlog[tenant]
+            if job.future.cancelled():
+                # caller gave up while queued (e.g. HTTP client disconnected)
+                continue
+            return job
+        return None
+
+    def tenants(self) -> Dict[str, int]:
+        return {tenant: len(backlog) for tenant, backlog in self._backlog.items()}
+
+    def clear(self) -> List[_Job]:
+        """Remove and return every queued job that has not been cancelled."""
+        jobs = [job for backlog in self._backlog.values() for job in backlog if not job.future.cancelled()]
+        self._backlog.clear()
+        self._heap.clear()
+        self._size = 0
+        return jobs
+
+
+@dataclass
+class _WaitStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    recent: Deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.recent.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.recent)
+
+        def pct(p: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 4)
+
+        return {
+            "count": self.count,
+            "avg_seconds": round(self.total_seconds / self.count, 4) if self.count else None,
+            "max_seconds": round(self.max_seconds, 4),
+            "p50_seconds": pct(0.50),
+            "p95_seconds": pct(0.95),
+        }
+
+
+class ReviewQueue:
+    """
+    In-process scheduler for LLM work shared by background review processing and the
+    interactive endpoint. Runs at most `concurrency` jobs at once; classes are served in
+    strict Priority order, with `interactive_reserved` slots that only interactive work
+    may use, and jobs inside a class are interleaved fairly across tenants.
+    Admission is bounded: at most `max_depth` background jobs and `interactive_max_queued`
+    interactive calls may wait; beyond that submit() raises QueueFull.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = config.LLM_WORKER_CONCURRENCY,
+        interactive_reserved: int = config.LLM_INTERACTIVE_RESERVED,
+        tenant_weights: Optional[Dict[str, float]] = None,
+        max_depth: int = config.LLM_QUEUE_MAX_DEPTH,
+        interactive_max_queued: int = config.LLM_INTERACTIVE_MAX_QUEUED,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.interactive_reserved = min(max(0, interactive_reserved), self.concurrency - 1)
+        self.max_depth = max(0, max_depth)
+        self.interactive_max_queued = max(0, interactive_max_queued)
+        # moving average of job run time, used to estimate Retry-After
+        self._avg_run_seconds = 10.0
+        weights = tenant_weights if tenant_weights is not None else config.QUEUE_TENANT_WEIGHTS
+        self._queues: Dict[Priority, _FairQueue] = {p: _FairQueue(weights) for p in Priority}
+        self._wait_stats: Dict[Priority, _WaitStats] = {p: _WaitStats() for p in Priority}
+        self._running: Dict[asyncio.Task, _Job] = {}
+        self._running_background = 0
+        self._closed = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the dispatcher on the running event loop (no-op if already running)."""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        """Stop dispatching and cancel running jobs."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for task in list(self._running):
+            task.cancel()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def close(self) -> None:
+        """Stop admitting work; submit() raises QueueClosed from now on."""
+        self._closed = True
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    async def drain(self, timeout: float) -> List[Tuple[Any, Priority]]:
+        """
+        Graceful shutdown: stop admitting work, drop queued jobs, and give running jobs up
+        to `timeout` seconds to finish. Jobs still running after that are cancelled.
+        Returns (key, priority) for every job that was dropped or cancelled so the caller
+        can checkpoint it for another process to resume.
+        """
+        self.close()
+        unfinished: List[Tuple[Any, Priority]] = []
+        for queue in self._queues.values():
+            for job in queue.clear():
+                unfinished.append((job.key, job.priority))
+                job.future.cancel()
+
+        if self._running:
+            logger.info("Draining %d in-flight LLM jobs (timeout %.1fs)", len(self._running), timeout)
+            _, pending = await asyncio.wait(set(self._running), timeout=timeout)
+            if pending:
+                logger.warning("Cancelling %d LLM jobs still running after drain timeout", len(pending))
+                for task in pending:
+                    unfinished.append((self._running[task].key, self._running[task].priority))
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        await self.stop()
+        return unfinished
+
+    def submit(
+        self,
+        run: Callable[[], Awaitable[Any]],
+        priority: Priority,
+        tenant: str,
+        key: Any = None,
+    ) -> asyncio.Future:
+        """
+        Queue a coroutine factory and return a future for its result.
+        Cancelling the future drops the job if it is still queued, or cancels it if running.
+        Raises QueueClosed while draining and QueueFull if the class is at its admission limit.
+        """
+        if self._closed:
+            raise QueueClosed("LLM work queue is shutting down")
+        if self.room(priority) <= 0:
+            raise QueueFull(priority, self.retry_after(priority))
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].push(_Job(run, priority, tenant, time.monotonic(), future, key))
+        self._wakeup.set()
+        return future
+
+    async def run(self, run: Callable[[], Awaitable[Any]], priority: Priority, tenant: str) -> Any:
+        """Submit a job and wait for its result (used by the interactive endpoint)."""
+        return await self.submit(run, priority, tenant)
+
+    def depth(self) -> int:
+        """Number of queued (not yet running) jobs across all classes."""
+        return sum(len(q) for q in self._queues.values())
+
+    def background_depth(self) -> int:
+        return sum(len(q) for p, q in self._queues.items() if p != Priority.interactive)
+
+    def room(self, priority: Priority) -> int:
+        """How many more jobs of this class can be admitted right now."""
+        if priority == Priority.interactive:
+            return self.interactive_max_queued - len(self._queues[Priority.interactive])
+        return self.max_depth - self.background_depth()
+
+    def retry_after(self, priority: Priority) -> int:
+        """Rough seconds until a job of this class could be admitted, for Retry-After."""
+        queued = len(self._queues[priority]) if priority == Priority.interactive else self.background_depth()
+        return max(1, math.ceil(queued * self._avg_run_seconds / self.concurrency))
+
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "interactive_reserved": self.interactive_reserved,
+            "max_depth": self.max_depth,
+            "interactive_max_queued": self.interactive_max_queued,
+            "closed": self._closed,
+            "in_flight": self.in_flight(),
+            "queued": self.depth(),
+            "avg_run_seconds": round(self._avg_run_seconds, 3),
+            "classes": {
+                p.name: {
+                    "queued": len(self._queues[p]),
+                    "tenants": self._queues[p].tenants(),
+                    "wait": self._wait_stats[p].snapshot(),
+                }
+                for p in Priority
+            },
+        }
+
+    def _next_job(self) -> Optional[_Job]:
+        if len(self._running) >= self.concurrency:
+            return None
+        background_slots = self.concurrency - self.interactive_reserved
+        for priority in Priority:
+            if priority != Priority.interactive and self._running_background >= background_slots:
+                break
+            job = self._queues[priority].pop()
+            if job is not None:
+                return job
+        return None
+
+    async def _dispatch(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while (job := self._next_job()) is not None:
+                self._start(job)
+
+    def _start(self, job: _Job) -> None:
+        started_at = time.monotonic()
+        waited = started_at - job.enqueued_at
+        self._wait_stats[job.priority].observe(waited)
+        QUEUE_WAIT.labels(job.priority.name).observe(waited)
+        now_ns = time.time_ns()
+        job.context.run(
+            record_span, "review_queue.wait", now_ns - int(waited * 1e9), now_ns,
+            {"queue.priority": job.priority.name, "queue.tenant": job.tenant},
+        )
+        task = asyncio.get_running_loop().create_task(job.run(), context=job.context)
+        self._running[task] = job
+        background = job.priority != Priority.interactive
+        if background:
+            self._running_background += 1
+
+        def _on_future_done(fut: asyncio.Future) -> None:
+            if fut.cancelled() and not task.done():
+                task.cancel()
+
+        def _on_task_done(t: asyncio.Task) -> None:
+            self._running.pop(t, None)
+            self._avg_run_seconds = 0.9 * self._avg_run_seconds + 0.1 * (time.monotonic() - started_at)
+            if background:
+                self._running_background -= 1
+            if not job.future.done():
+                if t.cancelled():
+                    job.future.cancel()
+                elif t.exception() is not None:
+                    job.future.set_exception(t.exception())
+                else:
+                    job.future.set_result(t.result())
+            elif not t.cancelled() and t.exception() is not None:
+                logger.error("Queued job failed after its caller gave up", exc_info=t.exception())
+            self._wakeup.set()
+
+        job.future.add_done_callback(_on_future_done)
+        task.add_done_callback(_on_task_done)
+
+
+_review_queue_instance: Optional[ReviewQueue] = None
+
+
+def get_review_queue() -> ReviewQueue:
+    """Return the single shared ReviewQueue instance."""
+    global _review_queue_instance
+    if _review_queue_instance is None:
+        _review_queue_instance = ReviewQueue()
+    return _review_queue_instance
+
+
+def configure_review_queue(**kwargs: Any) -> ReviewQueue:
+    """
+    Replace the shared ReviewQueue with one built from explicit settings (used by worker
+    processes, which size concurrency and prefetch from their command line). Call before
+    anything is submitted.
+    """
+    global _review_queue_instance
+    _review_queue_instance = ReviewQueue(**kwargs)
+    return _review_queue_instance
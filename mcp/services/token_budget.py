@@ -0,0 +1,258 @@
+# mcp/services/token_budget.py
+"""
+Token budget for the review input sent to the LLM (REVIEW_INPUT_TOKEN_BUDGET).
+
+Oversized reviews make every attempt slow and expensive and, past the model's context
+limit, make every retry fail the same way. fit_review() renders a ReviewPayload and,
+when it is over budget, cuts it down in priority order:
+
+  1. previous_round_review: strings in it are capped ever shorter, then it is dropped;
+  2. repeated text: sentences already said earlier in the current round are removed;
+  3. last resort: the longest current-round comments are shortened (head and tail kept).
+
+Scores, questions and points of the current round are never cut. Every cut is reported
+so it can be stored on the review row (reviews_table.input_truncation).
+
+fit_review_json() does the same for a review that arrives as JSON text (POST /llmreview),
+so the text sent on is still valid JSON; only free text is cut with truncate_to_budget().
+"""
+import json
+import logging
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from mcp.core.metrics import REVIEW_INPUT_CUTS
+from mcp.schemas import ReviewPayload
+from mcp.services.utils import _previous_round, build_review_text
+import mcp.config as config
+
+logger = logging.getLogger(__name__)
+
+_PIECES = re.compile(r"[^\W\d_]+|\d+|\s*\n\s*|[^\w\s]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# character caps tried, in order, for each string inside previous_round_review
+_PREVIOUS_ROUND_CAPS = (400, 200, 80, 20)
+# current-round comments are never shortened below this many characters
+_MIN_COMMENT_CHARS = 80
+# fields of a JSON review (API payload or the prompt's input schema) that fit_review renders;
+# any other top-level field is passed through uncut
+_PAYLOAD_FIELDS = {
+    "response_id_of_expertiza", "course_name", "assignment_name", "round", "reviewer_id", "reviewee_id",
+    "scores", "additional_comment", "previous_round_review", "previousRoundReview",
+}
+_ELLIPSIS = " [...] "
+_REPEATED = "[repeats earlier comment]"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough BPE-like count: words in ~6-char pieces, digits in threes, punctuation in pairs."""
+    count = 0
+    for piece in _PIECES.findall(text):
+        if piece[0].isdigit():
+            count += math.ceil(len(piece) / 3)
+        elif piece[0].isalpha():
+            count += math.ceil(len(piece) / 6)
+        elif piece.strip():
+            count += math.ceil(len(piece) / 2)
+        else:
+            count += 1  # a newline run, with its indentation
+    return count
+
+
+def shorten(text: str, max_chars: int) -> str:
+    """Keep the head and tail of `text` within max_chars, marking the cut."""
+    if len(text) <= max_chars:
+        return text
+    keep = max(max_chars - len(_ELLIPSIS), 2)
+    head = keep * 2 // 3
+    return text[:head].rstrip() + _ELLIPSIS + text[len(text) - (keep - head):].lstrip()
+
+
+def truncate_to_budget(text: str, max_tokens: int) -> str:
+    """Shorten free text (head and tail kept) until its estimate is within max_tokens."""
+    tokens = estimate_tokens(text)
+    while tokens > max_tokens and len(text) > len(_ELLIPSIS) + 2:
+        text = shorten(text, int(len(text) * max_tokens / tokens * 0.95))
+        tokens = estimate_tokens(text)
+    return text
+
+
+def _cap_strings(value: Any, max_chars: int) -> Any:
+    if isinstance(value, str):
+        return shorten(value, max_chars)
+    if isinstance(value, list):
+        return [_cap_strings(v, max_chars) for v in value]
+    if isinstance(value, dict):
+        return {k: _cap_strings(v, max_chars) for k, v in value.items()}
+    return value
+
+
+def _dedupe_sentences(text: str, seen: set) -> str:
+    kept = []
+    for sentence in _SENTENCE_END.split(text):
+        key = " ".join(sentence.lower().split())
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        kept.append(sentence)
+    return " ".join(kept) if kept else _REPEATED
+
+
+class _Fitter:
+    def __init__(self, payload: ReviewPayload, max_tokens: int, input_format: Optional[str],
+                 extra: Optional[Dict[str, Any]]):
+        self.payload = payload
+        self.max_tokens = max_tokens
+        self.input_format = input_format
+        self.extra = extra
+        self.cuts: List[Dict[str, Any]] = []
+        self.text = self.render(payload)
+        self.tokens = estimate_tokens(self.text)
+
+    def render(self, payload: ReviewPayload) -> str:
+        return build_review_text(payload, self.input_format, self.extra)
+
+    def over(self) -> bool:
+        return self.tokens > self.max_tokens
+
+    def apply(self, action: str, field: str, payload: ReviewPayload, **detail: Any) -> None:
+        text = self.render(payload)
+        tokens = estimate_tokens(text)
+        self.cuts.append({"action": action, "field": field, "tokens_saved": self.tokens - tokens, **detail})
+        REVIEW_INPUT_CUTS.labels(action).inc()
+        self.payload, self.text, self.tokens = payload, text, tokens
+
+    def trim_previous_round(self) -> None:
+        previous = self.payload.previous_round_review
+        if not previous:
+            return
+        previous = _previous_round(previous)
+        for cap in _PREVIOUS_ROUND_CAPS:
+            candidate = self.payload.model_copy(update={"previous_round_review": _cap_strings(previous, cap)})
+            if estimate_tokens(self.render(candidate)) <= self.max_tokens:
+                self.apply("trimmed", "previous_round_review", candidate, max_chars=cap)
+                return
+        self.apply("dropped", "previous_round_review", self.payload.model_copy(update={"previous_round_review": None}))
+
+    def dedupe_current_round(self) -> None:
+        seen: set = set()
+        scores = []
+        for item in self.payload.scores or []:
+            comments = _dedupe_sentences(item.comments, seen) if item.comments else item.comments
+            scores.append(item.model_copy(update={"comments": comments}))
+        additional = self.payload.additional_comment
+        if additional:
+            additional = _dedupe_sentences(additional, seen)
+        candidate = self.payload.model_copy(
+            update={"scores": scores if self.payload.scores is not None else None, "additional_comment": additional}
+        )
+        if self.render(candidate) != self.text:
+            self.apply("deduplicated", "current_round", candidate)
+
+    def shorten_current_round(self) -> None:
+        # binary search for the largest per-comment cap that fits
+        texts = [s.comments or "" for s in self.payload.scores or []] + [self.payload.additional_comment or ""]
+        low, high = _MIN_COMMENT_CHARS, max(len(t) for t in texts)
+        best = self._with_comment_cap(low)
+        while low < high:
+            mid = (low + high + 1) // 2
+            candidate = self._with_comment_cap(mid)
+            if estimate_tokens(self.render(candidate)) <= self.max_tokens:
+                low, best = mid, candidate
+            else:
+                high = mid - 1
+        if self.render(best) != self.text:
+            self.apply("shortened", "current_round", best, max_chars=low)
+
+    def _with_comment_cap(self, max_chars: int) -> ReviewPayload:
+        scores = None
+        if self.payload.scores is not None:
+            scores = [
+                s.model_copy(update={"comments": shorten(s.comments, max_chars) if s.comments else s.comments})
+                for s in self.payload.scores
+            ]
+        additional = self.payload.additional_comment
+        return self.payload.model_copy(
+            update={"scores": scores, "additional_comment": shorten(additional, max_chars) if additional else additional}
+        )
+
+
+def fit_review(
+    payload: ReviewPayload,
+    max_tokens: Optional[int] = None,
+    input_format: Optional[str] = None,
+    extra: Optional[Dict[str, Any]] = None,
+) -> Tuple[str, int, List[Dict[str, Any]]]:
+    """
+    Render `payload` for the LLM within max_tokens (default REVIEW_INPUT_TOKEN_BUDGET;
+    0 disables the budget). Returns (review_text, estimated tokens, cuts), where each cut
+    is {"action", "field", "tokens_saved", ...}; cuts is empty when nothing was removed.
+    `extra` is passed to build_review_text and never cut.
+    May still return more than max_tokens if the scores alone exceed it.
+    """
+    max_tokens = config.REVIEW_INPUT_TOKEN_BUDGET if max_tokens is None else max_tokens
+    fitter = _Fitter(payload, max_tokens, input_format, extra)
+    if max_tokens <= 0 or not fitter.over():
+        return fitter.text, fitter.tokens, []
+
+    original = fitter.tokens
+    for step in (fitter.trim_previous_round, fitter.dedupe_current_round, fitter.shorten_current_round):
+        if not fitter.over():
+            break
+        step()
+    if fitter.over():
+        logger.warning("Review input still %d tokens after cuts (budget %d)", fitter.tokens, max_tokens)
+    logger.info("Review input cut from ~%d to ~%d tokens: %s", original, fitter.tokens,
+                ", ".join(f"{c['action']} {c['field']}" for c in fitter.cuts))
+    return fitter.text, fitter.tokens, fitter.cuts
+
+
+def fit_review_json(
+    data: Dict[str, Any], max_tokens: Optional[int] = None
+) -> Tuple[str, int, List[Dict[str, Any]]]:
+    """
+    fit_review for a review received as a JSON object, either a ReviewPayload or the
+    prompt's input schema (services/utils.py review_input: "comment", "previous_round_review").
+    Returns minified JSON like fit_review with input_format "json"; top-level fields
+    outside the review are kept uncut after it. An object that is not a review (no scores
+    or additional_comment, or invalid ones) has its strings capped ever shorter instead
+    (one "shortened" cut), so the result stays JSON.
+    """
+    max_tokens = config.REVIEW_INPUT_TOKEN_BUDGET if max_tokens is None else max_tokens
+    review = {k: v for k, v in data.items() if k in _PAYLOAD_FIELDS}
+    extra = {k: v for k, v in data.items() if k not in _PAYLOAD_FIELDS}
+    if not review.keys() & {"scores", "additional_comment"}:
+        return _cap_json(data, max_tokens)
+    if "previous_round_review" in review:
+        review["previousRoundReview"] = review.pop("previous_round_review")
+    if isinstance(review.get("scores"), list):
+        review["scores"] = [
+            {"comments": s.get("comment"), **s} if isinstance(s, dict) and "comments" not in s else s
+            for s in review["scores"]
+        ]
+    review.setdefault("response_id_of_expertiza", "")  # not part of the rendered input
+    try:
+        payload = ReviewPayload.model_validate(review)
+    except ValidationError:
+        return _cap_json(data, max_tokens)
+    return fit_review(payload, max_tokens, input_format="json", extra=extra or None)
+
+
+def _cap_json(data: Any, max_tokens: int) -> Tuple[str, int, List[Dict[str, Any]]]:
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    tokens = estimate_tokens(text)
+    if max_tokens <= 0 or tokens <= max_tokens:
+        return text, tokens, []
+    original = tokens
+    for cap in _PREVIOUS_ROUND_CAPS:
+        text = json.dumps(_cap_strings(data, cap), ensure_ascii=False, separators=(",", ":"))
+        tokens = estimate_tokens(text)
+        if tokens <= max_tokens:
+            break
+    REVIEW_INPUT_CUTS.labels("shortened").inc()
+    return text, tokens, [{"action": "shortened", "field": "review_text", "tokens_saved": original - tokens,
+                           "max_chars": cap}]
@@ -1,22 +1,188 @@
-from typing import Optional, Any
+from typing import Optional, Any, Dict, Tuple
 import asyncio
-from typing import Any
-from mcp.services.orchestrator import process_review_and_update
+import json
+import logging
+from mcp.services.orchestrator import process_review_and_update, process_review_details
+from mcp.services.review_queue import Priority, QueueClosed, QueueFull, get_review_queue, tenant_key
+from mcp.db.session import AsyncSessionLocal
+from mcp.db.crud import defer_review
 from mcp.schemas import ReviewPayload
+from mcp.core.rate_limit import current_quota_subject
+from mcp.core.tracing import tracer, use_trace
+import mcp.config as config
 
-async def schedule_process_review(review_id: int, review_text: str) -> None:
+logger = logging.getLogger(__name__)
+
+
+def _log_job_failure(fut: asyncio.Future) -> None:
+    if not fut.cancelled() and fut.exception() is not None:
+        logger.error("Background review job crashed", exc_info=fut.exception())
+
+
+async def schedule_process_review(
+    review_id: int,
+    review_text: str,
+    priority: Priority = Priority.fresh,
+    course_name: Optional[str] = None,
+    assignment_name: Optional[str] = None,
+    traceparent: Optional[str] = None,
+) -> None:
     """
-    Async helper that schedules the worker on the running event loop.
+    Async helper that hands the worker to the shared ReviewQueue on the running event loop.
     Make this async so FastAPI's BackgroundTasks will await/schedule it on the server loop.
+    With REVIEW_EXECUTION_MODE="worker" the API does no LLM work itself: the review is
+    deferred in the database for the dedicated worker processes (python -m mcp.worker).
+    `traceparent` is the request's span; BackgroundTasks run after the handler's span ended.
+    """
+    with use_trace(traceparent), tracer.start_as_current_span(
+        "schedule_process_review", attributes={"review.id": review_id, "review.priority": priority.name}
+    ):
+        if config.REVIEW_EXECUTION_MODE == "worker":
+            async with AsyncSessionLocal() as db:
+                await defer_review(db, review_id, priority, current_quota_subject())
+            return
+        await enqueue_review(review_id, review_text, priority, course_name, assignment_name)
+
+
+async def enqueue_review(
+    review_id: int,
+    review_text: str,
+    priority: Priority = Priority.fresh,
+    course_name: Optional[str] = None,
+    assignment_name: Optional[str] = None,
+    trace_id: Optional[str] = None,
+) -> None:
+    """
+    Submit process_review_and_update to this process's ReviewQueue, which runs it by
+    priority class, interleaved fairly across course/assignment.
+    If the queue is at its admission limit (or draining for shutdown) the review is deferred
+    in the database instead; a backlog feeder schedules it once there is room.
+    `trace_id` (from the review row) links deferred and retried runs to the review's last trace.
+    """
+    # queue the real worker coroutine without awaiting it; the job keeps the current trace context
+    try:
+        with use_trace(trace_id=trace_id):
+            future = get_review_queue().submit(
+                lambda: process_review_and_update(review_id, review_text),
+                priority,
+                tenant_key(course_name, assignment_name),
+                key=review_id,
+            )
+    except (QueueFull, QueueClosed) as exc:
+        logger.info("Deferring review %s: %s", review_id, exc)
+        async with AsyncSessionLocal() as db:
+            await defer_review(db, review_id, priority, current_quota_subject())
+        return
+    future.add_done_callback(_log_job_failure)
+
+
+# review id -> (priority, future) of its queued or running details job
+_details_jobs: Dict[int, Tuple[Priority, asyncio.Future]] = {}
+
+
+def request_review_details(
+    review_id: int,
+    review_text: Optional[str] = None,
+    priority: Priority = Priority.reprocess,
+) -> Optional[asyncio.Future]:
+    """
+    Queue phase 2 of a two-phase evaluation (process_review_details) for a 'scored' review.
+    A job already queued or running for the review at the same or a higher priority is
+    shared instead of starting another; callers waiting on the future should shield it.
+    Background requests are not checkpointed on shutdown: the review stays 'scored' and its
+    details can be asked for again. Returns None if the queue has no room for a background
+    request; interactive requests raise QueueFull/QueueClosed like /llmreview.
     """
-    # get_running_loop should succeed when called by FastAPI in async context
-    loop = asyncio.get_running_loop()
-    # debug print (optional)
-    print("schedule_process_review loop id:", id(loop))
-    # schedule the real worker coroutine without awaiting it
-    loop.create_task(process_review_and_update(review_id, review_text))
-
-def build_review_text(payload: ReviewPayload) -> str:
+    existing = _details_jobs.get(review_id)
+    if existing is not None and existing[0] <= priority and not existing[1].done():
+        return existing[1]
+    try:
+        future = get_review_queue().submit(
+            lambda: process_review_details(review_id, review_text),
+            priority,
+            # one tenant for all background details jobs, so they take turns with other reprocessing
+            "interactive" if priority == Priority.interactive else "details",
+        )
+    except (QueueFull, QueueClosed) as exc:
+        if priority == Priority.interactive:
+            raise
+        logger.info("Review %s left scored, details not queued: %s", review_id, exc)
+        return None
+    _details_jobs[review_id] = (priority, future)
+
+    def _forget(fut: asyncio.Future) -> None:
+        if _details_jobs.get(review_id, (None, None))[1] is fut:
+            del _details_jobs[review_id]
+
+    future.add_done_callback(_forget)
+    future.add_done_callback(_log_job_failure)
+    return future
+
+
+def _previous_round(value: Any) -> Any:
+    """previous_round_review as JSON data: strings holding JSON are decoded, other strings kept."""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def review_input(payload: ReviewPayload) -> Dict[str, Any]:
+    """
+    The review as the JSON object documented in the system prompt's "Input Format".
+    Absent optional fields are left out rather than sent as null.
+    """
+    data: Dict[str, Any] = {}
+    if payload.course_name:
+        data["course_name"] = payload.course_name
+    if payload.assignment_name:
+        data["assignment_name"] = payload.assignment_name
+    if payload.round is not None:
+        data["round"] = payload.round
+    if payload.scores:
+        scores = []
+        for i, s in enumerate(payload.scores, start=1):
+            item = {
+                "question": s.question or f"Question {i}",
+                "type": s.type,
+                "max_points": s.max_points,
+                "awarded_points": s.awarded_points,
+            }
+            if s.comments:
+                item["comment"] = s.comments
+            scores.append(item)
+        data["scores"] = scores
+    if payload.additional_comment:
+        data["additional_comment"] = payload.additional_comment
+    if payload.previous_round_review:
+        data["previous_round_review"] = _previous_round(payload.previous_round_review)
+    return data
+
+
+def build_review_text(
+    payload: ReviewPayload,
+    input_format: Optional[str] = None,
+    extra: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Render a review for the LLM in REVIEW_INPUT_FORMAT (or `input_format`):
+    "json" is minified JSON in the prompt's documented input schema; it is deterministic
+    (fixed key order, no response id), so identical reviews give identical prompts.
+    "prose" is the older labelled-text rendering.
+    `extra` adds top-level input fields after the review (e.g. the previous-round digest
+    from services/incremental.py).
+    """
+    if (input_format or config.REVIEW_INPUT_FORMAT) == "prose":
+        return _build_review_prose(payload, extra)
+    data = review_input(payload)
+    if extra:
+        data.update(extra)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _build_review_prose(payload: ReviewPayload, extra: Optional[Dict[str, Any]] = None) -> str:
     parts: list[str] = []
 
     # Course / assignment metadata
@@ -50,7 +216,11 @@ def build_review_text(payload: ReviewPayload) -> str:
 
     if payload.previous_round_review:
         parts.append("Previous round review:")
-        parts.append(payload.previous_round_review)
+        parts.append(str(payload.previous_round_review))
+
+    for key, value in (extra or {}).items():
+        parts.append(key.replace("_", " ").capitalize() + ":")
+        parts.append(json.dumps(value, ensure_ascii=False))
 
     # Join with double newlines to keep things readable for the LLM
     return "\n\n".join(parts)
@@ -0,0 +1,137 @@
+# mcp/test/auth_benchmark.py
+"""
+Per-request cost of bearer-token verification (mcp/core/auth.py), in microseconds.
+
+    python -m mcp.test.auth_benchmark
+    python -m mcp.test.auth_benchmark --json auth.json
+
+Cases:
+  dev_stub                 AUTH_MODE="dev" string check
+  cache_hit                token already verified (the common case for a busy client)
+  rs256_verify[cold]       JWKS key lookup + RS256 signature and claim checks (cache miss)
+  hs256_verify[cold]       SECRET_KEY HMAC verification (cache miss)
+  verify_jwt[cache_hit]    the FastAPI dependency end to end, including the await
+  introspection[cold]      opaque token resolved by the fake SSO's /introspect, served
+                           in-process over httpx's ASGI transport (no network; a real IdP
+                           adds a round trip on top)
+  introspection[cache_hit] the same opaque token again
+
+Cold cases mint fresh tokens ahead of time so every op misses the cache.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+from typing import Callable, Dict, List
+
+import httpx
+from fastapi import Request
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+
+import mcp.config as config
+from mcp.core.auth import TokenVerifier, verify_jwt
+import mcp.core.auth as auth
+from mcp.test.benchmarks import Case, measure
+from mcp.test.fake_sso_server import AUDIENCE, ISSUER, FakeSSO, create_app
+
+_HS_SECRET = "benchmark-secret-key-benchmark-secret-key"
+
+
+def _fresh(tokens: List[str]) -> Callable[[], str]:
+    # cycle through many distinct tokens; with the cache cleared each op is a miss
+    return itertools.cycle(tokens).__next__
+
+
+def build_cases(loop: asyncio.AbstractEventLoop, sso: FakeSSO, cold_tokens: int) -> List[Case]:
+    transport = httpx.ASGITransport(app=create_app(sso))
+    client = httpx.AsyncClient(transport=transport, base_url="http://sso.local")
+    verifier = TokenVerifier(
+        jwks_url=None,
+        algorithms=["RS256", "HS256"],
+        issuer=ISSUER,
+        audience=AUDIENCE,
+        secret_key=_HS_SECRET,
+        introspection_url="http://sso.local/introspect",
+        client=client,
+    )
+    verifier.set_keys(sso.jwks())
+    auth._token_verifier_instance = verifier
+
+    hot = sso.mint()
+    verifier.verify_local(hot)
+    rs_next = _fresh([sso.mint(sub=f"user{i}") for i in range(cold_tokens)])
+    hs_next = _fresh([
+        jwt.encode(sso.claims(f"user{i}", 3600, "instructor"), _HS_SECRET, algorithm="HS256")
+        for i in range(cold_tokens)
+    ])
+    opaque = sso.mint_opaque()
+    loop.run_until_complete(verifier.authenticate(opaque))
+    opaque_next = _fresh([sso.mint_opaque(sub=f"user{i}") for i in range(cold_tokens)])
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=hot)
+    dev_credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials="dev")
+
+    def request() -> Request:
+        # a fresh request each time, so the per-request outcome in its state is not reused
+        return Request({"type": "http", "headers": []})
+
+    def cold(func: Callable[[str], object], next_token: Callable[[], str]) -> Callable[[], object]:
+        def run():
+            verifier._cache.clear()
+            return func(next_token())
+        return run
+
+    def run_dev():
+        previous, config.AUTH_MODE = config.AUTH_MODE, "dev"
+        try:
+            return loop.run_until_complete(verify_jwt(request(), dev_credentials))
+        finally:
+            config.AUTH_MODE = previous
+
+    def run_dependency():
+        previous, config.AUTH_MODE = config.AUTH_MODE, "jwt"
+        try:
+            return loop.run_until_complete(verify_jwt(request(), credentials))
+        finally:
+            config.AUTH_MODE = previous
+
+    return [
+        Case("dev_stub", run_dev),
+        Case("cache_hit", lambda: verifier.verify_local(hot)),
+        Case("rs256_verify[cold]", cold(verifier.verify_local, rs_next)),
+        Case("hs256_verify[cold]", cold(verifier.verify_local, hs_next)),
+        Case("verify_jwt[cache_hit]", run_dependency),
+        Case("introspection[cold]", cold(lambda t: loop.run_until_complete(verifier.authenticate(t)), opaque_next)),
+        Case("introspection[cache_hit]", lambda: loop.run_until_complete(verifier.authenticate(opaque))),
+    ]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark per-request auth overhead.")
+    parser.add_argument("-k", dest="pattern", help="only run cases whose name contains this substring")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case (best is reported)")
+    parser.add_argument("--cold-tokens", type=int, default=500, help="distinct tokens minted for cold cases")
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    cases = [c for c in build_cases(loop, FakeSSO(), args.cold_tokens) if not args.pattern or args.pattern in c.name]
+    # the async cases include run_until_complete; dev_stub shows what that costs on its own
+    results: Dict[str, Dict] = {}
+    print(f"{'case':28} {'us/op':>10} {'ops/sec':>12} {'peak B/op':>11}")
+    for case in cases:
+        stats = measure(case, args.min_time, args.repeat)
+        results[case.name] = stats
+        print(f"{case.name:28} {stats['us_per_op']:10.1f} {stats['ops_per_sec']:12.0f} {stats['peak_bytes_per_op']:11.0f}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    loop.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+# mcp/test/benchmarks.py
+"""
+Micro-benchmarks for the per-review CPU hot paths:
+build_review_text, build_review_prompt, fence stripping, output validation, the json.dumps
+calls in process_review_and_update (serialize_llm_output) and ReviewResponse(**row).
+Output validation is measured both ways: parse_pipeline is what evaluate_and_parse does
+(ReviewLLMOutput.model_validate_json, one pass), legacy_parse_pipeline the former json.loads,
+_normalize and model_validate steps (also timed one by one).
+
+    python -m mcp.test.benchmarks --json base.json          # run and record the results
+    python -m mcp.test.benchmarks --baseline base.json      # run and compare with them
+    python -m mcp.test.benchmarks -k parse
+    python -m mcp.test.benchmarks --corpus llm_responses.jsonl.gz  # add recorded real outputs
+
+Each case reports ops/sec (best of --repeat timing runs, GC disabled like timeit) and
+allocations per op (tracemalloc: bytes allocated and peak, measured in a separate pass).
+With --baseline (a file written by --json), cases more than --threshold slower, or
+allocating that much more, than in it are flagged and the exit code is 1.
+Baselines are machine-specific, so none is kept in the repository; record one on the
+machine that runs the comparison, e.g. from the commit being compared against.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from mcp.schemas import ReviewLLMOutput, ReviewPayload, ReviewResponse
+from mcp.services.llm_recording import iter_records
+from mcp.services.llm_service import strip_code_fences
+from mcp.services.orchestrator import serialize_llm_output
+from mcp.services.prompt import build_review_prompt
+from mcp.services.utils import _normalize, build_review_text
+from mcp.test.debug_validate import RAW
+from mcp.test.fake_llm_server import RUBRICS, review_json
+
+_COMMENT = (
+    "The implementation handles the happy path but the error handling in the controller is thin; "
+    "consider validating params before calling the model and adding tests for the failure cases. "
+)
+
+
+# --- fixtures -----------------------------------------------------------------------------------
+
+def small_payload() -> ReviewPayload:
+    return ReviewPayload.model_validate({
+        "course_name": "CSC 517",
+        "assignment_name": "Program 1",
+        "response_id_of_expertiza": 101,
+        "round": 1,
+        "scores": [
+            {"question": "Is the code readable?", "type": "Criterion", "max_points": 5, "awarded_points": 4,
+             "comments": "Mostly readable, a few long methods."},
+            {"question": "Are there tests?", "type": "Checkbox", "max_points": 1, "awarded_points": 1},
+        ],
+        "additional_comment": "Good work overall.",
+    })
+
+
+def long_payload() -> ReviewPayload:
+    """A round-2 review with 30 rubric items, long comments and the previous round embedded."""
+    scores = [
+        {"question": f"Rubric question {i}: does the submission address requirement {i}?", "type": "Criterion",
+         "max_points": 5, "awarded_points": i % 6, "comments": _COMMENT * 4}
+        for i in range(30)
+    ]
+    previous = [
+        {"question": f"Rubric question {i}", "type": "Criterion", "max_points": 5, "awarded_points": (i + 2) % 6,
+         "comments": _COMMENT * 3}
+        for i in range(30)
+    ]
+    return ReviewPayload.model_validate({
+        "course_name": "CSC 517",
+        "assignment_name": "OSS project",
+        "response_id_of_expertiza": 202,
+        "round": 2,
+        "scores": scores,
+        "additional_comment": _COMMENT * 20,
+        "previousRoundReview": json.dumps(previous),
+    })
+
+
+def long_llm_output() -> str:
+    """A fenced model answer with paragraph-length reasoning and justifications."""
+    body = {
+        "reasoning": {name: _COMMENT * 6 for name in RUBRICS},
+        "evaluation": {name: {"score": str(i % 10 + 1), "justification": _COMMENT * 3} for i, name in enumerate(RUBRICS)},
+        "feedback": _COMMENT * 10,
+    }
+    return "```json\n" + json.dumps(body, indent=2) + "\n```"
+
+
+def review_row(output: ReviewLLMOutput) -> Dict[str, Any]:
+    feedback, evaluation_json, details_json, full_output_json = serialize_llm_output(output)
+    now = datetime.now(timezone.utc)
+    return {
+        "id": 1, "response_id_of_expertiza": 101, "review": "text", "status": "processed",
+        "llm_generated_feedback": feedback, "llm_generated_score": evaluation_json,
+        "llm_details_reasoning": details_json, "llm_generated_output": full_output_json,
+        "finalized_feedback": None, "finalized_score": None, "trace_id": None,
+        "created_at": now, "updated_at": now,
+    }
+
+
+def parse_pipeline(raw: str) -> ReviewLLMOutput:
+    """What evaluate_and_parse does with a successful answer."""
+    return ReviewLLMOutput.model_validate_json(strip_code_fences(raw))
+
+
+def legacy_parse_pipeline(raw: str) -> ReviewLLMOutput:
+    """The three-step parse used before model_validate_json, for comparison."""
+    return ReviewLLMOutput.model_validate(_normalize(json.loads(strip_code_fences(raw))))
+
+
+# --- cases --------------------------------------------------------------------------------------
+
+@dataclass
+class Case:
+    name: str
+    func: Callable[[], Any]
+
+
+def corpus_case(path: str) -> Case:
+    """Parse every successful recorded response (LLM_RECORD_MODE=record) once per op."""
+    raws = [r["raw"] for r in iter_records(path) if r.get("raw")]
+    valid = 0
+    for raw in raws:
+        try:
+            parse_pipeline(raw)
+            valid += 1
+        except Exception:
+            pass
+    print(f"corpus {path}: {len(raws)} responses, {valid} parse and validate")
+
+    def run() -> None:
+        for raw in raws:
+            try:
+                parse_pipeline(raw)
+            except Exception:
+                pass
+
+    return Case("parse_pipeline[corpus]", run)
+
+
+def build_cases(corpus_path: Optional[str] = None) -> List[Case]:
+    small, long = small_payload(), long_payload()
+    small_text, long_text = build_review_text(small), build_review_text(long)
+    corpus = {
+        "debug_validate": RAW,
+        "fenced": review_json(small_text),
+        "long": long_llm_output(),
+    }
+    cases = [
+        Case("build_review_text[small]", lambda: build_review_text(small)),
+        Case("build_review_text[long]", lambda: build_review_text(long)),
+        Case("build_review_prompt[small]", lambda: build_review_prompt(small_text)),
+        Case("build_review_prompt[long]", lambda: build_review_prompt(long_text)),
+    ]
+    for label, raw in corpus.items():
+        stripped = strip_code_fences(raw)
+        parsed = json.loads(stripped)
+        normalized = _normalize(parsed)
+        validated = ReviewLLMOutput.model_validate(normalized)
+        row = review_row(validated)
+        cases += [
+            Case(f"strip_code_fences[{label}]", lambda raw=raw: strip_code_fences(raw)),
+            Case(f"json_loads[{label}]", lambda stripped=stripped: json.loads(stripped)),
+            Case(f"normalize[{label}]", lambda parsed=parsed: _normalize(parsed)),
+            Case(f"model_validate[{label}]", lambda normalized=normalized: ReviewLLMOutput.model_validate(normalized)),
+            Case(f"model_validate_json[{label}]", lambda stripped=stripped: ReviewLLMOutput.model_validate_json(stripped)),
+            Case(f"serialize_llm_output[{label}]", lambda validated=validated: serialize_llm_output(validated)),
+            Case(f"review_response[{label}]", lambda row=row: ReviewResponse(**row)),
+            Case(f"parse_pipeline[{label}]", lambda raw=raw: parse_pipeline(raw)),
+            Case(f"legacy_parse_pipeline[{label}]", lambda raw=raw: legacy_parse_pipeline(raw)),
+        ]
+    if corpus_path:
+        cases.append(corpus_case(corpus_path))
+    return cases
+
+
+# --- measurement --------------------------------------------------------------------------------
+
+def _time_loops(func: Callable[[], Any], loops: int) -> float:
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        return time.perf_counter() - start
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def measure(case: Case, min_time: float, repeat: int) -> Dict[str, float]:
+    # calibrate so one timing run lasts at least min_time
+    loops = 1
+    while _time_loops(case.func, loops) < min_time:
+        loops *= 2
+    best = min(_time_loops(case.func, loops) for _ in range(repeat)) / loops
+
+    # allocations in a separate pass; tracemalloc slows everything down
+    alloc_loops = max(1, min(loops, 200))
+    case.func()  # warm caches so one-off allocations are not counted
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        snapshot_before = tracemalloc.take_snapshot()
+        for _ in range(alloc_loops):
+            case.func()
+        snapshot_after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # sum of positive size deltas = memory allocated and kept alive; peak covers transient garbage
+    allocated = sum(max(stat.size_diff, 0) for stat in snapshot_after.compare_to(snapshot_before, "filename"))
+    return {
+        "ops_per_sec": 1.0 / best,
+        "us_per_op": best * 1e6,
+        "peak_bytes_per_op": max(peak - before, 0),
+        "retained_bytes_per_op": allocated / alloc_loops,
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if current["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {current['ops_per_sec']:.0f} ops/s vs baseline {base['ops_per_sec']:.0f}")
+        # ignore tiny absolute growth; a few hundred bytes is noise from interpreter caches
+        if current["peak_bytes_per_op"] > base["peak_bytes_per_op"] * (1 + threshold) + 512:
+            regressions.append(
+                f"{name}: peak {current['peak_bytes_per_op']} B/op vs baseline {base['peak_bytes_per_op']} B/op"
+            )
+    return regressions
+
+
+def _environment() -> Dict[str, str]:
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the review CPU hot paths.")
+    parser.add_argument("-k", dest="pattern", help="only run cases whose name contains this substring")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case (best is reported)")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression vs baseline")
+    parser.add_argument("--baseline", help="results of an earlier run (--json) to compare with")
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    parser.add_argument("--corpus", help="recorded LLM responses to parse (see services/llm_recording.py)")
+    args = parser.parse_args(argv)
+
+    cases = [c for c in build_cases(args.corpus) if not args.pattern or args.pattern in c.name]
+    baseline: Dict[str, Dict] = {}
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            parser.error(f"baseline file {args.baseline} does not exist")
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    results: Dict[str, Dict] = {}
+    print(f"{'case':40} {'ops/sec':>12} {'us/op':>10} {'peak B/op':>11} {'kept B/op':>10} {'vs base':>8}")
+    for case in cases:
+        stats = measure(case, args.min_time, args.repeat)
+        results[case.name] = stats
+        base = baseline.get(case.name)
+        delta = f"{stats['ops_per_sec'] / base['ops_per_sec'] - 1:+.0%}" if base else "-"
+        print(
+            f"{case.name:40} {stats['ops_per_sec']:12.0f} {stats['us_per_op']:10.1f} "
+            f"{stats['peak_bytes_per_op']:11.0f} {stats['retained_bytes_per_op']:10.0f} {delta:>8}"
+        )
+
+    document = {"environment": _environment(), "results": results}
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
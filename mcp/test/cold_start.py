@@ -0,0 +1,125 @@
+# mcp/test/cold_start.py
+"""
+Cold-start time of the API: from spawning the process to the first served request, and
+the latency of the first database-backed and first LLM-backed requests after that.
+
+  legacy:     python -m mcp.create_db, then uvicorn with no warmup (the old container command)
+  cold:       uvicorn alone (schema fingerprint check), DB_POOL_WARM_CONNECTIONS=0, LLM_WARMUP=off
+  warm:       pool connections and the LLM service set up before serving (LLM_WARMUP=startup)
+  background: pool connections before serving, SDK imported after (LLM_WARMUP=background)
+
+The LLM request goes to mcp/test/fake_llm_server.py with no added latency, so its time is
+the SDK import/setup plus our own code. Uses DATABASE_URL from the environment.
+
+    python -m mcp.test.cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+HEADERS = {"Authorization": "Bearer dev"}
+MODES = {
+    "legacy": {"DB_POOL_WARM_CONNECTIONS": "0", "LLM_WARMUP": "off"},
+    "cold": {"DB_POOL_WARM_CONNECTIONS": "0", "LLM_WARMUP": "off"},
+    "warm": {"LLM_WARMUP": "startup"},
+    "background": {"LLM_WARMUP": "background"},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_served(url: str, proc: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"process exited with code {proc.returncode} before serving {url}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.01)
+    raise SystemExit(f"{url} not served within {timeout}s")
+
+
+def timed(call) -> float:
+    start = time.perf_counter()
+    resp = call()
+    elapsed = time.perf_counter() - start
+    if resp.status_code >= 500:
+        raise SystemExit(f"{resp.request.url} answered {resp.status_code}: {resp.text[:200]}")
+    return elapsed
+
+
+def boot(mode: str, env: Dict[str, str]) -> Dict[str, float]:
+    env = {**env, **MODES[mode]}
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    if mode == "legacy":
+        subprocess.run([sys.executable, "-m", "mcp.create_db"], env=env, check=True, capture_output=True)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "mcp.app:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_served(f"{base}/metrics", proc)
+        ready = time.perf_counter() - start
+        # requested right away, so a background warmup may still be running
+        with httpx.Client(base_url=base, headers=HEADERS, timeout=60.0) as client:
+            first_db = timed(lambda: client.get("/api/v1/reviews/1"))
+            first_llm = timed(lambda: client.post("/api/review/llmreview", json={"review_text": "Good work."}))
+            second_llm = timed(lambda: client.post("/api/review/llmreview", json={"review_text": "Good work."}))
+        return {"ready_s": ready, "first_db_ms": first_db * 1000,
+                "first_llm_ms": first_llm * 1000, "second_llm_ms": second_llm * 1000}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="API cold-start time to first served request.")
+    parser.add_argument("--runs", type=int, default=3, help="boots per mode")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated subset of " + ",".join(MODES))
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    llm_port = free_port()
+    llm = subprocess.Popen(
+        [sys.executable, "-m", "mcp.test.fake_llm_server", "--port", str(llm_port), "--latency-ms", "0"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    env = {**os.environ, "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY") or "fake",
+           "GEMINI_API_ENDPOINT": f"http://127.0.0.1:{llm_port}", "LLM_RECORD_MODE": "off",
+           "AUTH_MODE": "dev"}
+    results: Dict[str, Dict[str, float]] = {}
+    try:
+        wait_until_served(f"http://127.0.0.1:{llm_port}/stats", llm)
+        print(f"{'mode':10} {'ready s':>8} {'1st db ms':>10} {'1st llm ms':>11} {'2nd llm ms':>11}")
+        for mode in args.modes.split(","):
+            runs = [boot(mode, env) for _ in range(args.runs)]
+            results[mode] = {k: statistics.median(r[k] for r in runs) for k in runs[0]}
+            r = results[mode]
+            print(f"{mode:10} {r['ready_s']:8.2f} {r['first_db_ms']:10.1f} {r['first_llm_ms']:11.1f} {r['second_llm_ms']:11.1f}")
+    finally:
+        llm.terminate()
+        llm.wait(timeout=10)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+# mcp/test/conftest.py
+import asyncio
+import os
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from mcp.db import models  # noqa: F401  (registers the tables for create_all)
+from mcp.db.session import DATABASE_URL, engine, ensure_schema
+
+
+@pytest.fixture(scope="session")
+def run_db():
+    """
+    run_db(work) runs `await work(db)` on a fresh AsyncSession against DATABASE_URL and
+    returns its result; tests using it are skipped when the database cannot be reached,
+    or fail with REQUIRE_TEST_DATABASE=1 (CI, .github/workflows/tests.yml).
+    Each call gets its own event loop and an unpooled engine, so no connection outlives it.
+    """
+    async def check():
+        try:
+            await ensure_schema()
+            return None
+        except (OSError, DBAPIError) as exc:
+            return exc
+        finally:
+            await engine.dispose()  # its pool belongs to this event loop
+
+    error = asyncio.run(check())
+    if error is not None:
+        if os.getenv("REQUIRE_TEST_DATABASE", "").lower() in ("1", "true", "yes"):
+            pytest.fail(f"REQUIRE_TEST_DATABASE is set but DATABASE_URL is not reachable: {error}")
+        pytest.skip(f"database at DATABASE_URL not reachable: {error}")
+
+    def run(work):
+        async def main():
+            scratch = create_async_engine(DATABASE_URL, poolclass=NullPool)
+            try:
+                async with AsyncSession(scratch, expire_on_commit=False) as db:
+                    return await work(db)
+            finally:
+                await scratch.dispose()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,110 @@
+# mcp/test/db_benchmark.py
+"""
+Per-statement cost of the hot crud statements, in microseconds, with the PreparedQuery fast
+path (mcp/db/prepared.py) and through SQLAlchemy's text() execution, against the database
+in DATABASE_URL (one pooled connection, so mostly client-side cost plus a local round trip).
+
+    python -m mcp.test.db_benchmark --ops 2000
+    python -m mcp.test.db_benchmark --json db.json
+
+Cases:
+  get_review_by_id          primary-key lookup, REVIEW_RESPONSE_COLUMNS
+  get_review_by_response_id lookup by response_id_of_expertiza
+  mark_review_processing    UPDATE + COMMIT
+  store_review_output       UPDATE ... RETURNING + resolve_failed_job DELETE + COMMIT
+
+Works on one scratch review (response_id_of_expertiza -1), deleted afterwards.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from sqlalchemy import text
+
+from mcp.db import models  # noqa: F401  (registers the tables for create_all)
+from mcp.db.crud import (
+    REVIEW_RESPONSE_COLUMNS,
+    get_review_by_id,
+    get_review_by_response_id,
+    insert_review_received,
+    mark_review_processing,
+    resolve_failed_job,
+    store_review_output,
+)
+from mcp.db.session import AsyncSessionLocal, engine, ensure_schema
+import mcp.config as config
+
+SCRATCH_RESPONSE_ID = -1
+
+
+async def timed(op: Callable[[], Awaitable[object]], ops: int) -> Dict[str, float]:
+    for _ in range(min(ops, 50)):
+        await op()
+    timings: List[float] = []
+    for _ in range(ops):
+        start = time.perf_counter()
+        await op()
+        timings.append(time.perf_counter() - start)
+    return {
+        "us_median": statistics.median(timings) * 1e6,
+        "us_p95": statistics.quantiles(timings, n=20)[-1] * 1e6,
+    }
+
+
+async def run(ops: int) -> Dict[str, Dict[str, float]]:
+    await ensure_schema()
+    results: Dict[str, Dict[str, float]] = {}
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("DELETE FROM reviews_table WHERE response_id_of_expertiza = :rid"),
+                         {"rid": SCRATCH_RESPONSE_ID})
+        await db.commit()
+        review_id = (await insert_review_received(db, SCRATCH_RESPONSE_ID, "benchmark review"))["id"]
+        try:
+            async def store():
+                await store_review_output(db, review_id, "feedback", '{"Praise": 3}', '{"Praise": "ok"}', "{}")
+                await resolve_failed_job(db, review_id)
+                await db.commit()
+
+            cases = {
+                "get_review_by_id": lambda: get_review_by_id(db, review_id, REVIEW_RESPONSE_COLUMNS),
+                "get_review_by_response_id": lambda: get_review_by_response_id(
+                    db, SCRATCH_RESPONSE_ID, REVIEW_RESPONSE_COLUMNS
+                ),
+                "mark_review_processing": lambda: mark_review_processing(db, review_id),
+                "store_review_output": store,
+            }
+            for name, op in cases.items():
+                for path, fast in (("text", False), ("prepared", True)):
+                    config.DB_PREPARED_FAST_PATH = fast
+                    results[f"{name}[{path}]"] = await timed(op, ops)
+                    await db.commit()
+        finally:
+            await db.rollback()
+            await db.execute(text("DELETE FROM reviews_table WHERE id = :id"), {"id": review_id})
+            await db.commit()
+    await engine.dispose()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Hot crud statements: PreparedQuery fast path vs text().")
+    parser.add_argument("--ops", type=int, default=2000, help="timed executions per case")
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args.ops))
+    print(f"{'case':38} {'us p50':>9} {'us p95':>9}")
+    for name, stats in results.items():
+        print(f"{name:38} {stats['us_median']:9.1f} {stats['us_p95']:9.1f}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
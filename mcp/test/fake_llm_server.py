@@ -0,0 +1,303 @@
+# mcp/test/fake_llm_server.py
+"""
+Deterministic stand-in LLM server for offline load tests and benchmarks.
+
+Speaks enough of two wire formats for our clients:
+  Gemini REST:  POST /v1beta/models/{model}:generateContent
+                POST /v1beta/models/{model}:streamGenerateContent   (?alt=sse or JSON array)
+  OpenAI:       POST /v1/chat/completions                          ("stream": true for SSE)
+
+Run it and point the API at it:
+    python -m mcp.test.fake_llm_server --port 8090 --latency lognormal --latency-ms 800 \
+        --error-rate 0.02 --rate-limit-rate 0.05 --malformed-rate 0.1
+    GEMINI_API_KEY=fake GEMINI_API_ENDPOINT=http://127.0.0.1:8090 uvicorn mcp.app:app
+
+Outcomes are drawn from a RNG seeded with (--seed, request number), so the same
+request sequence always gets the same latencies, errors and malformed bodies.
+--ms-per-output-char adds generation time proportional to the answer's length. Prompts
+restricted to some rubric dimensions (LLM_EVALUATION_MODE="parallel") are answered with
+only those dimensions, and feedback-pass prompts with only the feedback; the two phases of
+LLM_TWO_PHASE_MODE get only the evaluation, or only the reasoning and feedback.
+GET /stats reports what was served.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+RUBRICS = [
+    "Praise", "Problems & Solutions", "Tone", "Localization", "Helpfulness", "Explanation",
+    "Acted On", "Relevance", "Consistency", "Actionability", "Factuality", "Accessibility",
+    "Comprehensiveness",
+]
+
+
+@dataclass
+class FakeLLMSettings:
+    latency: str = "fixed"         # fixed | uniform | normal | lognormal
+    latency_ms: float = 200.0      # mean (median for lognormal)
+    latency_spread_ms: float = 100.0  # uniform half-width, normal sd; lognormal uses it as sd of the result
+    error_rate: float = 0.0        # HTTP 500
+    rate_limit_rate: float = 0.0   # HTTP 429 with Retry-After
+    malformed_rate: float = 0.0    # 200 with truncated / non-JSON text
+    retry_after: int = 1
+    stream_chunks: int = 8
+    seed: int = 0
+    ms_per_output_char: float = 0.0  # generation time, so long answers take longer
+
+
+@dataclass
+class _Outcome:
+    kind: str  # ok | error | rate_limited | malformed
+    delay: float
+    variant: int = 0  # which malformed body to send
+
+
+class FakeLLM:
+    def __init__(self, settings: FakeLLMSettings):
+        self.settings = settings
+        self._requests = 0
+        self.stats: Counter = Counter()
+
+    def next_outcome(self) -> _Outcome:
+        s = self.settings
+        self._requests += 1
+        rng = random.Random(f"{s.seed}:{self._requests}")
+        draw = rng.random()
+        if draw < s.error_rate:
+            kind = "error"
+        elif draw < s.error_rate + s.rate_limit_rate:
+            kind = "rate_limited"
+        elif draw < s.error_rate + s.rate_limit_rate + s.malformed_rate:
+            kind = "malformed"
+        else:
+            kind = "ok"
+        self.stats[kind] += 1
+        return _Outcome(kind, self._delay(rng) if kind != "rate_limited" else 0.0, rng.randrange(2))
+
+    def _delay(self, rng: random.Random) -> float:
+        s = self.settings
+        if s.latency == "uniform":
+            ms = rng.uniform(s.latency_ms - s.latency_spread_ms, s.latency_ms + s.latency_spread_ms)
+        elif s.latency == "normal":
+            ms = rng.gauss(s.latency_ms, s.latency_spread_ms)
+        elif s.latency == "lognormal":
+            # parameterised so that latency_ms is the median and the long tail grows with the spread
+            sigma = math.sqrt(math.log(1 + (s.latency_spread_ms / max(s.latency_ms, 1e-3)) ** 2))
+            ms = rng.lognormvariate(math.log(max(s.latency_ms, 1e-3)), sigma)
+        else:
+            ms = s.latency_ms
+        return max(ms, 0.0) / 1000.0
+
+
+# markers of the prompts built by mcp/services/prompt.py for LLM_EVALUATION_MODE="parallel"
+_RUBRIC_SCOPE = re.compile(r"Evaluate ONLY these rubric dimensions: (\[.*?\])")
+_FEEDBACK_ONLY = '{"feedback": "string"}'
+# and for the phases of LLM_TWO_PHASE_MODE
+_SCORES_ONLY = 'Return ONLY the "evaluation" object'
+_DETAILS_ONLY = "The review has already been scored"
+
+
+def review_json(prompt: str) -> str:
+    """A valid ReviewLLMOutput for this prompt; scores are derived from a hash of the prompt."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+    if _FEEDBACK_ONLY in prompt:
+        return json.dumps({"feedback": "Fake feedback from the offline LLM server."})
+    scope = _RUBRIC_SCOPE.search(prompt)
+    names = json.loads(scope.group(1)) if scope else RUBRICS
+    reasoning = {name: f"Deterministic reasoning for {name}." for name in names}
+    evaluation = {
+        name: {"score": digest[RUBRICS.index(name)] % 5 + 1, "justification": f"Fake justification for {name}."}
+        for name in names
+    }
+    if "Acted On" in evaluation:
+        evaluation["Acted On"] = {"score": "N/A", "justification": "No previous round."}
+    body = {"reasoning": reasoning, "evaluation": evaluation}
+    if not scope:
+        body["feedback"] = "Fake feedback from the offline LLM server."
+    if _SCORES_ONLY in prompt:
+        del body["reasoning"], body["feedback"]
+    elif _DETAILS_ONLY in prompt:
+        del body["evaluation"]
+    # Gemini usually fences its JSON, which exercises the cleanup in LLMService
+    return "```json\n" + json.dumps(body, indent=2) + "\n```"
+
+
+def malformed_text(prompt: str, variant: int) -> str:
+    text = review_json(prompt)
+    if variant:
+        return text[: len(text) // 2]  # truncated mid-object
+    return "I'm sorry, here is my evaluation: the review is good."
+
+
+def _chunks(text: str, n: int) -> List[str]:
+    size = max(1, math.ceil(len(text) / max(n, 1)))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _gemini_body(text: str, model: str) -> Dict:
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": len(text) // 4, "totalTokenCount": len(text) // 4},
+        "modelVersion": model,
+    }
+
+
+def _openai_body(text: str, model: str) -> Dict:
+    return {
+        "id": f"chatcmpl-fake-{int(time.time() * 1000)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(text) // 4, "total_tokens": len(text) // 4},
+    }
+
+
+def _gemini_prompt(body: Dict) -> str:
+    parts = [p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", [])]
+    return "\n".join(parts)
+
+
+def _openai_prompt(body: Dict) -> str:
+    return "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+
+
+def create_app(settings: FakeLLMSettings) -> FastAPI:
+    llm = FakeLLM(settings)
+    app = FastAPI(title="Fake LLM server")
+
+    def _error(outcome: _Outcome, openai: bool) -> Optional[JSONResponse]:
+        if outcome.kind == "rate_limited":
+            body = (
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+                if openai
+                else {"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}}
+            )
+            return JSONResponse(body, status_code=429, headers={"Retry-After": str(settings.retry_after)})
+        if outcome.kind == "error":
+            body = (
+                {"error": {"message": "The server had an error", "type": "server_error", "code": None}}
+                if openai
+                else {"error": {"code": 500, "message": "Internal error encountered.", "status": "INTERNAL"}}
+            )
+            return JSONResponse(body, status_code=500)
+        return None
+
+    def _text(outcome: _Outcome, prompt: str) -> str:
+        text = malformed_text(prompt, outcome.variant) if outcome.kind == "malformed" else review_json(prompt)
+        outcome.delay += settings.ms_per_output_char * len(text) / 1000.0
+        return text
+
+    async def _stream(pieces: List[str], delay: float, render) -> AsyncIterator[bytes]:
+        # spread the latency over the chunks so time-to-first-token is realistic
+        for piece in pieces:
+            await asyncio.sleep(delay / max(len(pieces), 1))
+            yield render(piece)
+
+    @app.post("/{version}/models/{model_action}")
+    async def gemini(version: str, model_action: str, request: Request):
+        model, _, action = model_action.partition(":")
+        body = await request.json()
+        outcome = llm.next_outcome()
+        error = _error(outcome, openai=False)
+        if error is not None:
+            await asyncio.sleep(outcome.delay)  # 500s take as long as answers; 429s are immediate
+            return error
+        text = _text(outcome, _gemini_prompt(body))
+        if action == "streamGenerateContent":
+            pieces = _chunks(text, settings.stream_chunks)
+            if request.query_params.get("alt") == "sse":
+                return StreamingResponse(
+                    _stream(pieces, outcome.delay, lambda p: f"data: {json.dumps(_gemini_body(p, model))}\r\n\r\n".encode()),
+                    media_type="text/event-stream",
+                )
+            # without alt=sse Gemini streams one JSON array of responses
+            async def json_array() -> AsyncIterator[bytes]:
+                yield b"["
+                first = True
+                async for item in _stream(pieces, outcome.delay, lambda p: json.dumps(_gemini_body(p, model)).encode()):
+                    yield item if first else b",\r\n" + item
+                    first = False
+                yield b"]"
+            return StreamingResponse(json_array(), media_type="application/json")
+        await asyncio.sleep(outcome.delay)
+        return JSONResponse(_gemini_body(text, model))
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        model = body.get("model", "gpt-4o-mini")
+        outcome = llm.next_outcome()
+        error = _error(outcome, openai=True)
+        if error is not None:
+            await asyncio.sleep(outcome.delay)  # 500s take as long as answers; 429s are immediate
+            return error
+        text = _text(outcome, _openai_prompt(body))
+        if body.get("stream"):
+            def render(piece: str) -> bytes:
+                chunk = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }
+                return f"data: {json.dumps(chunk)}\n\n".encode()
+
+            async def events() -> AsyncIterator[bytes]:
+                async for item in _stream(_chunks(text, settings.stream_chunks), outcome.delay, render):
+                    yield item
+                yield b"data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+        await asyncio.sleep(outcome.delay)
+        return JSONResponse(_openai_body(text, model))
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": llm._requests, "outcomes": dict(llm.stats)}
+
+    return app
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Deterministic fake Gemini/OpenAI server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "normal", "lognormal"], default="fixed")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--latency-spread-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered with 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction answered with invalid JSON text")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on 429")
+    parser.add_argument("--stream-chunks", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ms-per-output-char", type=float, default=0.0,
+                        help="extra latency per character of the answer (generation time)")
+    args = parser.parse_args(argv)
+    settings = FakeLLMSettings(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_spread_ms=args.latency_spread_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate,
+        retry_after=args.retry_after,
+        stream_chunks=args.stream_chunks,
+        seed=args.seed,
+        ms_per_output_char=args.ms_per_output_char,
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# mcp/test/fake_sso_server.py
+"""
+Local stand-in for the university SSO: publishes a JWKS, mints RS256 tokens and answers
+RFC 7662 token introspection, so AUTH_MODE="jwt" can be exercised offline.
+
+    python -m mcp.test.fake_sso_server --port 8091 &
+    AUTH_MODE=jwt AUTH_JWKS_URL=http://127.0.0.1:8091/jwks.json \
+        AUTH_INTROSPECTION_URL=http://127.0.0.1:8091/introspect uvicorn mcp.app:app
+    TOKEN=$(curl -s 'http://127.0.0.1:8091/token?sub=alice' | python -c 'import json,sys;print(json.load(sys.stdin)["access_token"])')
+
+GET /token?opaque=1 returns a random opaque token that only introspection can resolve.
+POST /rotate switches to a new signing key (the old one stays in the JWKS).
+"""
+import argparse
+import secrets
+import time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+import uvicorn
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI, Query, Request
+from jose import jwk, jwt
+
+ISSUER = "https://sso.example.edu"
+AUDIENCE = "mcp"
+
+
+class SigningKey:
+    def __init__(self, kid: str):
+        private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.kid = kid
+        self.private_pem = private.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode()
+        public_pem = private.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        self.public_jwk = {**jwk.construct(public_pem, "RS256").to_dict(), "kid": kid, "use": "sig", "alg": "RS256"}
+
+
+class FakeSSO:
+    def __init__(self, issuer: str = ISSUER, audience: str = AUDIENCE):
+        self.issuer = issuer
+        self.audience = audience
+        self.keys: List[SigningKey] = [SigningKey("key-1")]
+        self.opaque: Dict[str, Dict] = {}
+        self.introspections = 0
+
+    def jwks(self) -> Dict:
+        return {"keys": [k.public_jwk for k in self.keys]}
+
+    def rotate(self) -> str:
+        self.keys.append(SigningKey(f"key-{len(self.keys) + 1}"))
+        return self.keys[-1].kid
+
+    def claims(self, sub: str, ttl: int, role: str) -> Dict:
+        now = int(time.time())
+        return {"iss": self.issuer, "aud": self.audience, "sub": sub, "role": role, "iat": now, "exp": now + ttl}
+
+    def mint(self, sub: str = "local_sso_user", ttl: int = 3600, role: str = "instructor",
+             kid: Optional[str] = None) -> str:
+        key = next((k for k in self.keys if k.kid == kid), self.keys[-1])
+        return jwt.encode(self.claims(sub, ttl, role), key.private_pem, algorithm="RS256", headers={"kid": key.kid})
+
+    def mint_opaque(self, sub: str = "local_sso_user", ttl: int = 3600, role: str = "instructor") -> str:
+        token = secrets.token_urlsafe(32)
+        self.opaque[token] = self.claims(sub, ttl, role)
+        return token
+
+    def introspect(self, token: str) -> Dict:
+        self.introspections += 1
+        claims = self.opaque.get(token)
+        if claims is None or claims["exp"] < time.time():
+            return {"active": False}
+        return {"active": True, "token_type": "access_token", **claims}
+
+
+def create_app(sso: Optional[FakeSSO] = None) -> FastAPI:
+    sso = sso or FakeSSO()
+    app = FastAPI(title="Fake SSO server")
+
+    @app.get("/jwks.json")
+    async def jwks():
+        return sso.jwks()
+
+    @app.get("/token")
+    async def token(sub: str = "local_sso_user", ttl: int = 3600, role: str = "instructor",
+                    opaque: bool = Query(False)):
+        value = sso.mint_opaque(sub, ttl, role) if opaque else sso.mint(sub, ttl, role)
+        return {"access_token": value, "token_type": "Bearer", "expires_in": ttl}
+
+    @app.post("/introspect")
+    async def introspect(request: Request):
+        # form-encoded per RFC 7662; parsed by hand so python-multipart is not needed
+        form = parse_qs((await request.body()).decode())
+        return sso.introspect(form.get("token", [""])[0])
+
+    @app.post("/rotate")
+    async def rotate():
+        return {"kid": sso.rotate()}
+
+    @app.get("/stats")
+    async def stats():
+        return {"keys": len(sso.keys), "opaque_tokens": len(sso.opaque), "introspections": sso.introspections}
+
+    return app
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in SSO (JWKS, tokens, introspection).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--issuer", default=ISSUER)
+    parser.add_argument("--audience", default=AUDIENCE)
+    args = parser.parse_args(argv)
+    uvicorn.run(create_app(FakeSSO(args.issuer, args.audience)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
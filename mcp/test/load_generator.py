@@ -0,0 +1,220 @@
+# mcp/test/load_generator.py
+"""
+Async load generator for the review API.
+
+Drives POST /api/v1/reviews (then polls GET /api/v1/reviews/{id} until the review is
+processed or failed) and/or the synchronous POST /api/review/llmreview, and reports
+throughput, p50/p95/p99 request latency and end-to-end time-to-processed.
+
+Typical offline run (local Postgres, no Gemini spend):
+    python -m mcp.test.fake_llm_server --port 8090 --latency lognormal --latency-ms 800 &
+    AUTH_MODE=dev GEMINI_API_KEY=fake GEMINI_API_ENDPOINT=http://127.0.0.1:8090 RATE_LIMIT_ENABLED=false \
+        uvicorn mcp.app:app --port 8000 &
+    python -m mcp.test.load_generator --mode mixed --requests 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+SAMPLE_COMMENTS = [
+    "The report is clear and well-structured, but lacks any quantitative evaluation.",
+    "Methodology is reasonable but missing baseline comparisons. The writing is generally professional.",
+    "Good use of diagrams; the testing section should cover edge cases and explain failures.",
+    "The design document is thorough, though the UML is out of date with the code.",
+]
+
+
+@dataclass
+class _Series:
+    latencies: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    errors: Counter = field(default_factory=Counter)
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty sample."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _summary(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+class LoadGenerator:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.series: Dict[str, _Series] = {"reviews": _Series(), "llmreview": _Series()}
+        self.end_to_end: List[float] = []
+        self.final_status: Counter = Counter()
+        self._next_response_id = args.response_id_start
+
+    def _review_payload(self) -> Dict:
+        response_id = self._next_response_id
+        self._next_response_id += 1
+        course = f"Course {self.rng.randrange(self.args.courses)}"
+        return {
+            "response_id_of_expertiza": response_id,
+            "course_name": course,
+            "assignment_name": "Program 1",
+            "round": 1,
+            "scores": [
+                {"question": "Is the code well documented?", "type": "Criterion", "max_points": 5,
+                 "awarded_points": self.rng.randint(1, 5), "comments": self.rng.choice(SAMPLE_COMMENTS)},
+            ],
+            "additional_comment": self.rng.choice(SAMPLE_COMMENTS),
+        }
+
+    async def _submit_review(self, client: httpx.AsyncClient) -> None:
+        series = self.series["reviews"]
+        payload = self._review_payload()
+        start = time.perf_counter()
+        try:
+            resp = await client.post("/api/v1/reviews", json=payload)
+        except httpx.HTTPError as exc:
+            series.errors[type(exc).__name__] += 1
+            return
+        series.latencies.append(time.perf_counter() - start)
+        series.statuses[resp.status_code] += 1
+        if resp.status_code != 201 or self.args.no_wait:
+            return
+        status = await self._wait_until_done(client, payload["response_id_of_expertiza"])
+        self.final_status[status] += 1
+        if status == "processed":
+            self.end_to_end.append(time.perf_counter() - start)
+
+    async def _wait_until_done(self, client: httpx.AsyncClient, response_id: int) -> str:
+        deadline = time.perf_counter() + self.args.timeout
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.args.poll_interval)
+            try:
+                resp = await client.get(f"/api/v1/reviews/{response_id}")
+            except httpx.HTTPError:
+                continue
+            if resp.status_code == 200:
+                status = resp.json().get("status")
+                if status in ("processed", "failed", "finalized"):
+                    return status
+        return "timeout"
+
+    async def _llmreview(self, client: httpx.AsyncClient) -> None:
+        series = self.series["llmreview"]
+        start = time.perf_counter()
+        try:
+            resp = await client.post("/api/review/llmreview", json={"review_text": self.rng.choice(SAMPLE_COMMENTS)})
+        except httpx.HTTPError as exc:
+            series.errors[type(exc).__name__] += 1
+            return
+        series.latencies.append(time.perf_counter() - start)
+        series.statuses[resp.status_code] += 1
+
+    def _pick(self) -> str:
+        if self.args.mode == "mixed":
+            return "llmreview" if self.rng.random() < self.args.llmreview_share else "reviews"
+        return self.args.mode
+
+    async def run(self) -> Dict:
+        args = self.args
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        headers = {"Authorization": f"Bearer {args.token}"}
+        semaphore = asyncio.Semaphore(args.concurrency)
+        async with httpx.AsyncClient(base_url=args.base_url, headers=headers, limits=limits,
+                                     timeout=args.request_timeout) as client:
+
+            async def one(kind: str) -> None:
+                async with semaphore:
+                    if kind == "llmreview":
+                        await self._llmreview(client)
+                    else:
+                        await self._submit_review(client)
+
+            started = time.perf_counter()
+            tasks = []
+            for i in range(args.requests):
+                if args.rate:
+                    # open loop: fixed arrival rate regardless of how fast responses come back
+                    await asyncio.sleep(max(0.0, started + i / args.rate - time.perf_counter()))
+                tasks.append(asyncio.create_task(one(self._pick())))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+
+        report = {
+            "elapsed_seconds": elapsed,
+            "throughput_rps": args.requests / elapsed if elapsed else None,
+            "end_to_end_processed": _summary(self.end_to_end),
+            "final_status": dict(self.final_status),
+        }
+        for name, series in self.series.items():
+            if series.statuses or series.errors:
+                report[name] = {
+                    "latency": _summary(series.latencies),
+                    "status_codes": {str(k): v for k, v in series.statuses.items()},
+                    "client_errors": dict(series.errors),
+                }
+        return report
+
+
+def _print_report(report: Dict) -> None:
+    def fmt(summary: Dict) -> str:
+        parts = [f"n={summary['count']}"]
+        for key in ("p50", "p95", "p99", "max"):
+            value = summary[key]
+            parts.append(f"{key}={value * 1000:.0f}ms" if value is not None else f"{key}=-")
+        return " ".join(parts)
+
+    print(f"elapsed {report['elapsed_seconds']:.2f}s, throughput {report['throughput_rps']:.1f} req/s")
+    for name in ("reviews", "llmreview"):
+        if name in report:
+            section = report[name]
+            print(f"{name:10} {fmt(section['latency'])} status={section['status_codes']} errors={section['client_errors']}")
+    if report["final_status"]:
+        print(f"{'processed':10} {fmt(report['end_to_end_processed'])} final={report['final_status']}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Load-test the review API.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", default="dev", help="bearer token for /api/v1/reviews")
+    parser.add_argument("--mode", choices=["reviews", "llmreview", "mixed"], default="reviews")
+    parser.add_argument("--llmreview-share", type=float, default=0.2, help="share of llmreview calls in mixed mode")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20, help="max requests (and polls) in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="open-loop arrivals per second (0 = closed loop)")
+    parser.add_argument("--courses", type=int, default=4, help="spread reviews over this many course tenants")
+    parser.add_argument("--response-id-start", type=int, default=int(time.time() * 1000) % 1_000_000_000,
+                        help="first response_id_of_expertiza (must not collide with existing rows)")
+    parser.add_argument("--no-wait", action="store_true", help="do not poll reviews until processed")
+    parser.add_argument("--poll-interval", type=float, default=0.25)
+    parser.add_argument("--timeout", type=float, default=300.0, help="give up waiting for processed after this")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(LoadGenerator(args).run())
+    _print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
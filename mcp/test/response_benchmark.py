@@ -0,0 +1,124 @@
+# mcp/test/response_benchmark.py
+"""
+Bytes per response and microseconds per request for the review read path, before and
+after serving rows through routes.reviews.review_response:
+
+  legacy: SELECT * row -> ReviewResponse(**row), validated and serialized again by FastAPI
+  direct: REVIEW_RESPONSE_COLUMNS row -> review_response(row), serialized once
+
+Both run in-process through the app's GZipMiddleware (RESPONSE_GZIP_MIN_BYTES,
+RESPONSE_GZIP_LEVEL), with and without Accept-Encoding: gzip, so the times include the
+ASGI stack and compression but no database or network.
+
+    python -m mcp.test.response_benchmark --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+
+from mcp.db.crud import REVIEW_RESPONSE_COLUMNS
+from mcp.routes.reviews import review_response
+from mcp.schemas import ReviewResponse
+from mcp.services.utils import build_review_text
+from mcp.test.benchmarks import long_llm_output, long_payload, parse_pipeline, review_row, small_payload
+from mcp.test.fake_llm_server import review_json
+import mcp.config as config
+
+_PROJECTED = [c.strip() for c in REVIEW_RESPONSE_COLUMNS.split(",")]
+
+
+def full_row(review_text: str, raw_output: str) -> Dict[str, Any]:
+    """A processed review as SELECT * returns it."""
+    row = review_row(parse_pipeline(raw_output))
+    row.update(
+        review=review_text, course_name="CSC 517", assignment_name="OSS project", deferred_at=None,
+        deferred_priority=None, input_tokens=1200, input_truncation=None, reviewer_id="7", reviewee_id="t3",
+        review_round=2, previous_review_id=None, duplicate_of_review_id=None, duplicate_similarity=None,
+    )
+    return row
+
+
+def row_bytes(row: Dict[str, Any]) -> int:
+    return sum(len(str(v).encode()) for v in row.values() if v is not None)
+
+
+def build_app(rows: Dict[str, Dict[str, Any]]) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(GZipMiddleware, minimum_size=config.RESPONSE_GZIP_MIN_BYTES, compresslevel=config.RESPONSE_GZIP_LEVEL)
+
+    @app.get("/legacy/{name}", response_model=ReviewResponse)
+    async def legacy(name: str):
+        return ReviewResponse(**rows[name])
+
+    @app.get("/direct/{name}", response_model=ReviewResponse)
+    async def direct(name: str):
+        return review_response({k: rows[name][k] for k in _PROJECTED})
+
+    return app
+
+
+async def run(requests: int) -> Dict[str, Dict[str, Any]]:
+    rows = {
+        "small": full_row(build_review_text(small_payload()), review_json(build_review_text(small_payload()))),
+        "long": full_row(build_review_text(long_payload()), long_llm_output()),
+    }
+    app = build_app(rows)
+    results: Dict[str, Dict[str, Any]] = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name, row in rows.items():
+            legacy_body = (await client.get(f"/legacy/{name}")).json()
+            direct_body = (await client.get(f"/direct/{name}")).json()
+            if legacy_body != direct_body:
+                raise SystemExit(f"{name}: direct response differs from the legacy one")
+            for path in ("legacy", "direct"):
+                for encoding in ("identity", "gzip"):
+                    headers = {"Accept-Encoding": encoding}
+                    timings: List[float] = []
+                    size = 0
+                    for _ in range(requests):
+                        start = time.perf_counter()
+                        resp = await client.get(f"/{path}/{name}", headers=headers)
+                        timings.append(time.perf_counter() - start)
+                        size = resp.num_bytes_downloaded
+                    results[f"{path}[{name},{encoding}]"] = {
+                        "bytes": size,
+                        "us_median": statistics.median(timings) * 1e6,
+                        "us_p95": statistics.quantiles(timings, n=20)[-1] * 1e6,
+                    }
+            results[f"row[{name}]"] = {
+                "select_star_bytes": row_bytes(row),
+                "projected_bytes": row_bytes({k: row[k] for k in _PROJECTED}),
+            }
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Review response size and serving time, legacy vs direct.")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per case")
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args.requests))
+    print(f"{'case':28} {'bytes':>8} {'us p50':>9} {'us p95':>9}")
+    for name, stats in results.items():
+        if name.startswith("row["):
+            print(f"{name:28} fetched {stats['select_star_bytes']} B with SELECT *, "
+                  f"{stats['projected_bytes']} B projected")
+        else:
+            print(f"{name:28} {stats['bytes']:8d} {stats['us_median']:9.1f} {stats['us_p95']:9.1f}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
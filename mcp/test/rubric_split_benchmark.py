@@ -0,0 +1,80 @@
+# mcp/test/rubric_split_benchmark.py
+"""
+Wall-clock comparison of LLM_EVALUATION_MODE="monolithic" and "parallel" (rubric groups
+evaluated concurrently plus a feedback pass), calling LLMService.evaluate_and_parse directly.
+
+Offline, against the fake server with output-length-proportional latency:
+    python -m mcp.test.fake_llm_server --port 8090 --latency-ms 300 --ms-per-output-char 2 &
+    GEMINI_API_KEY=fake GEMINI_API_ENDPOINT=http://127.0.0.1:8090 \
+        python -m mcp.test.rubric_split_benchmark --runs 5
+
+Against Gemini (costs 1 + len(RUBRIC_GROUPS) + 1 calls per review and run):
+    GEMINI_API_KEY=... python -m mcp.test.rubric_split_benchmark --runs 3 --payloads reviews.jsonl
+
+Reviews are the benchmark payloads (mcp/test/benchmarks.py) or one ReviewPayload JSON
+per line from --payloads. Reports median and worst wall-clock time per review and mode.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from mcp.schemas import ReviewPayload
+from mcp.services.llm_service import LLMService
+from mcp.services.token_budget import fit_review
+from mcp.test.benchmarks import long_payload, small_payload
+from mcp.test.token_report import load_payloads
+import mcp.config as config
+
+MODES = ("monolithic", "parallel")
+
+
+async def run(payloads: List[Tuple[str, ReviewPayload]], runs: int) -> Dict[str, Dict[str, Dict[str, float]]]:
+    service = LLMService()
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    try:
+        for name, payload in payloads:
+            review_text, _, _ = fit_review(payload)
+            results[name] = {}
+            for mode in MODES:
+                config.LLM_EVALUATION_MODE = mode
+                timings = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    await service.evaluate_and_parse(review_text, max_attempts=3)
+                    timings.append(time.perf_counter() - start)
+                results[name][mode] = {"median_s": statistics.median(timings), "max_s": max(timings)}
+    finally:
+        await service.close()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Monolithic vs parallel rubric evaluation wall-clock time.")
+    parser.add_argument("--payloads", help="JSON lines file of ReviewPayload objects")
+    parser.add_argument("--runs", type=int, default=3, help="evaluations per review and mode")
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    payloads = load_payloads(args.payloads) if args.payloads else [("small", small_payload()), ("long", long_payload())]
+    results = asyncio.run(run(payloads, args.runs))
+
+    print(f"{'review':24} {'mono p50 s':>11} {'mono max s':>11} {'par p50 s':>10} {'par max s':>10} {'speedup':>8}")
+    for name, row in results.items():
+        mono, par = row["monolithic"], row["parallel"]
+        print(
+            f"{name[-24:]:24} {mono['median_s']:11.2f} {mono['max_s']:11.2f} {par['median_s']:10.2f} "
+            f"{par['max_s']:10.2f} {mono['median_s'] / par['median_s']:7.2f}x"
+        )
+    print(f"({len(config.RUBRIC_GROUPS)} rubric groups, {args.runs} runs per review and mode)")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# mcp/test/test_crud.py
+"""
+Tests for the SQL in mcp/db/crud.py that does its own arithmetic (retry backoff and
+leases, the orphan sweep, shared rate-limit buckets, LLM quota), against the database in
+DATABASE_URL. Skipped when it cannot be reached (conftest.py run_db).
+"""
+from sqlalchemy import text
+
+from mcp.db.crud import (
+    add_llm_quota_usage,
+    claim_due_failed_jobs,
+    defer_orphaned_reviews,
+    defer_review,
+    get_llm_quota_usage,
+    record_failed_job,
+    take_rate_limit_token,
+)
+
+SCRATCH_RESPONSE_ID = -3
+SCRATCH_SUBJECT = "test_crud:scratch"
+
+
+async def _failed_job_delays(db, max_attempts: int, failures: int):
+    """(attempts, seconds until next_attempt_at, dead-lettered) after each failure; rolled back."""
+    review_id = await db.scalar(
+        text("INSERT INTO reviews_table (response_id_of_expertiza, review, status) "
+             "VALUES (:rid, 'scratch', 'failed') RETURNING id"),
+        {"rid": SCRATCH_RESPONSE_ID},
+    )
+    delays = []
+    try:
+        for _ in range(failures):
+            # CURRENT_TIMESTAMP is fixed inside the transaction, so the delays are exact
+            row = await record_failed_job(db, review_id, "boom", max_attempts, base_delay=30, max_delay=100)
+            delay = None
+            if row["next_attempt_at"] is not None:
+                delay = (row["next_attempt_at"] - row["last_attempt_at"]).total_seconds()
+            delays.append((row["attempts"], delay, row["dead_lettered_at"] is not None))
+    finally:
+        await db.rollback()
+    return delays
+
+
+def test_failed_job_retries_back_off_exponentially_up_to_the_cap(run_db):
+    delays = run_db(lambda db: _failed_job_delays(db, max_attempts=5, failures=5))
+    assert delays == [
+        (1, 30.0, False),
+        (2, 60.0, False),
+        (3, 100.0, False),  # 120 capped at max_delay
+        (4, 100.0, False),
+        (5, None, True),
+    ]
+
+
+def test_single_attempt_jobs_are_dead_lettered_at_once(run_db):
+    assert run_db(lambda db: _failed_job_delays(db, max_attempts=1, failures=1)) == [(1, None, True)]
+
+
+def test_deferring_a_claimed_retry_releases_its_lease(run_db):
+    async def work(db):
+        review_id = await db.scalar(
+            text("INSERT INTO reviews_table (response_id_of_expertiza, review, status) "
+                 "VALUES (:rid, 'scratch', 'failed') RETURNING id"),
+            {"rid": SCRATCH_RESPONSE_ID},
+        )
+        try:
+            await record_failed_job(db, review_id, "boom", max_attempts=5, base_delay=30, max_delay=100)
+            await db.execute(text("UPDATE failed_jobs SET next_attempt_at = CURRENT_TIMESTAMP - interval '1 second' "
+                                  "WHERE reviews_id_from_review_table = :id"), {"id": review_id})
+            await db.commit()
+            claimed = [job["review_id"] for job in await claim_due_failed_jobs(db, 1000, lease_seconds=0)]
+            # the queue is full: the retry goes to the backlog instead
+            await defer_review(db, review_id, priority=2)
+            lease = await db.scalar(text("SELECT next_attempt_at FROM failed_jobs "
+                                         "WHERE reviews_id_from_review_table = :id"), {"id": review_id})
+            # with lease_seconds=0 the lease has already run out; only its release stops a second claim
+            reclaimed = [job["review_id"] for job in await claim_due_failed_jobs(db, 1000, lease_seconds=0)]
+        finally:
+            await db.rollback()
+            await db.execute(text("DELETE FROM failed_jobs WHERE reviews_id_from_review_table = :id"), {"id": review_id})
+            await db.execute(text("DELETE FROM reviews_table WHERE id = :id"), {"id": review_id})
+            await db.commit()
+        return review_id in claimed, lease, review_id in reclaimed
+
+    assert run_db(work) == (True, None, False)
+
+
+def test_orphan_sweep_leaves_reviews_of_live_processes_alone(run_db):
+    # (response id, status, owner, minutes since the last update)
+    rows = [(-10, "processing", "test_crud:live", 60), (-11, "pending", "test_crud:dead", 0),
+            (-12, "pending", None, 0), (-13, "processing", None, 60)]
+
+    async def work(db):
+        await db.execute(
+            text("INSERT INTO process_heartbeats (instance_id, started_at, heartbeat_at) VALUES "
+                 "('test_crud:live', now(), now()), "
+                 "('test_crud:dead', now() - interval '1 hour', now() - interval '10 minutes')")
+        )
+        for rid, status, owner, minutes in rows:
+            await db.execute(
+                text("INSERT INTO reviews_table (response_id_of_expertiza, review, status, owner_instance_id, "
+                     "updated_at) VALUES (:rid, 'scratch', CAST(:status AS review_status), :owner, "
+                     "now() - make_interval(mins => :minutes))"),
+                {"rid": rid, "status": status, "owner": owner, "minutes": minutes},
+            )
+        await db.commit()
+        try:
+            await defer_orphaned_reviews(db, grace_seconds=900, heartbeat_timeout=60, priority=2)
+            deferred = await db.execute(
+                text("SELECT response_id_of_expertiza FROM reviews_table "
+                     "WHERE response_id_of_expertiza = ANY(:rids) AND deferred_at IS NOT NULL"),
+                {"rids": [row[0] for row in rows]},
+            )
+            heartbeats = await db.execute(
+                text("SELECT instance_id FROM process_heartbeats WHERE instance_id LIKE 'test_crud:%'")
+            )
+            return sorted(r[0] for r in deferred.all()), [r[0] for r in heartbeats.all()]
+        finally:
+            await db.rollback()
+            await db.execute(text("DELETE FROM reviews_table WHERE response_id_of_expertiza = ANY(:rids)"),
+                             {"rids": [row[0] for row in rows]})
+            await db.execute(text("DELETE FROM process_heartbeats WHERE instance_id LIKE 'test_crud:%'"))
+            await db.commit()
+
+    deferred, heartbeats = run_db(work)
+    assert deferred == [-13, -11]  # dead owner at once; no owner only after the grace period
+    assert heartbeats == ["test_crud:live"]
+
+
+def test_shared_bucket_refuses_after_the_burst(run_db):
+    async def work(db):
+        try:
+            taken = [await take_rate_limit_token(db, SCRATCH_SUBJECT, rate=0.001, burst=2) for _ in range(3)]
+        finally:
+            await db.execute(text("DELETE FROM rate_limit_buckets WHERE subject = :s"), {"s": SCRATCH_SUBJECT})
+            await db.commit()
+        return taken
+
+    taken = run_db(work)
+    assert taken[:2] == [0.0, 0.0]
+    assert 990 < taken[2] <= 1000  # one token takes 1000 s at 0.001/s
+
+
+def test_quota_usage_accumulates_per_day_and_drops_old_rows(run_db):
+    async def work(db):
+        await db.execute(
+            text("INSERT INTO llm_quota_usage (subject, day, calls) "
+                 "VALUES (:s, CAST(timezone('UTC', now()) AS date) - 30, 9)"),
+            {"s": SCRATCH_SUBJECT},
+        )
+        await db.commit()
+        try:
+            await add_llm_quota_usage(db, SCRATCH_SUBJECT, 2)
+            await add_llm_quota_usage(db, SCRATCH_SUBJECT)
+            used = await get_llm_quota_usage(db, SCRATCH_SUBJECT)
+            rows = await db.scalar(text("SELECT COUNT(*) FROM llm_quota_usage WHERE subject = :s"),
+                                   {"s": SCRATCH_SUBJECT})
+        finally:
+            await db.execute(text("DELETE FROM llm_quota_usage WHERE subject = :s"), {"s": SCRATCH_SUBJECT})
+            await db.commit()
+        return used, rows
+
+    assert run_db(work) == (3, 1)
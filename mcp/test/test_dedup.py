@@ -0,0 +1,67 @@
+# mcp/test/test_dedup.py
+"""Unit tests for the SimHash fingerprints of mcp/services/dedup.py (no database needed)."""
+import random
+
+import pytest
+
+from mcp.schemas import ReviewPayload
+from mcp.services.dedup import BANDS, HASH_BITS, bands, normalized_text, similarity, simhash, to_signed, to_unsigned
+
+COMMENT = ("The report explains the design clearly and the diagrams help, but the testing section "
+           "does not say which edge cases were covered or how failures were reproduced.")
+
+
+def _payload(comment: str, question: str = "Is the design clear?", points: int = 4) -> ReviewPayload:
+    return ReviewPayload.model_validate({
+        "response_id_of_expertiza": 1,
+        "scores": [{"question": question, "type": "Criterion", "max_points": 5, "awarded_points": points,
+                    "comments": comment}],
+        "additional_comment": "Good work overall.",
+    })
+
+
+def test_normalized_text_ignores_case_punctuation_and_questions():
+    a = normalized_text(_payload(COMMENT))
+    b = normalized_text(_payload(COMMENT.upper().replace(",", " ;"), question="A different rubric question"))
+    assert a == b
+    assert normalized_text(_payload(COMMENT, points=2)) != a
+
+
+def test_simhash_is_a_stable_64_bit_value():
+    value = simhash(normalized_text(_payload(COMMENT)))
+    assert 0 <= value < 1 << HASH_BITS
+    assert value == simhash(normalized_text(_payload(COMMENT)))
+
+
+def test_near_copies_are_similar_and_unrelated_reviews_are_not():
+    original = simhash(normalized_text(_payload(COMMENT)))
+    one_word = simhash(normalized_text(_payload(COMMENT.replace("clearly", "well"))))
+    unrelated = simhash(normalized_text(_payload(
+        "Formatting is inconsistent and several references are missing from the bibliography entirely."
+    )))
+    assert similarity(original, original) == 1.0
+    assert similarity(original, one_word) >= 0.85
+    assert similarity(original, unrelated) < 0.75
+
+
+def test_bands_split_the_hash_into_eight_bytes():
+    value = 0x0123456789ABCDEF
+    assert bands(value) == [0xEF, 0xCD, 0xAB, 0x89, 0x67, 0x45, 0x23, 0x01]
+    assert sum(band << (8 * i) for i, band in enumerate(bands(value))) == value
+
+
+def test_hashes_within_seven_bits_share_a_band():
+    rng = random.Random(517)
+    for _ in range(500):
+        value = rng.getrandbits(HASH_BITS)
+        flipped = value
+        for bit in rng.sample(range(HASH_BITS), BANDS - 1):
+            flipped ^= 1 << bit
+        assert any(a == b for a, b in zip(bands(value), bands(flipped)))
+
+
+@pytest.mark.parametrize("value", [0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1])
+def test_signed_storage_round_trips(value):
+    signed = to_signed(value)
+    assert -(1 << 63) <= signed < 1 << 63  # fits a BIGINT
+    assert to_unsigned(signed) == value
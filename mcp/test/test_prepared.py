@@ -0,0 +1,139 @@
+# mcp/test/test_prepared.py
+"""
+Tests for mcp/db/prepared.py: the ":name" -> "$n" translation (no database needed), and
+running on the fast path against DATABASE_URL (skipped when it cannot be reached).
+"""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from mcp.db.prepared import PreparedQuery
+import mcp.config as config
+
+SCRATCH_RESPONSE_ID = -4
+
+
+def test_binds_are_numbered_in_order_of_first_use():
+    query = PreparedQuery("UPDATE reviews_table SET status = :status WHERE id = :id")
+    assert query.sql == "UPDATE reviews_table SET status = $1 WHERE id = $2"
+    assert query.names == ("status", "id")
+
+
+def test_repeated_bind_reuses_its_number():
+    query = PreparedQuery("SELECT :a, :b, :a")
+    assert query.sql == "SELECT $1, $2, $1"
+    assert query.args({"a": 1, "b": 2}) == [1, 2]
+
+
+def test_type_casts_are_not_binds():
+    query = PreparedQuery("SELECT :a::text, CAST(:b AS int), now()::date, '{}'::jsonb")
+    assert query.sql == "SELECT $1::text, CAST($2 AS int), now()::date, '{}'::jsonb"
+    assert query.names == ("a", "b")
+
+
+def test_cast_directly_after_a_bind_keeps_the_bind():
+    query = PreparedQuery("UPDATE t SET trace_id = COALESCE(:trace_id::text, trace_id) WHERE id = :id")
+    assert query.sql == "UPDATE t SET trace_id = COALESCE($1::text, trace_id) WHERE id = $2"
+
+
+def test_colon_inside_a_word_is_not_a_bind():
+    # e.g. "a:b" in an identifier-like token; only a colon that starts a word binds
+    query = PreparedQuery("SELECT x FROM t WHERE a = :value AND b = 'x:y'")
+    assert query.names == ("value",)
+
+
+def test_missing_parameter_raises_key_error():
+    with pytest.raises(KeyError):
+        PreparedQuery("SELECT :a, :b").args({"a": 1})
+
+
+@pytest.mark.parametrize(
+    "sql, read_only",
+    [
+        ("SELECT * FROM reviews_table WHERE id = :id", True),
+        ("  select id FROM t", True),
+        ("SELECT id FROM t WHERE id = :id FOR UPDATE", False),
+        ("SELECT id FROM t FOR NO KEY UPDATE SKIP LOCKED", False),
+        ("SELECT id FROM t FOR KEY SHARE", False),
+        ("UPDATE t SET a = :a", False),
+        ("DELETE FROM t WHERE id = :id", False),
+    ],
+)
+def test_only_plain_selects_may_run_outside_the_transaction(sql, read_only):
+    assert PreparedQuery(sql).read_only is read_only
+
+
+_INSERT = PreparedQuery(
+    "INSERT INTO reviews_table (response_id_of_expertiza, review, status) VALUES (:rid, :review, 'pending') RETURNING id"
+)
+_SELECT = PreparedQuery("SELECT id, review FROM reviews_table WHERE response_id_of_expertiza = :rid")
+_UPDATE = PreparedQuery("UPDATE reviews_table SET review = :review WHERE response_id_of_expertiza = :rid")
+
+
+@pytest.fixture
+def scratch_review(run_db):
+    """A committed scratch review (response_id_of_expertiza SCRATCH_RESPONSE_ID), deleted afterwards."""
+    async def insert(db):
+        await db.execute(text("DELETE FROM reviews_table WHERE response_id_of_expertiza = :rid"),
+                         {"rid": SCRATCH_RESPONSE_ID})
+        review_id = await db.scalar(
+            text("INSERT INTO reviews_table (response_id_of_expertiza, review, status) "
+                 "VALUES (:rid, 'original', 'pending') RETURNING id"),
+            {"rid": SCRATCH_RESPONSE_ID},
+        )
+        await db.commit()
+        return review_id
+
+    async def delete(db):
+        await db.execute(text("DELETE FROM reviews_table WHERE response_id_of_expertiza = :rid"),
+                         {"rid": SCRATCH_RESPONSE_ID})
+        await db.commit()
+
+    yield run_db(insert)
+    run_db(delete)
+
+
+@pytest.mark.parametrize("fast_path", [True, False])
+def test_both_paths_return_the_same_rows(run_db, scratch_review, monkeypatch, fast_path):
+    monkeypatch.setattr(config, "DB_PREPARED_FAST_PATH", fast_path)
+
+    async def work(db):
+        row = await _SELECT.fetchrow(db, {"rid": SCRATCH_RESPONSE_ID})
+        rows = await _SELECT.fetch(db, {"rid": SCRATCH_RESPONSE_ID})
+        value = await _SELECT.fetchval(db, {"rid": SCRATCH_RESPONSE_ID})
+        missing = await _SELECT.fetchrow(db, {"rid": SCRATCH_RESPONSE_ID - 1})
+        return dict(row), [dict(r) for r in rows], value, missing
+
+    row, rows, value, missing = run_db(work)
+    assert row == {"id": scratch_review, "review": "original"}
+    assert rows == [row]
+    assert value == scratch_review
+    assert missing is None
+
+
+@pytest.mark.parametrize("first_statement", [True, False])
+def test_writes_roll_back_with_the_session(run_db, scratch_review, first_statement):
+    # as the first statement the write goes through text(), later ones join the open transaction
+    async def work(db):
+        if not first_statement:
+            await db.execute(text("SELECT 1"))
+        assert (await _UPDATE._driver_connection(db) is None) is first_statement
+        await _UPDATE.execute(db, {"review": "changed", "rid": SCRATCH_RESPONSE_ID})
+        seen = (await _SELECT.fetchrow(db, {"rid": SCRATCH_RESPONSE_ID}))["review"]
+        await db.rollback()
+        return seen, (await _SELECT.fetchrow(db, {"rid": SCRATCH_RESPONSE_ID}))["review"]
+
+    assert run_db(work) == ("changed", "original")
+
+
+def test_driver_errors_are_raised_as_sqlalchemy_errors(run_db, scratch_review):
+    async def work(db):
+        await db.execute(text("SELECT 1"))  # open the transaction, so the INSERT takes the fast path
+        assert await _INSERT._driver_connection(db) is not None
+        try:
+            await _INSERT.fetchval(db, {"rid": SCRATCH_RESPONSE_ID, "review": "duplicate"})
+        finally:
+            await db.rollback()
+
+    with pytest.raises(IntegrityError):
+        run_db(work)
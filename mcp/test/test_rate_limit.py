@@ -0,0 +1,190 @@
+# mcp/test/test_rate_limit.py
+"""Unit tests for mcp/core/rate_limit.py with the in-memory backend (no database needed)."""
+import asyncio
+import datetime
+import types
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+import mcp.core.rate_limit as rate_limit
+import mcp.services.review_queue as review_queue
+from mcp.core.rate_limit import (
+    ClientLimits,
+    RateLimiter,
+    RateLimitMiddleware,
+    charge_llm_call,
+    charging_to,
+    current_quota_subject,
+)
+from mcp.routes import llm_routes
+from mcp.services.llm_service import get_llm_service
+
+LIMITS = {
+    "default": {"rate": 2.0, "burst": 3, "daily_llm_calls": 2},
+    "anonymous": {"rate": 0.001, "burst": 2, "daily_llm_calls": 0},
+    "admin": None,
+}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake monotonic clock for the token buckets; advance it with clock.now += seconds."""
+    fake = types.SimpleNamespace(now=1000.0)
+    fake.monotonic = lambda: fake.now
+    monkeypatch.setattr(rate_limit, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = RateLimiter(LIMITS, backend="memory")
+    monkeypatch.setattr(rate_limit, "_rate_limiter_instance", limiter)
+    return limiter
+
+
+def test_limits_by_role(limiter):
+    assert limiter.limits_for("admin") is None
+    assert limiter.limits_for("tester") == ClientLimits(rate=2.0, burst=3, daily_llm_calls=2)
+    assert limiter.limits_for(None) == limiter.limits_for("tester")
+    assert limiter.limits_for("anonymous") == ClientLimits(rate=0.001, burst=2)
+
+
+class _FakeLLMService:
+    def __init__(self):
+        self.subjects = []
+
+    async def evaluate_and_parse(self, **kwargs):
+        self.subjects.append(current_quota_subject())
+        return {"ok": True}
+
+
+def test_unauthenticated_llmreview_is_limited_by_client_address(limiter, monkeypatch):
+    monkeypatch.setattr(rate_limit.config, "RATE_LIMIT_ENABLED", True)
+    svc = _FakeLLMService()
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware)
+    app.include_router(llm_routes.router, prefix="/api/review")
+    app.dependency_overrides[get_llm_service] = lambda: svc
+
+    async def run():
+        queue = review_queue.configure_review_queue(concurrency=1, interactive_reserved=1, tenant_weights={},
+                                                    max_depth=10, interactive_max_queued=10)
+        statuses = {}
+        try:
+            for client in ("10.0.0.1", "10.0.0.2"):
+                transport = httpx.ASGITransport(app=app, client=(client, 1234))
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                    statuses[client] = [
+                        await http.post("/api/review/llmreview", json={"review_text": "Solid work."})
+                        for _ in range(3 if client == "10.0.0.1" else 1)
+                    ]
+        finally:
+            await queue.stop()
+        return statuses
+
+    monkeypatch.setattr(review_queue, "_review_queue_instance", None)
+    statuses = asyncio.run(run())
+    first = statuses["10.0.0.1"]
+    assert [r.status_code for r in first] == [200, 200, 429]
+    assert first[2].json() == {"detail": "Rate limit exceeded"}
+    assert 990 < int(first[2].headers["Retry-After"]) <= 1000
+    assert [r.status_code for r in statuses["10.0.0.2"]] == [200]  # each address has its own bucket
+    assert svc.subjects == ["ip:10.0.0.1", "ip:10.0.0.1", "ip:10.0.0.2"]  # and is charged the LLM calls
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(limiter, clock):
+    limits = limiter.limits_for(None)
+
+    async def run():
+        burst = [await limiter.take("alice", limits) for _ in range(3)]
+        refused = await limiter.take("alice", limits)
+        clock.now += 0.5  # one token at 2/s
+        refilled = await limiter.take("alice", limits)
+        other = await limiter.take("bob", limits)
+        return burst, refused, refilled, other
+
+    burst, refused, refilled, other = asyncio.run(run())
+    assert burst == [0.0, 0.0, 0.0]
+    assert refused == pytest.approx(0.5)
+    assert refilled == 0.0
+    assert other == 0.0  # buckets are per subject
+
+
+def test_bucket_never_holds_more_than_burst(limiter, clock):
+    limits = limiter.limits_for(None)
+
+    async def run():
+        await limiter.take("alice", limits)
+        clock.now += 3600
+        return [await limiter.take("alice", limits) for _ in range(4)]
+
+    taken = asyncio.run(run())
+    assert taken[:3] == [0.0, 0.0, 0.0]
+    assert taken[3] == pytest.approx(0.5)
+
+
+def test_daily_quota_counts_llm_calls(limiter):
+    limits = limiter.limits_for(None)
+
+    async def run():
+        before = await limiter.quota_retry_after("alice", limits)
+        await limiter.charge("alice")
+        after_one = await limiter.quota_retry_after("alice", limits)
+        await limiter.charge("alice")
+        exhausted = await limiter.quota_retry_after("alice", limits)
+        unlimited = await limiter.quota_retry_after("alice", ClientLimits(rate=1.0, burst=1))
+        return before, after_one, exhausted, unlimited
+
+    before, after_one, exhausted, unlimited = asyncio.run(run())
+    assert before == after_one == 0.0
+    assert 0 < exhausted <= 86400  # until UTC midnight
+    assert unlimited == 0.0
+
+
+def test_quota_usage_resets_on_a_new_day(limiter):
+    yesterday = datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=1)
+    limiter._usage["alice"] = (yesterday, 50)
+
+    async def run():
+        used_before = await limiter.used_today("alice")
+        await limiter.charge("alice", 2)
+        return used_before, await limiter.used_today("alice")
+
+    assert asyncio.run(run()) == (0, 2)
+
+
+def test_llm_calls_are_charged_to_the_context_subject(limiter):
+    async def run():
+        await charge_llm_call()  # outside a limited request: nobody to charge
+        with charging_to("stored"):
+            assert current_quota_subject() == "stored"
+            await charge_llm_call()
+            # a subject already in the context wins over the stored one
+            with charging_to("other"):
+                await charge_llm_call(2)
+        with charging_to(None):
+            assert current_quota_subject() is None
+        return await limiter.used_today("stored"), await limiter.used_today("other")
+
+    assert asyncio.run(run()) == (3, 0)
+    assert current_quota_subject() is None
+
+
+@pytest.mark.parametrize(
+    "method, path, query, expected",
+    [
+        ("POST", "/api/review/llmreview", b"", True),
+        ("POST", "/api/v1/reviews", b"", True),
+        ("POST", "/api/v1/reviews/42/trigger", b"", True),
+        ("GET", "/api/v1/reviews/42", b"", False),
+        ("GET", "/api/v1/reviews/42", b"details=true", True),
+        ("GET", "/api/v1/reviews/42", b"details=1", True),
+        ("GET", "/api/v1/reviews/42", b"details=false", False),
+        ("GET", "/api/v1/reviews", b"details=true", False),
+        ("GET", "/api/review/llmreview", b"", False),
+    ],
+)
+def test_quota_applies_only_to_routes_that_start_llm_work(method, path, query, expected):
+    assert rate_limit.is_llm_route(method, path, query) is expected
@@ -0,0 +1,142 @@
+# mcp/test/test_review_queue.py
+"""Unit tests for mcp/services/review_queue.py: fair ordering across tenants and class scheduling."""
+import asyncio
+
+import pytest
+
+from mcp.services.review_queue import Priority, QueueFull, ReviewQueue, _FairQueue, _Job
+
+
+def _job(tenant: str, key=None) -> _Job:
+    return _Job(None, Priority.fresh, tenant, 0.0, asyncio.get_running_loop().create_future(), key)
+
+
+def _drain(queue: _FairQueue):
+    order = []
+    while (job := queue.pop()) is not None:
+        order.append(job.key)
+    return order
+
+
+def test_tenants_are_interleaved_not_served_in_arrival_order():
+    async def run():
+        queue = _FairQueue({})
+        for i in range(4):
+            queue.push(_job("a", f"a{i}"))
+        for i in range(2):
+            queue.push(_job("b", f"b{i}"))
+        return _drain(queue)
+
+    assert asyncio.run(run()) == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+
+def test_weights_set_each_tenants_share():
+    async def run():
+        queue = _FairQueue({"heavy": 2.0})
+        for i in range(4):
+            queue.push(_job("heavy", f"h{i}"))
+            queue.push(_job("light", f"l{i}"))
+        return _drain(queue)[:6]
+
+    assert [key[0] for key in asyncio.run(run())] == ["h", "l", "h", "h", "l", "h"]
+
+
+def test_idle_tenant_gets_no_banked_credit():
+    async def run():
+        queue = _FairQueue({})
+        for i in range(6):
+            queue.push(_job("a", f"a{i}"))
+        first = [queue.pop().key for _ in range(4)]
+        # "b" arrives late: it competes from the current virtual time, not from zero
+        for i in range(3):
+            queue.push(_job("b", f"b{i}"))
+        return first + _drain(queue)
+
+    assert asyncio.run(run()) == ["a0", "a1", "a2", "a3", "a4", "b0", "a5", "b1", "b2"]
+
+
+def test_cancelled_jobs_are_skipped_and_not_returned_by_clear():
+    async def run():
+        queue = _FairQueue({})
+        jobs = [_job("a", i) for i in range(3)]
+        for job in jobs:
+            queue.push(job)
+        jobs[0].future.cancel()
+        popped = queue.pop().key
+        jobs[2].future.cancel()
+        return popped, [job.key for job in queue.clear()], len(queue)
+
+    assert asyncio.run(run()) == (1, [], 0)
+
+
+async def _blocked_jobs(queue: ReviewQueue, gate: asyncio.Event, started: list, priority: Priority, keys):
+    futures = []
+    for key in keys:
+        async def work(key=key):
+            started.append(key)
+            await gate.wait()
+            return key
+
+        futures.append(queue.submit(work, priority, "t", key=key))
+    await _settle()
+    return futures
+
+
+async def _settle():
+    # let the dispatcher start whatever it can
+    await asyncio.sleep(0.01)
+
+
+def test_interactive_work_runs_in_its_reserved_slot():
+    async def run():
+        queue = ReviewQueue(concurrency=2, interactive_reserved=1, tenant_weights={}, max_depth=10,
+                            interactive_max_queued=10)
+        gate, started = asyncio.Event(), []
+        background = await _blocked_jobs(queue, gate, started, Priority.fresh, ["f0", "f1", "f2"])
+        only_one_background = list(started)
+        interactive = await _blocked_jobs(queue, gate, started, Priority.interactive, ["i0"])
+        with_interactive = list(started)
+        gate.set()
+        await asyncio.gather(*background, *interactive)
+        await queue.stop()
+        return only_one_background, with_interactive
+
+    only_one_background, with_interactive = asyncio.run(run())
+    assert only_one_background == ["f0"]
+    assert with_interactive == ["f0", "i0"]
+
+
+def test_classes_are_served_in_priority_order():
+    async def run():
+        queue = ReviewQueue(concurrency=1, interactive_reserved=0, tenant_weights={}, max_depth=10,
+                            interactive_max_queued=10)
+        gate, started = asyncio.Event(), []
+        first = await _blocked_jobs(queue, gate, started, Priority.reprocess, ["running"])
+        # queued while the only slot is busy: served by class, not by arrival
+        rest = await _blocked_jobs(queue, gate, started, Priority.reprocess, ["r"])
+        rest += await _blocked_jobs(queue, gate, started, Priority.fresh, ["f"])
+        rest += await _blocked_jobs(queue, gate, started, Priority.interactive, ["i"])
+        gate.set()
+        await asyncio.gather(*first, *rest)
+        await queue.stop()
+        return started
+
+    assert asyncio.run(run()) == ["running", "i", "f", "r"]
+
+
+def test_admission_limit_raises_queue_full():
+    async def run():
+        queue = ReviewQueue(concurrency=1, interactive_reserved=0, tenant_weights={}, max_depth=1,
+                            interactive_max_queued=0)
+        future = queue.submit(lambda: asyncio.sleep(1), Priority.fresh, "t")
+        with pytest.raises(QueueFull) as background_full:
+            queue.submit(lambda: asyncio.sleep(1), Priority.reprocess, "t")
+        with pytest.raises(QueueFull) as interactive_full:
+            queue.submit(lambda: asyncio.sleep(1), Priority.interactive, "t")
+        future.cancel()
+        await queue.stop()
+        return background_full.value, interactive_full.value
+
+    background_full, interactive_full = asyncio.run(run())
+    assert background_full.priority is Priority.reprocess and background_full.retry_after >= 1
+    assert interactive_full.priority is Priority.interactive
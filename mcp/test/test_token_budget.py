@@ -0,0 +1,135 @@
+# mcp/test/test_token_budget.py
+"""Unit tests for mcp/services/token_budget.py: what fit_review cuts, and in which order."""
+import json
+
+from mcp.schemas import ReviewPayload
+from mcp.services.token_budget import (
+    estimate_tokens,
+    fit_review,
+    fit_review_json,
+    shorten,
+    truncate_to_budget,
+)
+from mcp.services.utils import build_review_text
+
+LONG = "The methodology section explains the setup in detail but skips the baseline. " * 12
+# no repeated sentences, so deduplication cannot shorten it
+VARIED = " ".join(f"Point {i} of the design section needs more detail." for i in range(40))
+
+
+def _payload(comments=("Clear and well organized.", "Needs a baseline comparison."), additional=None,
+             previous=None) -> ReviewPayload:
+    return ReviewPayload.model_validate({
+        "response_id_of_expertiza": 1,
+        "course_name": "CSC 517",
+        "assignment_name": "Program 2",
+        "round": 2,
+        "scores": [
+            {"question": f"Question {i}", "type": "Criterion", "max_points": 5, "awarded_points": 4,
+             "comments": comment}
+            for i, comment in enumerate(comments, start=1)
+        ],
+        "additional_comment": additional,
+        "previousRoundReview": previous,
+    })
+
+
+def _actions(cuts):
+    return [(cut["action"], cut["field"]) for cut in cuts]
+
+
+def test_review_within_budget_is_rendered_unchanged():
+    payload = _payload(previous={"comments": LONG})
+    text, tokens, cuts = fit_review(payload, max_tokens=10_000, input_format="json")
+    assert text == build_review_text(payload, "json")
+    assert tokens == estimate_tokens(text)
+    assert cuts == []
+
+
+def test_zero_budget_disables_cutting():
+    payload = _payload(comments=(LONG, LONG), previous=LONG)
+    assert fit_review(payload, max_tokens=0, input_format="json")[2] == []
+
+
+def test_previous_round_is_trimmed_before_the_current_round():
+    payload = _payload(previous={"comments": LONG, "score": 3})
+    full = estimate_tokens(build_review_text(payload, "json"))
+    text, tokens, cuts = fit_review(payload, max_tokens=full - 100, input_format="json")
+    assert _actions(cuts) == [("trimmed", "previous_round_review")]
+    assert cuts[0]["tokens_saved"] > 0 and tokens <= full - 100
+    data = json.loads(text)
+    assert [s["comment"] for s in data["scores"]] == ["Clear and well organized.", "Needs a baseline comparison."]
+    assert data["previous_round_review"]["score"] == 3
+
+
+def test_previous_round_is_dropped_when_no_cap_fits():
+    payload = _payload(previous=[{"comments": LONG}] * 40)
+    current_only = estimate_tokens(build_review_text(_payload(), "json"))
+    text, _, cuts = fit_review(payload, max_tokens=current_only + 5, input_format="json")
+    assert _actions(cuts) == [("dropped", "previous_round_review")]
+    assert "previous_round_review" not in json.loads(text)
+
+
+def test_repeated_sentences_are_removed_next():
+    repeated = "The baseline comparison is missing. The figures need labels."
+    payload = _payload(comments=(repeated, repeated + " Otherwise solid."), additional=repeated)
+    full = estimate_tokens(build_review_text(payload, "json"))
+    text, _, cuts = fit_review(payload, max_tokens=full - 5, input_format="json")
+    assert _actions(cuts) == [("deduplicated", "current_round")]
+    data = json.loads(text)
+    assert [s["comment"] for s in data["scores"]] == [repeated, "Otherwise solid."]
+    assert data["additional_comment"] == "[repeats earlier comment]"
+
+
+def test_long_comments_are_shortened_last_and_scores_are_kept():
+    payload = _payload(comments=(VARIED, "Short."), additional=VARIED.upper(), previous="earlier review " * 50)
+    text, tokens, cuts = fit_review(payload, max_tokens=250, input_format="json")
+    assert _actions(cuts)[0] == ("dropped", "previous_round_review")
+    assert _actions(cuts)[-1] == ("shortened", "current_round")
+    assert tokens <= 250
+    data = json.loads(text)
+    assert [(s["question"], s["awarded_points"]) for s in data["scores"]] == [("Question 1", 4), ("Question 2", 4)]
+    assert data["scores"][1]["comment"] == "Short."
+    assert "[...]" in data["scores"][0]["comment"] and len(data["scores"][0]["comment"]) >= 80
+
+
+def test_truncate_to_budget_keeps_head_and_tail():
+    text = "start " + "filler words here " * 200 + "end"
+    cut = truncate_to_budget(text, 100)
+    assert estimate_tokens(cut) <= 100
+    assert cut.startswith("start") and cut.endswith("end") and "[...]" in cut
+    assert shorten("short", 80) == "short"
+
+
+def test_fit_review_json_accepts_the_prompt_input_schema():
+    data = {
+        "course_name": "CSC 517",
+        "round": 2,
+        "scores": [{"question": "Q1", "type": "Criterion", "max_points": 5, "awarded_points": 3, "comment": LONG}],
+        "previous_round_review": {"comments": LONG},
+        "previous_round_digest": {"Praise": 2},
+    }
+    text, _, cuts = fit_review_json(data, max_tokens=250)
+    result = json.loads(text)
+    assert _actions(cuts)[0][1] == "previous_round_review"
+    assert result["scores"][0]["awarded_points"] == 3 and result["scores"][0]["comment"]
+    assert result["previous_round_digest"] == {"Praise": 2}  # not part of the review: passed through uncut
+    assert list(result)[-1] == "previous_round_digest"
+
+
+def test_fit_review_json_within_budget_keeps_the_review():
+    data = {"scores": [{"question": "Q1", "type": "Criterion", "max_points": 5, "awarded_points": 3,
+                        "comment": "Good."}],
+            "previous_round_review": "earlier"}
+    text, _, cuts = fit_review_json(data, max_tokens=10_000)
+    assert cuts == []
+    assert json.loads(text) == data
+
+
+def test_fit_review_json_caps_other_objects_and_keeps_them_json():
+    data = {"notes": [LONG, LONG], "meta": {"id": 7}}
+    text, tokens, cuts = fit_review_json(data, max_tokens=100)
+    result = json.loads(text)
+    assert _actions(cuts) == [("shortened", "review_text")]
+    assert result["meta"] == {"id": 7} and len(result["notes"][0]) < len(LONG)
+    assert tokens == estimate_tokens(text)
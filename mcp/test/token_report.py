@@ -0,0 +1,132 @@
+# mcp/test/token_report.py
+"""
+Compare the size of the LLM input in each REVIEW_INPUT_FORMAT ("prose" vs "json"), and of
+"columnar", a candidate encoding that is not a REVIEW_INPUT_FORMAT: the "json" input with
+"scores" as one column list plus rows of values instead of an object per question.
+
+    python -m mcp.test.token_report                          # built-in sample reviews
+    python -m mcp.test.token_report --payloads reviews.jsonl # one ReviewPayload JSON per line
+    GEMINI_API_KEY=... python -m mcp.test.token_report --gemini   # exact Gemini token counts
+
+Without --gemini, tokens are estimated offline (services/token_budget.py estimate_tokens), which is close
+enough to BPE tokenizers to compare formats but not to budget against. Both the review
+text alone and the full prompt (system prompt + review) are reported; the system prompt
+is identical in all of them. Savings are relative to "prose".
+
+With the offline estimate, the built-in samples' review text is 8% (small) and 1% (long)
+larger as json than as prose, and 4% larger and 3% smaller as columnar; on the full prompt
+every difference is within 3%.
+"json" is a format fix (schema-conformant, deterministic input), not a token reduction,
+and columnar does not save enough to change the input schema the prompt documents.
+"""
+import argparse
+import json
+import sys
+from typing import Callable, Dict, List, Tuple
+
+from mcp.schemas import ReviewPayload
+from mcp.services.prompt import build_review_prompt
+from mcp.services.token_budget import estimate_tokens
+from mcp.services.utils import build_review_text, review_input
+from mcp.test.benchmarks import long_payload, small_payload
+
+_SCORE_COLUMNS = ("question", "type", "max_points", "awarded_points", "comment")
+
+
+def columnar_text(payload: ReviewPayload) -> str:
+    data = review_input(payload)
+    if "scores" in data:
+        data["scores"] = {
+            "columns": list(_SCORE_COLUMNS),
+            "rows": [[score.get(column) for column in _SCORE_COLUMNS] for score in data["scores"]],
+        }
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+VARIANTS: Dict[str, Callable[[ReviewPayload], str]] = {
+    "prose": lambda payload: build_review_text(payload, "prose"),
+    "json": lambda payload: build_review_text(payload, "json"),
+    "columnar": columnar_text,
+}
+
+
+def gemini_counter() -> Callable[[str], int]:
+    import google.generativeai as genai
+    import mcp.config as config
+
+    genai.configure(api_key=config.GEMINI_API_KEY)
+    model = genai.GenerativeModel(config.GEMINI_MODEL_NAME)
+    return lambda text: model.count_tokens(text).total_tokens
+
+
+def load_payloads(path: str) -> List[Tuple[str, ReviewPayload]]:
+    payloads = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, start=1):
+            if line.strip():
+                payloads.append((f"{path}:{n}", ReviewPayload.model_validate(json.loads(line))))
+    return payloads
+
+
+def measure(payloads: List[Tuple[str, ReviewPayload]], count: Callable[[str], int]) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = {}
+    for name, payload in payloads:
+        row = {}
+        for variant, render in VARIANTS.items():
+            text = render(payload)
+            row[variant] = {
+                "chars": len(text),
+                "tokens": count(text),
+                "prompt_tokens": count(build_review_prompt(text)),
+            }
+        results[name] = row
+    return results
+
+
+def _saving(before: int, after: int) -> str:
+    return f"{(before - after) / before:+.0%}" if before else "-"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Token counts of the review input formats.")
+    parser.add_argument("--payloads", help="JSON lines file of ReviewPayload objects")
+    parser.add_argument("--gemini", action="store_true", help="count with the Gemini API instead of estimating")
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    payloads = load_payloads(args.payloads) if args.payloads else [("small", small_payload()), ("long", long_payload())]
+    count = gemini_counter() if args.gemini else estimate_tokens
+    results = measure(payloads, count)
+
+    others = [v for v in VARIANTS if v != "prose"]
+    header = f"{'review':24} {'prose tok':>10}" + "".join(f" {v + ' tok':>13} {'saved':>6}" for v in others)
+    header += f" {'prose prompt':>13}" + "".join(f" {v + ' prompt':>16} {'saved':>6}" for v in others)
+    print(header)
+    totals = {v: {"tokens": 0, "prompt_tokens": 0} for v in VARIANTS}
+    rows = dict(results)
+    for row in results.values():
+        for v in VARIANTS:
+            for key in ("tokens", "prompt_tokens"):
+                totals[v][key] += row[v][key]
+    if len(results) > 1:
+        rows["total"] = totals
+    for name, row in rows.items():
+        line = f"{name[-24:]:24} {row['prose']['tokens']:10}"
+        line += "".join(
+            f" {row[v]['tokens']:13} {_saving(row['prose']['tokens'], row[v]['tokens']):>6}" for v in others
+        )
+        line += f" {row['prose']['prompt_tokens']:13}"
+        line += "".join(
+            f" {row[v]['prompt_tokens']:16} {_saving(row['prose']['prompt_tokens'], row[v]['prompt_tokens']):>6}"
+            for v in others
+        )
+        print(line)
+    print("(tokens are " + ("Gemini counts)" if args.gemini else "offline estimates; use --gemini for exact counts)"))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# mcp/worker.py
+"""
+Dedicated LLM worker processes.
+
+    python -m mcp.worker --processes 2 --concurrency 8 --prefetch 16
+
+Each process claims deferred reviews from reviews_table (FOR UPDATE SKIP LOCKED),
+runs them through the same ReviewQueue and orchestrator code as the API, retries
+failed jobs, and drains/checkpoints on SIGTERM. Run the API with
+REVIEW_EXECUTION_MODE=worker so it only persists reviews and leaves LLM work here.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+from typing import Dict, Optional
+
+import asyncpg
+from prometheus_client import start_http_server
+from sqlalchemy.engine import make_url
+
+import mcp.config as config
+from mcp.core.logging_config import configure_logging, shutdown_logging
+from mcp.core.tracing import configure_tracing, shutdown_tracing
+from mcp.db.crud import REVIEW_BACKLOG_CHANNEL
+from mcp.db.session import DATABASE_URL
+from mcp.services.backlog import BacklogFeeder
+from mcp.services.failure_artifacts import get_failure_artifact_store
+from mcp.services.heartbeat import get_process_heartbeat
+from mcp.services.lifecycle import drain_and_checkpoint, prepare_startup
+from mcp.services.llm_service import close_llm_service
+from mcp.services.retry_scheduler import get_retry_scheduler
+from mcp.services.review_queue import configure_review_queue
+
+logger = logging.getLogger("mcp.worker")
+
+
+async def _listen_for_backlog(feeder: BacklogFeeder) -> Optional[asyncpg.Connection]:
+    """
+    LISTEN on the backlog channel so newly deferred reviews are picked up immediately.
+    Falls back to plain polling (returns None) if the listener cannot be set up.
+    """
+    dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+    try:
+        conn = await asyncpg.connect(dsn)
+        await conn.add_listener(REVIEW_BACKLOG_CHANNEL, lambda *_: feeder.wake())
+        return conn
+    except Exception:
+        logger.exception("Could not LISTEN on %s; relying on polling", REVIEW_BACKLOG_CHANNEL)
+        return None
+
+
+async def run_worker(concurrency: int, prefetch: int, poll_interval: float) -> None:
+    """
+    Run one worker process until SIGTERM/SIGINT: `concurrency` LLM jobs in flight and
+    up to `prefetch` claimed reviews waiting in the local queue.
+    """
+    await prepare_startup(min(concurrency, config.DB_POOL_WARM_CONNECTIONS))
+    queue = configure_review_queue(
+        concurrency=concurrency,
+        interactive_reserved=0,
+        max_depth=prefetch,
+        interactive_max_queued=0,
+    )
+    queue.start()
+    get_failure_artifact_store().start()
+    await get_process_heartbeat().start()
+
+    feeder = BacklogFeeder(poll_interval=poll_interval)
+    feeder.start()
+    retry_scheduler = get_retry_scheduler()
+    retry_scheduler.start()
+    listener = await _listen_for_backlog(feeder)
+    logger.info("Worker started (concurrency=%d, prefetch=%d)", concurrency, prefetch)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("Worker stopping; draining in-flight reviews")
+    await retry_scheduler.stop()
+    await feeder.stop()
+    if listener is not None:
+        await listener.close()
+    await drain_and_checkpoint()
+    await get_process_heartbeat().stop()
+    await get_failure_artifact_store().stop()
+    await close_llm_service()
+    shutdown_tracing()
+    shutdown_logging()
+
+
+def _worker_process(concurrency: int, prefetch: int, poll_interval: float, metrics_port: Optional[int] = None) -> None:
+    configure_logging("mcp-worker")
+    if metrics_port:
+        # Prometheus metrics for this process (LLM, queue and DB pool) on its own port
+        start_http_server(metrics_port)
+    configure_tracing("mcp-worker")
+    asyncio.run(run_worker(concurrency, prefetch, poll_interval))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run dedicated LLM review worker processes.")
+    parser.add_argument("--processes", type=int, default=config.WORKER_PROCESSES,
+                        help="number of worker processes (M)")
+    parser.add_argument("--concurrency", type=int, default=config.WORKER_CONCURRENCY,
+                        help="concurrent LLM jobs per process (N)")
+    parser.add_argument("--prefetch", type=int, default=config.WORKER_PREFETCH,
+                        help="claimed reviews kept waiting per process beyond the running ones")
+    parser.add_argument("--poll-interval", type=float, default=config.WORKER_POLL_INTERVAL,
+                        help="seconds between backlog polls when no NOTIFY arrives")
+    parser.add_argument("--metrics-port", type=int, default=config.WORKER_METRICS_PORT,
+                        help="serve Prometheus metrics; process i listens on this port + i")
+    args = parser.parse_args(argv)
+    worker_args = (args.concurrency, args.prefetch, args.poll_interval)
+
+    def metrics_port(index: int) -> Optional[int]:
+        return args.metrics_port + index if args.metrics_port else None
+
+    if args.processes <= 1:
+        _worker_process(*worker_args, metrics_port(0))
+        return
+
+    # supervise M child processes; restart any that die until we are told to stop
+    ctx = multiprocessing.get_context("spawn")
+    procs: Dict[int, multiprocessing.Process] = {}
+    stopping = False
+
+    def spawn(index: int) -> None:
+        proc = ctx.Process(
+            target=_worker_process,
+            args=(*worker_args, metrics_port(index)),
+            name=f"mcp-worker-{index}",
+        )
+        proc.start()
+        procs[index] = proc
+
+    def request_stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for proc in procs.values():
+            if proc.is_alive():
+                proc.terminate()  # SIGTERM: the child drains and checkpoints
+
+    configure_logging("mcp-worker-supervisor")
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    for index in range(args.processes):
+        spawn(index)
+
+    while procs:
+        for index, proc in list(procs.items()):
+            if proc.is_alive():
+                continue
+            del procs[index]
+            if not stopping:
+                logger.warning("Worker %s exited with code %s; restarting", proc.name, proc.exitcode)
+                spawn(index)
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()